@@ -0,0 +1,80 @@
+"""One-shot database bootstrap: apply migrations, seed defaults, backfill derived tables.
+
+Run once per deploy before starting the workers:
+
+    python -m app.bootstrap
+
+Workers only check the schema version on startup (see check_schema).
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+from cruds.stock import ensure_stock_totals
+from db.base import AsyncSessionLocal, async_engine
+from db.migrations import LATEST_VERSION, current_version, upgrade
+from seeds.oauth_clients import seed_oauth_client
+from seeds.users import seed_admin_user
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Let a worker that finds the schema behind run the bootstrap itself (single-process development only)
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+# Advisory lock key shared by every process bootstrapping this database
+BOOTSTRAP_LOCK_KEY = 726_354_001
+
+
+@asynccontextmanager
+async def bootstrap_lock():
+    """Serialize bootstraps across processes (Postgres advisory lock; other dialects run single-process)."""
+    if async_engine.dialect.name != "postgresql":
+        yield
+        return
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+        try:
+            yield
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+
+
+async def schema_version() -> int:
+    async with async_engine.connect() as conn:
+        return await conn.run_sync(current_version)
+
+
+async def bootstrap():
+    """Apply pending migrations and seed defaults; safe to run concurrently and repeatedly."""
+    async with bootstrap_lock():
+        async with async_engine.begin() as conn:
+            applied = await conn.run_sync(upgrade)
+        if applied:
+            logger.info("Applied migrations %s, schema at version %s", applied, LATEST_VERSION)
+        async with AsyncSessionLocal() as db:
+            await seed_admin_user(db)
+            await seed_oauth_client(db)
+            await ensure_stock_totals(db)
+
+
+async def check_schema():
+    """Startup check: one query when the schema is current, the locked bootstrap otherwise."""
+    version = await schema_version()
+    if version == LATEST_VERSION:
+        return
+    if version > LATEST_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this build ({LATEST_VERSION})")
+    if not DB_MIGRATE_ON_STARTUP:
+        raise RuntimeError(f"Database schema is at version {version}, expected {LATEST_VERSION}; run python -m app.bootstrap")
+    logger.info("Database schema at version %s, bootstrapping to %s", version, LATEST_VERSION)
+    await bootstrap()
+
+
+async def main():
+    await bootstrap()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
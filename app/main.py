@@ -1,37 +1,47 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from fastapi.responses import ORJSONResponse
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi_pagination import add_pagination
 
-from cruds.oauth_client import create_oauth_client
-from db.base import Base, engine
-from db.base import SessionLocal
-from models.oauth_client import OAuthClient
-from routes import movement, client, login, branch, stock, product, health, user
-from seeds.users import seed_admin_user
-from seeds.oauth_clients import seed_oauth_client
-from utils.logger import get_logger
+from app.bootstrap import check_schema
+from app.maintenance import maintain_stock_shards, purge_stock_events_periodically
+from db.base import async_engine, replicas
+from db.replicas import PrimaryPinMiddleware
+from routes import movement, client, login, branch, stock, product, health, metrics, user
+from utils.auth import request_user_id
+from utils.hashing import credential_hasher
+from utils.logger import RequestContextMiddleware, get_logger
+from utils.metrics import MetricsMiddleware
+from utils.query_audit import SQL_AUDIT, QueryAuditMiddleware
+from utils.shared_cache import catalog_cache
+from utils.stock_feed import stock_feed
 
 
 logger = get_logger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # ✅ Create tables on startup
-    logger.info("Creating tables on startup")
-    Base.metadata.create_all(bind=engine)
-
-    # 🔥 Seeding logic
-    logger.info("Seeding logic")
-    db = SessionLocal()
-    try:
-        seed_admin_user(db)
-        seed_oauth_client(db)
-    finally:
-        db.close()
+    # Migrations and seeds run in the one-shot bootstrap (python -m app.bootstrap), workers only check the version
+    await check_schema()
+    replica_monitor = asyncio.create_task(replicas.monitor()) if replicas else None
+    shard_compactor = asyncio.create_task(maintain_stock_shards())
+    feed_dispatcher = asyncio.create_task(stock_feed.run())
+    event_purger = asyncio.create_task(purge_stock_events_periodically())
 
     yield
 
+    for task in (replica_monitor, shard_compactor, feed_dispatcher, event_purger):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    credential_hasher.shutdown()
+    await catalog_cache.close()
+    await replicas.dispose()
+    await async_engine.dispose()
+
 app = FastAPI(
     title="Inventory & Branch Management API",
     description="""
@@ -57,6 +67,7 @@ Features:
     docs_url="/docs",      # Swagger UI (default)
     redoc_url="/redoc",    # ReDoc UI
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -68,10 +79,25 @@ app.add_middleware(
     allow_headers=["*"],     # Allow all headers
 )
 
+# Prometheus request, SQL and auth metrics, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Read-your-writes: pin a client's reads to the primary right after it writes
+if replicas:
+    app.add_middleware(PrimaryPinMiddleware, identify=request_user_id, shared=catalog_cache.shared)
+
+# Development/test: per-request query budgets and N+1 detection (SQL_AUDIT=log|raise)
+if SQL_AUDIT != "off":
+    app.add_middleware(QueryAuditMiddleware)
+
+# Outermost: request ids for log correlation (X-Request-ID)
+app.add_middleware(RequestContextMiddleware)
+
 # Enable pagination
 add_pagination(app)
 
 app.include_router(health.router)
+app.include_router(metrics.router)
 app.include_router(login.router)
 app.include_router(product.router)
 app.include_router(stock.router)
@@ -0,0 +1,47 @@
+import asyncio
+import os
+from cruds.stock import compact_stock_shards
+from cruds.stock_event import purge_stock_events
+from cruds.stock_shard import refresh_sharded_stock, sharded_stock
+from db.base import AsyncSessionLocal
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between shard compactions; also how long sharded rows' summary totals may lag
+STOCK_SHARD_COMPACT_INTERVAL = float(os.getenv("STOCK_SHARD_COMPACT_INTERVAL", 5))
+# Seconds stock events are kept for feed clients to resume from, and between purges
+STOCK_EVENT_RETENTION = float(os.getenv("STOCK_EVENT_RETENTION", 86400))
+STOCK_EVENT_PURGE_INTERVAL = float(os.getenv("STOCK_EVENT_PURGE_INTERVAL", 300))
+
+
+async def maintain_stock_shards():
+    """Refresh the sharded row registry and compact the shards until cancelled; started from the app lifespan.
+
+    Every worker runs it to keep its registry current, compaction itself is
+    serialized across workers by an advisory lock.
+    """
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await refresh_sharded_stock(db)
+                if sharded_stock:
+                    compacted = await compact_stock_shards(db)
+                    if compacted:
+                        logger.debug("Compacted %s sharded stock rows", compacted)
+        except Exception:
+            logger.exception("Stock shard compaction failed")
+        await asyncio.sleep(STOCK_SHARD_COMPACT_INTERVAL)
+
+
+async def purge_stock_events_periodically():
+    """Delete stock events past STOCK_EVENT_RETENTION until cancelled; started from the app lifespan."""
+    while True:
+        await asyncio.sleep(STOCK_EVENT_PURGE_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                purged = await purge_stock_events(db, STOCK_EVENT_RETENTION)
+            if purged:
+                logger.info("Purged %s stock events", purged)
+        except Exception:
+            logger.exception("Stock event purge failed")
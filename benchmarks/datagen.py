@@ -0,0 +1,172 @@
+"""Synthetic dataset for benchmarks.
+
+Loads branches, products, stock and movements in bulk: COPY on Postgres,
+chunked executemany on SQLite. The schema and the admin user and OAuth client
+come from the regular bootstrap, then the stock summary tables and a
+checkpoint are rebuilt so every endpoint sees consistent data. Uses the database configured for the
+app (POSTGRES_* or DATABASE_URL/ASYNC_DATABASE_URL).
+
+    python -m benchmarks.datagen --scale small --reset
+    python -m benchmarks.datagen --branches 100 --products 100000 --stock-per-product 100 --movements 50000000 --reset
+"""
+import argparse
+import asyncio
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from sqlalchemy import func, select, text
+
+from app.bootstrap import bootstrap
+from cruds.stock import rebuild_stock_totals
+from cruds.stock_checkpoint import take_stock_checkpoint
+from db.base import AsyncSessionLocal, Base, async_engine, engine
+from db.migrations import schema_migrations
+# Every model is imported so drop_schema covers all application tables
+from models import (branch, client, idempotency_key, movement, oauth_client, stock,  # noqa: F401
+                    stock_checkpoint, stock_event, stock_shard, stock_total)
+from models.product import Product
+from models.user import User
+
+# (branches, products, stock rows per product, movements)
+SCALES = {
+    "small": (10, 10_000, 5, 100_000),
+    "medium": (50, 50_000, 20, 2_000_000),
+    "large": (100, 100_000, 100, 50_000_000),
+}
+REGIONS = ["Mendoza", "Salta", "San Juan", "Patagonia", "Rioja", "Bordeaux", "Tuscany", "Napa Valley", "Douro", "Barossa"]
+GRAPES = ["Malbec", "Cabernet Sauvignon", "Merlot", "Torrontes", "Syrah", "Pinot Noir", "Tempranillo", "Chardonnay"]
+VINTAGES = list(range(1990, 2025))
+CHUNK_SIZE = 50_000
+
+
+def product_region(product_id: int) -> str:
+    return REGIONS[product_id % len(REGIONS)]
+
+
+def _load(conn, dialect: str, table: str, columns: tuple[str, ...], rows) -> int:
+    """Bulk load rows into a table through the DBAPI connection, one chunk at a time."""
+    cursor = conn.cursor()
+    loaded = 0
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        if dialect == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(chunk)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", chunk
+            )
+        conn.commit()
+        loaded += len(chunk)
+    cursor.close()
+    return loaded
+
+
+def generate(args, user_id: int):
+    """Generate and load all rows with the sync engine; returns row counts per table."""
+    rng = random.Random(args.seed)
+    started_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    now = started_at.isoformat(" ")  # timestamps as text, accepted by COPY and by sqlite3 without adapters
+    dialect = engine.dialect.name
+    stock_per_product = min(args.stock_per_product, args.branches)
+
+    def branches():
+        for branch_id in range(1, args.branches + 1):
+            yield branch_id, f"Branch {branch_id:04d}", now, now
+
+    def products():
+        for product_id in range(1, args.products + 1):
+            vintage = rng.choice(VINTAGES) if product_id % 20 else None  # some NULL vintages
+            yield (product_id, f"{rng.choice(GRAPES)} {product_region(product_id)} {product_id:07d}", vintage,
+                   product_region(product_id), GRAPES[product_id % len(GRAPES)], now, now)
+
+    def stock():
+        for product_id in range(1, args.products + 1):
+            first = product_id % args.branches
+            for offset in range(stock_per_product):
+                branch_id = (first + offset) % args.branches + 1
+                yield product_id, branch_id, rng.randint(0, 500), now, now
+
+    def movements():
+        for _ in range(args.movements):
+            origin, destination = rng.sample(range(1, args.branches + 1), 2)
+            at = (started_at - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))).isoformat(" ")
+            yield rng.randint(1, args.products), rng.randint(1, 12), origin, destination, user_id, at, at, at
+
+    conn = engine.raw_connection()
+    try:
+        counts = {}
+        for table, columns, rows in (
+            ("branches", ("id", "name", "created_at", "updated_at"), branches()),
+            ("products", ("id", "name", "vintage", "region", "grape_variety", "created_at", "updated_at"), products()),
+            ("stock", ("product_id", "branch_id", "quantity", "created_at", "updated_at"), stock()),
+            ("movements", ("product_id", "quantity", "origin_branch_id", "destination_branch_id", "user_id",
+                           "timestamp", "created_at", "updated_at"), movements()),
+        ):
+            started = time.perf_counter()
+            counts[table] = _load(conn, dialect, table, columns, rows)
+            print(f"{table:<10} {counts[table]:>12,} rows in {time.perf_counter() - started:8.1f}s")
+        if dialect == "postgresql":
+            cursor = conn.cursor()
+            # Explicit ids were loaded, move the sequences past them
+            for table in ("branches", "products"):
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+            conn.commit()
+            cursor.close()
+        return counts
+    finally:
+        conn.close()
+
+
+def drop_schema():
+    Base.metadata.drop_all(engine)
+    schema_migrations.drop(engine, checkfirst=True)
+
+
+async def main(args):
+    if args.reset:
+        await asyncio.to_thread(drop_schema)
+    await bootstrap()
+    async with AsyncSessionLocal() as db:
+        if await db.scalar(select(func.count()).select_from(Product)):
+            raise SystemExit("Database already has products; pass --reset to drop and regenerate the benchmark tables.")
+        user_id = await db.scalar(select(User.id).where(User.username == "admin"))
+
+    await asyncio.to_thread(generate, args, user_id)
+
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        await rebuild_stock_totals(db)
+        await take_stock_checkpoint(db)
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    print(f"{'totals':<10} rebuilt with checkpoint in {time.perf_counter() - started:8.1f}s")
+    await async_engine.dispose()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="small", help="preset sizes, overridden by the options below")
+    parser.add_argument("--branches", type=int)
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--stock-per-product", type=int, help="branches stocking each product")
+    parser.add_argument("--movements", type=int)
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for reproducible datasets")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate the application tables first")
+    args = parser.parse_args(argv)
+    for name, default in zip(("branches", "products", "stock_per_product", "movements"), SCALES[args.scale]):
+        if getattr(args, name) is None:
+            setattr(args, name, default)
+    if args.branches < 2:
+        parser.error("--branches must be at least 2")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,175 @@
+"""Drive the API at a target concurrency and report latency percentiles.
+
+Runs each scenario for a number of requests with `--concurrency` clients and
+prints p50/p95/p99 latency, throughput and the status codes seen. By default
+the app is served in-process over ASGI against the configured database (load
+it first with benchmarks.datagen); with --url a running server is measured,
+e.g. uvicorn with several workers, which is closer to production.
+
+    python -m benchmarks.load --concurrency 32 --requests 2000
+    python -m benchmarks.load --url http://localhost:8000 --scenarios products stock --json results.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import httpx
+from sqlalchemy import func, select
+
+from benchmarks.datagen import GRAPES, REGIONS, VINTAGES
+from cruds.product import WINE_SORTS
+
+ADMIN = {"username": "admin", "password": "admin123"}
+CLIENT = {"client_id": "app123", "client_secret": "secret456"}
+SCENARIOS = ("token", "products", "stock", "movements")
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def token_form() -> dict:
+    return {"grant_type": "password", **ADMIN, **CLIENT}
+
+
+def request_factories(branches: int, products: int, rng: random.Random) -> dict:
+    """Scenario name -> function returning (method, path, request kwargs) for one request."""
+    sorts = list(WINE_SORTS)
+
+    def token():
+        return "POST", "/auth/token", {"data": token_form()}
+
+    def products_list():
+        params = {"sort": rng.choice(sorts), "size": 50}
+        roll = rng.random()
+        if roll < 0.3:
+            params["region"] = rng.choice(REGIONS)
+        elif roll < 0.5:
+            params["vintage"] = rng.choice(VINTAGES)
+        elif roll < 0.7:
+            params = {"q": rng.choice(GRAPES + REGIONS)[:5], "size": 50}
+        return "GET", "/products", {"params": params}
+
+    def stock():
+        return "GET", "/stock", {"params": {"branch_id": rng.randint(1, branches), "size": 100}}
+
+    def movements():
+        origin, destination = rng.sample(range(1, branches + 1), 2)
+        body = {"product_id": rng.randint(1, products), "quantity": 1, "origin_branch_id": origin,
+                "destination_branch_id": destination, "user_id": 1}
+        return "POST", "/movements", {"json": body}
+
+    return {"token": token, "products": products_list, "stock": stock, "movements": movements}
+
+
+async def run_scenario(client: httpx.AsyncClient, make_request, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while issued < total:
+            issued += 1
+            method, path, kwargs = make_request()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "statuses": dict(statuses),
+    }
+
+
+@asynccontextmanager
+async def open_client(url: str | None, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if url:
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            yield client
+        return
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=60) as client:
+            yield client
+
+
+async def dataset_size() -> tuple[int, int]:
+    """Branch and product id ranges of the generated dataset."""
+    from db.base import AsyncSessionLocal, async_engine
+    from models.branch import Branch
+    from models.product import Product
+    async with AsyncSessionLocal() as db:
+        branches = await db.scalar(select(func.max(Branch.id)))
+        products = await db.scalar(select(func.max(Product.id)))
+    await async_engine.dispose()
+    return branches or 0, products or 0
+
+
+async def main(args):
+    branches, products = args.branches, args.products
+    if not (branches and products):
+        branches, products = await dataset_size()
+    if branches < 2 or not products:
+        raise SystemExit("No dataset found; run python -m benchmarks.datagen first or pass --branches/--products.")
+
+    factories = request_factories(branches, products, random.Random(args.seed))
+    results = {}
+    async with open_client(args.url, args.concurrency) as client:
+        response = await client.post("/auth/token", data=token_form())
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        for name in args.scenarios:
+            # Warm caches and connection pools so they do not skew the percentiles
+            await run_scenario(client, factories[name], args.concurrency, min(args.warmup, args.requests))
+            results[name] = await run_scenario(client, factories[name], args.concurrency, args.requests)
+
+    print(f"{'scenario':<10} {'requests':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses")
+    for name, result in results.items():
+        print(f"{name:<10} {result['requests']:>8} {result['throughput']:>9} {result['p50_ms']:>9} "
+              f"{result['p95_ms']:>9} {result['p99_ms']:>9} {result['max_ms']:>9}  {result['statuses']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"concurrency": args.concurrency, "url": args.url, "results": results}, f, indent=2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server; default serves the app in-process")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per scenario")
+    parser.add_argument("--branches", type=int, help="branch id range, read from the database by default")
+    parser.add_argument("--products", type=int, help="product id range, read from the database by default")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the results to this file, to compare commits")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,87 @@
+"""Serialization cost of a /stock and /movements page.
+
+Compares the previous path (ORM-like objects validated through the
+from_attributes response models, then encoded with the stdlib JSON encoder)
+with the projected-row path the list endpoints use now (plain dicts straight
+to orjson), plus TypeAdapter validation of the same dicts for reference.
+Only serialization is measured; no database is needed.
+
+    python -m benchmarks.serialization [--size 100] [--rounds 2000]
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import orjson
+from pydantic import TypeAdapter
+
+from schemas.movement import MovementResponse
+from schemas.stock import StockResponse
+
+
+def make_rows(size: int) -> tuple[list[dict], list[dict]]:
+    now = datetime(2025, 1, 1)
+    stock_rows, movement_rows = [], []
+    for i in range(1, size + 1):
+        product = {
+            "id": i, "name": f"Wine {i}", "vintage": 2000 + i % 25, "region": "Mendoza",
+            "grape_variety": "Malbec", "created_at": now, "updated_at": now + timedelta(seconds=i),
+        }
+        stock_rows.append({
+            "id": i, "product_id": i, "branch_id": 1 + i % 5, "quantity": i * 3,
+            "created_at": now, "updated_at": now, "product": product,
+        })
+        movement_rows.append({
+            "id": i, "product_id": i, "quantity": 1 + i % 12, "origin_branch_id": 1, "destination_branch_id": 2,
+            "user_id": 1, "notes": None if i % 2 else "restock", "timestamp": now, "created_at": now, "updated_at": now,
+        })
+    return stock_rows, movement_rows
+
+
+def as_objects(rows: list[dict]) -> list[SimpleNamespace]:
+    return [SimpleNamespace(**{k: SimpleNamespace(**v) if isinstance(v, dict) else v for k, v in row.items()})
+            for row in rows]
+
+
+def page(items: list) -> dict:
+    return {"items": items, "total": None, "current_page": None, "current_page_backwards": None,
+            "previous_page": None, "next_page": "eyJzIjoiaWRfYXNjIn0"}
+
+
+def run(name: str, model, rows: list[dict], rounds: int):
+    objects = as_objects(rows)
+    adapter = TypeAdapter(list[model])
+
+    def orm_models():
+        items = [model.model_validate(obj).model_dump(mode="json") for obj in objects]
+        return json.dumps(page(items)).encode()
+
+    def type_adapter():
+        return orjson.dumps(page(adapter.dump_python(adapter.validate_python(rows))))
+
+    def projected():
+        return orjson.dumps(page(rows))
+
+    assert json.loads(orm_models()) == json.loads(projected()), f"{name}: payloads differ"
+    baseline = None
+    for label, fn in (("from_attributes + json", orm_models), ("TypeAdapter + orjson", type_adapter),
+                      ("projected rows + orjson", projected)):
+        per_page = min(timeit.repeat(fn, number=rounds, repeat=3)) / rounds * 1e6
+        baseline = baseline or per_page
+        print(f"{name:<12} {label:<26} {per_page:10.1f} us/page  {baseline / per_page:6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100, help="items per page")
+    parser.add_argument("--rounds", type=int, default=2000, help="pages serialized per measurement")
+    args = parser.parse_args()
+    stock_rows, movement_rows = make_rows(args.size)
+    run("/stock", StockResponse, stock_rows, args.rounds)
+    run("/movements", MovementResponse, movement_rows, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
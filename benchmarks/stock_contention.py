@@ -0,0 +1,132 @@
+"""Throughput of concurrent decrements on one hot stock row, single row vs shards.
+
+Every client applies `delta=-1` to the same (product_id, branch_id) through
+cruds.stock.adjust_stock, each in its own session, first on the plain row and
+then with the row split into `--shards` shards. Prints throughput and latency
+percentiles per mode. Afterwards the shards are compacted and the run checks
+that the row never went negative and that the quantity and the summary totals
+account for every applied decrement. Meant for Postgres, where row locks are
+what serializes writers; SQLite locks the whole database and shows no gain.
+Load a dataset first with benchmarks.datagen.
+
+    python -m benchmarks.stock_contention --concurrency 64 --requests 5000 --shards 16
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from benchmarks.load import percentile
+from cruds.stock import adjust_stock, compact_stock_shards, set_stock_shards, update_stock
+from cruds.stock_shard import refresh_sharded_stock, stock_quantity
+from db.base import AsyncSessionLocal, async_engine
+from models.stock import Stock
+from models.stock_shard import StockShard
+from models.stock_total import BranchStockTotal, ProductStockTotal
+from schemas.stock import StockAdjustment, StockUpdate
+
+
+async def run_mode(adjustment: StockAdjustment, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while issued < total:
+            issued += 1
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                try:
+                    await adjust_stock(db, adjustment)
+                    statuses["applied"] += 1
+                except HTTPException as e:
+                    statuses[str(e.status_code)] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "statuses": dict(statuses),
+    }
+
+
+async def snapshot(stock_id: int, product_id: int, branch_id: int) -> tuple[int, int, int, int]:
+    """(quantity with shards, smallest shard or row quantity, product total, branch total)."""
+    async with AsyncSessionLocal() as db:
+        quantity = await db.scalar(select(stock_quantity()).where(Stock.id == stock_id))
+        smallest = await db.scalar(select(func.min(StockShard.quantity)).where(StockShard.stock_id == stock_id))
+        row = await db.scalar(select(Stock.quantity).where(Stock.id == stock_id))
+        product_total = await db.scalar(select(ProductStockTotal.quantity).where(ProductStockTotal.product_id == product_id))
+        branch_total = await db.scalar(select(BranchStockTotal.quantity).where(BranchStockTotal.branch_id == branch_id))
+    return quantity, min(row, smallest if smallest is not None else row), product_total or 0, branch_total or 0
+
+
+async def main(args):
+    async with AsyncSessionLocal() as db:
+        query = select(Stock.id, Stock.product_id, Stock.branch_id).order_by(Stock.id).limit(1)
+        if args.stock_id:
+            query = query.where(Stock.id == args.stock_id)
+        row = (await db.execute(query)).first()
+    if row is None:
+        raise SystemExit("No stock row found; run python -m benchmarks.datagen first or pass --stock-id.")
+    adjustment = StockAdjustment(product_id=row.product_id, branch_id=row.branch_id, delta=-1)
+
+    results = {}
+    for mode, shards in (("row", 0), (f"{args.shards} shards", args.shards)):
+        async with AsyncSessionLocal() as db:
+            await set_stock_shards(db, row.id, 0)
+            await update_stock(db, row.id, StockUpdate(quantity=args.initial))
+            await set_stock_shards(db, row.id, shards)
+            await refresh_sharded_stock(db)
+        before = await snapshot(row.id, row.product_id, row.branch_id)
+        results[mode] = await run_mode(adjustment, args.concurrency, args.requests)
+        async with AsyncSessionLocal() as db:
+            await compact_stock_shards(db)
+        after = await snapshot(row.id, row.product_id, row.branch_id)
+
+        applied = results[mode]["statuses"].get("applied", 0)
+        checks = {
+            "non_negative": after[1] >= 0,
+            "quantity": before[0] - after[0] == applied,
+            "product_total": before[2] - after[2] == applied,
+            "branch_total": before[3] - after[3] == applied,
+        }
+        results[mode]["checks"] = "ok" if all(checks.values()) else \
+            "FAILED: " + ", ".join(name for name, ok in checks.items() if not ok)
+
+    async with AsyncSessionLocal() as db:
+        await set_stock_shards(db, row.id, 0)
+    await async_engine.dispose()
+
+    print(f"stock id={row.id}, {args.concurrency} clients, {args.requests} decrements of 1 from {args.initial}")
+    print(f"{'mode':<12} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}  checks  statuses")
+    for mode, result in results.items():
+        print(f"{mode:<12} {result['throughput']:>9} {result['p50_ms']:>9} {result['p99_ms']:>9}  "
+              f"{result['checks']}  {result['statuses']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock-id", type=int, help="stock row to hammer, the first one by default")
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="decrements per mode")
+    parser.add_argument("--initial", type=int, default=1_000_000, help="quantity set before each mode")
+    args = parser.parse_args(argv)
+    if not 1 <= args.shards <= 64:
+        parser.error("--shards must be between 1 and 64")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -1,54 +1,77 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.branch import Branch
 from models.stock import Stock
 from models.movement import Movement
 from schemas.branch import BranchCreate, BranchUpdate
+from utils.conditional import list_validator
+from utils.pagination import row_to_dict
+from utils.shared_cache import catalog_cache
 from fastapi import HTTPException
 
-def get_branches(db: Session):
+# Cache namespace of branch reads; every branch write invalidates it
+BRANCHES_CACHE = "branches"
+RESPONSE_COLUMNS = (Branch.id, Branch.name, Branch.created_at, Branch.updated_at)
+
+def get_branches():
     """Get all branches."""
-    return db.query(Branch).order_by(Branch.id.asc())
+    return select(Branch).order_by(Branch.id.asc())
+
+async def get_branches_validator(db: AsyncSession):
+    """(latest updated_at, row count) of the branch list (cached)."""
+    return await catalog_cache.get_or_load(db, BRANCHES_CACHE, ("validator",),
+                                           lambda session: list_validator(session, get_branches(), Branch.updated_at))
 
-def get_branch(db: Session, branch_id: int):
+async def get_branch(db: AsyncSession, branch_id: int):
     """Get a branch by ID."""
-    return db.query(Branch).filter(Branch.id == branch_id).first()
+    return await db.scalar(select(Branch).where(Branch.id == branch_id))
+
+async def get_branch_response(db: AsyncSession, branch_id: int) -> dict | None:
+    """Get a branch by ID as a response dict (cached), for read-only use."""
+    async def load(session: AsyncSession):
+        row = (await session.execute(select(*RESPONSE_COLUMNS).where(Branch.id == branch_id))).first()
+        return row_to_dict(row) if row else None
+    return await catalog_cache.get_or_load(db, BRANCHES_CACHE, ("id", branch_id), load)
 
-def create_branch(db: Session, branch: BranchCreate):
+async def create_branch(db: AsyncSession, branch: BranchCreate):
     """Create a new branch."""
-    existing_branch = db.query(Branch).filter(Branch.name == branch.name).first()
+    existing_branch = await db.scalar(select(Branch).where(Branch.name == branch.name))
     if existing_branch:
         raise HTTPException(status_code=400, detail="Branch name already exists")
     db_branch = Branch(**branch.model_dump())
     db.add(db_branch)
-    db.commit()
-    db.refresh(db_branch)
+    await db.commit()
+    await catalog_cache.invalidate(BRANCHES_CACHE)
+    await db.refresh(db_branch)
     return db_branch
 
-def update_branch(db: Session, branch_id: int, branch_data: BranchUpdate):
+async def update_branch(db: AsyncSession, branch_id: int, branch_data: BranchUpdate):
     """Update a branch."""
-    branch = get_branch(db, branch_id)
+    branch = await get_branch(db, branch_id)
     if not branch:
         return None
     update_data = branch_data.model_dump(exclude_unset=True)
     if "name" in update_data and update_data["name"]:
-        existing_branch = db.query(Branch).filter(Branch.name == update_data["name"], Branch.id != branch_id).first()
+        existing_branch = await db.scalar(select(Branch).where(Branch.name == update_data["name"], Branch.id != branch_id))
         if existing_branch:
             raise HTTPException(status_code=400, detail="Branch name already exists")
     for key, value in update_data.items():
         setattr(branch, key, value)
-    db.commit()
-    db.refresh(branch)
+    await db.commit()
+    await catalog_cache.invalidate(BRANCHES_CACHE)
+    await db.refresh(branch)
     return branch
 
-def delete_branch(db: Session, branch_id: int):
+async def delete_branch(db: AsyncSession, branch_id: int):
     """Delete a branch."""
-    branch = get_branch(db, branch_id)
+    branch = await get_branch(db, branch_id)
     if not branch:
         return False
     # Check for associated stock or movements
-    if db.query(Stock).filter(Stock.branch_id == branch_id).first() or \
-       db.query(Movement).filter((Movement.origin_branch_id == branch_id) | (Movement.destination_branch_id == branch_id)).first():
+    if await db.scalar(select(Stock.id).where(Stock.branch_id == branch_id).limit(1)) or \
+       await db.scalar(select(Movement.id).where((Movement.origin_branch_id == branch_id) | (Movement.destination_branch_id == branch_id)).limit(1)):
         raise HTTPException(status_code=400, detail="Cannot delete branch with associated stock or movements")
-    db.delete(branch)
-    db.commit()
-    return True
\ No newline at end of file
+    await db.delete(branch)
+    await db.commit()
+    await catalog_cache.invalidate(BRANCHES_CACHE)
+    return True
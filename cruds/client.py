@@ -1,44 +1,45 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.client import Client
 from schemas.client import ClientCreate, ClientUpdate
 from fastapi import HTTPException
 
-def create_client(db: Session, client: ClientCreate):
+async def create_client(db: AsyncSession, client: ClientCreate):
     """Create a new client."""
-    if db.query(Client).filter(Client.email == client.email).first():
+    if await db.scalar(select(Client).where(Client.email == client.email)):
         raise HTTPException(status_code=400, detail="Email already exists")
     db_client = Client(**client.model_dump())
     db.add(db_client)
-    db.commit()
-    db.refresh(db_client)
+    await db.commit()
+    await db.refresh(db_client)
     return db_client
 
 
-def get_clients(db: Session):
+def get_clients():
     """Get all clients."""
-    return db.query(Client).order_by(Client.id.asc())
+    return select(Client).order_by(Client.id.asc())
 
-def update_client(db: Session, client_id: int, client_data: ClientUpdate):
+async def update_client(db: AsyncSession, client_id: int, client_data: ClientUpdate):
     """Update a client."""
-    client = db.query(Client).filter(Client.id == client_id).first()
+    client = await db.scalar(select(Client).where(Client.id == client_id))
     if not client:
         return None
     update_data = client_data.model_dump(exclude_unset=True)
     if "email" in update_data and update_data["email"]:
-        existing_client = db.query(Client).filter(Client.email == update_data["email"], Client.id != client_id).first()
+        existing_client = await db.scalar(select(Client).where(Client.email == update_data["email"], Client.id != client_id))
         if existing_client:
             raise HTTPException(status_code=400, detail="Email already exists")
     for key, value in update_data.items():
         setattr(client, key, value)
-    db.commit()
-    db.refresh(client)
+    await db.commit()
+    await db.refresh(client)
     return client
 
-def delete_client(db: Session, client_id: int):
+async def delete_client(db: AsyncSession, client_id: int):
     """Delete a client."""
-    client = db.query(Client).filter(Client.id == client_id).first()
+    client = await db.scalar(select(Client).where(Client.id == client_id))
     if not client:
         return False
-    db.delete(client)
-    db.commit()
-    return True
\ No newline at end of file
+    await db.delete(client)
+    await db.commit()
+    return True
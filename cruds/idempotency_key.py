@@ -0,0 +1,71 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.base import utcnow
+from db.dialect import upsert_insert
+from models.idempotency_key import IdempotencyKey
+
+_last_purge = 0.0
+
+
+def _key_filter(owner_id: int, key: str):
+    return (IdempotencyKey.owner_id == owner_id, IdempotencyKey.key == key)
+
+
+async def purge_expired_keys(db: AsyncSession, interval: float) -> int | None:
+    """Delete expired keys, at most once per interval seconds per worker."""
+    global _last_purge
+    if time.monotonic() - _last_purge < interval:
+        return None
+    _last_purge = time.monotonic()
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < utcnow()))
+    return result.rowcount
+
+
+def lease_expired(record: IdempotencyKey, lease: float) -> bool:
+    """Whether an in-progress key was claimed more than lease seconds ago, so its attempt is presumed dead."""
+    return record.status_code is None and record.created_at < utcnow() - timedelta(seconds=lease)
+
+
+async def claim_key(db: AsyncSession, owner_id: int, key: str, fingerprint: str, ttl: int, lease: float) -> datetime | None:
+    """Record a new in-progress key, or take over one whose lease expired for the same request.
+
+    Returns the claim time, which identifies this claim in complete_key and
+    release_key, or None when the key is taken (and not expired).
+    """
+    now = utcnow()
+    await db.execute(delete(IdempotencyKey).where(*_key_filter(owner_id, key), IdempotencyKey.expires_at < now))
+    stmt = upsert_insert(db, IdempotencyKey).values(
+        owner_id=owner_id, key=key, fingerprint=fingerprint, created_at=now, expires_at=now + timedelta(seconds=ttl),
+    ).on_conflict_do_nothing(index_elements=[IdempotencyKey.owner_id, IdempotencyKey.key])
+    claimed = (await db.execute(stmt.returning(IdempotencyKey.key))).first() is not None
+    if not claimed:
+        result = await db.execute(update(IdempotencyKey).where(
+            *_key_filter(owner_id, key), IdempotencyKey.fingerprint == fingerprint, IdempotencyKey.status_code.is_(None),
+            IdempotencyKey.created_at < now - timedelta(seconds=lease),
+        ).values(created_at=now, expires_at=now + timedelta(seconds=ttl)))
+        claimed = result.rowcount == 1
+    await db.commit()
+    return now if claimed else None
+
+
+async def get_key(db: AsyncSession, owner_id: int, key: str) -> IdempotencyKey | None:
+    return await db.scalar(select(IdempotencyKey).where(*_key_filter(owner_id, key)).execution_options(populate_existing=True))
+
+
+def _claim_filter(owner_id: int, key: str, claimed_at: datetime):
+    return (*_key_filter(owner_id, key), IdempotencyKey.created_at == claimed_at, IdempotencyKey.status_code.is_(None))
+
+
+async def complete_key(db: AsyncSession, owner_id: int, key: str, claimed_at: datetime, status_code: int, body: bytes) -> bool:
+    """Store the response of an attempt in the caller's transaction; False if its claim was taken over meanwhile."""
+    result = await db.execute(update(IdempotencyKey).where(*_claim_filter(owner_id, key, claimed_at))
+                              .values(status_code=status_code, response_body=body))
+    return result.rowcount == 1
+
+
+async def release_key(db: AsyncSession, owner_id: int, key: str, claimed_at: datetime):
+    """Forget an attempt that failed without a definitive response, so it can be retried."""
+    await db.execute(delete(IdempotencyKey).where(*_claim_filter(owner_id, key, claimed_at)))
+    await db.commit()
@@ -1,71 +1,218 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
+from db.dialect import upsert_insert
+from cruds.stock import apply_stock_totals, fold_stock_shards
+from cruds.stock_event import record_stock_events
+from cruds.stock_shard import stock_quantity
 from models.movement import Movement
 from models.stock import Stock
-from models.user import User
 from models.product import Product
 from models.branch import Branch
+from models.user import User
 from schemas.movement import MovementCreate
 from fastapi import HTTPException
 
+# Foreign key violations raised by the transfer statements, mapped to API errors
+FOREIGN_KEY_ERRORS = (
+    ("stock_product_id_fkey", "Product not found"),
+    ("stock_branch_id_fkey", "Destination branch not found"),
+    ("movements_user_id_fkey", "User not found"),
+)
+
+
+def debit_stock_statement(product_id: int, branch_id: int, quantity: int):
+    """Conditional debit: only matches when the branch holds enough stock; returns the quantity left."""
+    return (
+        update(Stock)
+        .where(Stock.product_id == product_id, Stock.branch_id == branch_id, Stock.quantity >= quantity)
+        .values(quantity=Stock.quantity - quantity)
+        .returning(stock_quantity())
+    )
+
+
+def credit_stock_statement(db: AsyncSession, product_id: int, branch_id: int, quantity: int):
+    """Credit a branch, creating its stock row through uix_product_branch if missing; returns the new quantity."""
+    stmt = upsert_insert(db, Stock).values(product_id=product_id, branch_id=branch_id, quantity=quantity)
+    return stmt.on_conflict_do_update(
+        index_elements=[Stock.product_id, Stock.branch_id],
+        set_={"quantity": Stock.quantity + stmt.excluded.quantity, "updated_at": stmt.excluded.updated_at},
+    ).returning(stock_quantity())
+
+
+def foreign_key_error(error: IntegrityError) -> HTTPException:
+    """Translate a foreign key violation into the matching not-found error."""
+    message = str(error.orig)
+    for constraint, detail in FOREIGN_KEY_ERRORS:
+        if constraint in message:
+            return HTTPException(status_code=404, detail=detail)
+    return HTTPException(status_code=500, detail="Error registering movement")
+
+
+async def transfer_foreign_key_error(db: AsyncSession, movement: MovementCreate, error: IntegrityError) -> HTTPException:
+    """foreign_key_error for a transfer; SQLite does not name the violated constraint, so look it up (cold path only)."""
+    mapped = foreign_key_error(error)
+    if mapped.status_code != 500:
+        return mapped
+    references = (
+        (Product.id, movement.product_id, "Product not found"),
+        (Branch.id, movement.destination_branch_id, "Destination branch not found"),
+        (User.id, movement.user_id, "User not found"),
+    )
+    for column, value, detail in references:
+        if not await db.scalar(select(column).where(column == value)):
+            return HTTPException(status_code=404, detail=detail)
+    return mapped
+
+
+async def debit_failure(db: AsyncSession, movement: MovementCreate) -> HTTPException:
+    """Explain why the conditional debit matched no row (cold path only)."""
+    if not await db.scalar(select(Product.id).where(Product.id == movement.product_id)):
+        return HTTPException(status_code=404, detail="Product not found")
+    if not await db.scalar(select(Branch.id).where(Branch.id == movement.origin_branch_id)):
+        return HTTPException(status_code=404, detail="Origin branch not found")
+    return HTTPException(status_code=400, detail="Insufficient stock at origin branch")
 
-def create_movement(db: Session, movement: MovementCreate):
-    """Create a stock movement between branches."""
-    # Verify user exists
-    user = db.query(User).filter(User.id == movement.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Verify product and branches exist
-    product = db.query(Product).filter(Product.id == movement.product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    origin_branch = db.query(Branch).filter(Branch.id == movement.origin_branch_id).first()
-    if not origin_branch:
-        raise HTTPException(status_code=404, detail="Origin branch not found")
-    dest_branch = db.query(Branch).filter(Branch.id == movement.destination_branch_id).first()
-    if not dest_branch:
-        raise HTTPException(status_code=404, detail="Destination branch not found")
-
-    # Verify stock availability
-    origin_stock = db.query(Stock).filter(
-        Stock.product_id == movement.product_id,
-        Stock.branch_id == movement.origin_branch_id
-    ).first()
-    if not origin_stock or origin_stock.quantity < movement.quantity:
-        raise HTTPException(status_code=400, detail="Insufficient stock at origin branch")
-
-    # Find or create destination stock
-    dest_stock = db.query(Stock).filter(
-        Stock.product_id == movement.product_id,
-        Stock.branch_id == movement.destination_branch_id
-    ).first()
-    if not dest_stock:
-        dest_stock = Stock(
-            product_id=movement.product_id,
-            branch_id=movement.destination_branch_id,
-            quantity=0
-        )
-        db.add(dest_stock)
-        db.flush()  # Ensure dest_stock has an ID
-
-    # Update stock quantities
-    origin_stock.quantity -= movement.quantity
-    dest_stock.quantity += movement.quantity
-
-    # Create movement
-    db_movement = Movement(**movement.model_dump())
-    db.add(db_movement)
+
+async def create_movement(db: AsyncSession, movement: MovementCreate, retry: bool = True):
+    """Create a stock movement between branches.
+
+    The debit, the credit and the movement row are written in one transaction
+    without reading first. The debit is a conditional UPDATE, so concurrent
+    transfers cannot oversell, and both stock rows are locked in branch id
+    order so opposite transfers cannot deadlock. Write requests always get a
+    primary session from get_db, so the failure diagnosis never reads a replica.
+    When the origin row is sharded and its own quantity falls short, the shards
+    are folded into it and the transfer is tried once more.
+    """
+    debit = debit_stock_statement(movement.product_id, movement.origin_branch_id, movement.quantity)
+    credit = credit_stock_statement(db, movement.product_id, movement.destination_branch_id, movement.quantity)
 
     try:
-        db.commit()
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(status_code=500, detail="Error registering movement")
+        if movement.destination_branch_id < movement.origin_branch_id:
+            credited = await db.scalar(credit)
+            remaining = await db.scalar(debit)
+        else:
+            remaining = await db.scalar(debit)
+            if remaining is not None:
+                credited = await db.scalar(credit)
+        if remaining is None:
+            await db.rollback()
+            if retry and await fold_stock_shards(
+                db, Stock.product_id == movement.product_id, Stock.branch_id == movement.origin_branch_id
+            ):
+                await db.commit()
+                return await create_movement(db, movement, retry=False)
+            raise await debit_failure(db, movement)
+        # The company-wide product total is unchanged, only the branch totals move
+        origin = (movement.product_id, movement.origin_branch_id)
+        destination = (movement.product_id, movement.destination_branch_id)
+        deltas = {origin: -movement.quantity, destination: movement.quantity}
+        await apply_stock_totals(db, deltas)
+        await record_stock_events(db, "movement", {origin: remaining, destination: credited}, deltas)
+
+        db_movement = Movement(**movement.model_dump())
+        db.add(db_movement)
+        await db.flush()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise await transfer_foreign_key_error(db, movement, e)
 
-    db.refresh(db_movement)
     return db_movement
 
 
-def list_movements(db: Session):
-    return db.query(Movement).order_by(Movement.id.asc())
+async def create_movements_batch(db: AsyncSession, movements: list[MovementCreate], atomic: bool = True):
+    """Apply many stock movements with set-based validation and bulk writes.
+
+    Products, branches and the involved stock rows are read in three queries
+    (stock rows locked), items are checked in order against running balances,
+    then net quantity changes and the movement rows are written in bulk.
+    Returns the per-item results and the number of movements created.
+    """
+    product_ids = {m.product_id for m in movements}
+    branch_ids = {m.origin_branch_id for m in movements} | {m.destination_branch_id for m in movements}
+    pairs = {(m.product_id, m.origin_branch_id) for m in movements} | \
+            {(m.product_id, m.destination_branch_id) for m in movements}
+
+    known_products = set((await db.scalars(select(Product.id).where(Product.id.in_(product_ids)))).all())
+    known_branches = set((await db.scalars(select(Branch.id).where(Branch.id.in_(branch_ids)))).all())
+    rows = await db.execute(
+        select(Stock.product_id, Stock.branch_id, Stock.quantity)
+        .where(tuple_(Stock.product_id, Stock.branch_id).in_(pairs))
+        .order_by(Stock.branch_id, Stock.product_id)
+        .with_for_update()
+    )
+    existing = {(r.product_id, r.branch_id): r.quantity for r in rows}
+    # Balances are checked against the rows alone, so sharded rows are folded, once all rows are locked in order
+    existing.update(await fold_stock_shards(db, tuple_(Stock.product_id, Stock.branch_id).in_(pairs)))
+
+    balances = dict(existing)
+    deltas: dict[tuple[int, int], int] = {}
+    results: list[dict] = []
+    accepted: list[tuple[int, MovementCreate]] = []
+    for index, m in enumerate(movements):
+        origin, destination = (m.product_id, m.origin_branch_id), (m.product_id, m.destination_branch_id)
+        if m.product_id not in known_products:
+            error = "Product not found"
+        elif m.origin_branch_id not in known_branches:
+            error = "Origin branch not found"
+        elif m.destination_branch_id not in known_branches:
+            error = "Destination branch not found"
+        elif balances.get(origin, 0) < m.quantity:
+            error = "Insufficient stock at origin branch"
+        else:
+            error = None
+        if error:
+            results.append({"index": index, "status": "failed", "error": error})
+            continue
+        balances[origin] -= m.quantity
+        balances[destination] = balances.get(destination, 0) + m.quantity
+        deltas[origin] = deltas.get(origin, 0) - m.quantity
+        deltas[destination] = deltas.get(destination, 0) + m.quantity
+        results.append({"index": index, "status": "created"})
+        accepted.append((index, m))
+
+    failed = len(movements) - len(accepted)
+    if not accepted or (atomic and failed):
+        await db.rollback()
+        for result in results:
+            if result["status"] == "created":
+                result["status"] = "skipped"
+        return results, 0
+
+    updates = [{"p": p, "b": b, "d": d} for (p, b), d in deltas.items() if (p, b) in existing and d]
+    inserts = [{"product_id": p, "branch_id": b, "quantity": d} for (p, b), d in deltas.items() if (p, b) not in existing]
+    try:
+        if updates:
+            table = Stock.__table__
+            await db.execute(
+                update(table)
+                .where(table.c.product_id == bindparam("p"), table.c.branch_id == bindparam("b"))
+                .values(quantity=table.c.quantity + bindparam("d")),
+                updates,
+            )
+        if inserts:
+            await db.execute(insert(Stock), inserts)
+        await apply_stock_totals(db, deltas)
+        await record_stock_events(db, "movement", {key: balances[key] for key in deltas}, deltas)
+        movement_ids = (await db.scalars(
+            insert(Movement).returning(Movement.id, sort_by_parameter_order=True),
+            [m.model_dump() for _, m in accepted],
+        )).all()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise foreign_key_error(e)
+
+    for (index, _), movement_id in zip(accepted, movement_ids):
+        results[index]["movement_id"] = movement_id
+    return results, len(accepted)
+
+
+def list_movements():
+    """Movements as plain MovementResponse columns, for list pages."""
+    return select(
+        Movement.id, Movement.product_id, Movement.quantity, Movement.origin_branch_id, Movement.destination_branch_id,
+        Movement.user_id, Movement.notes, Movement.timestamp, Movement.created_at, Movement.updated_at,
+    )
@@ -1,24 +1,75 @@
-from sqlalchemy.orm import Session
+import hashlib
+import hmac
+import os
+from dataclasses import dataclass
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.oauth_client import OAuthClient
-from utils.auth import verify_password
+from utils.cache import TTLCache
+from utils.hashing import credential_hasher, needs_rehash
+from utils.shared_cache import catalog_cache
 from fastapi import HTTPException, status
 
-def get_oauth_client_by_client_id(db: Session, client_id: str) -> OAuthClient:
+# Successfully verified credentials per worker: client_id -> (generation, keyed digest of the secret, client).
+# The digest key is random per process, so the cache never holds anything reusable as a secret.
+# Entries are tagged with the OAUTH_CLIENTS_CACHE generation, so a rotation on any worker retires them.
+OAUTH_CLIENTS_CACHE = "oauth_clients"
+_DIGEST_KEY = os.urandom(32)
+_verified_clients = TTLCache(maxsize=int(os.getenv("OAUTH_CLIENT_CACHE_SIZE", 1000)), ttl=float(os.getenv("OAUTH_CLIENT_CACHE_TTL", 60)))
+
+@dataclass(frozen=True)
+class VerifiedClient:
+    """Detached snapshot of an authenticated OAuth client."""
+    id: int
+    client_id: str
+    name: str
+
+def _secret_digest(client_secret: str) -> bytes:
+    return hmac.new(_DIGEST_KEY, client_secret.encode(), hashlib.sha256).digest()
+
+async def invalidate_oauth_client(client_id: str):
+    """Forget verified credentials for a client after it is created or rotated, on every worker."""
+    _verified_clients.pop(client_id)
+    await catalog_cache.invalidate(OAUTH_CLIENTS_CACHE)
+
+async def get_oauth_client_by_client_id(db: AsyncSession, client_id: str) -> OAuthClient:
     """Retrieve an OAuth client by client_id."""
-    return db.query(OAuthClient).filter(OAuthClient.client_id == client_id).first()
+    return await db.scalar(select(OAuthClient).where(OAuthClient.client_id == client_id))
 
-def validate_oauth_client(db: Session, client_id: str, client_secret: str) -> OAuthClient:
-    """Validate OAuth client credentials."""
-    client = get_oauth_client_by_client_id(db, client_id)
-    if not client or not verify_password(client.client_secret, client_secret):
+async def validate_oauth_client(db: AsyncSession, client_id: str, client_secret: str) -> VerifiedClient:
+    """Validate OAuth client credentials, skipping the lookup and key derivation for recently verified ones."""
+    digest = _secret_digest(client_secret)
+    generation = await catalog_cache.generation(OAUTH_CLIENTS_CACHE)
+    cached = _verified_clients.get(client_id)
+    if cached and generation is not None and cached[0] == generation and hmac.compare_digest(cached[1], digest):
+        return cached[2]
+
+    client = await get_oauth_client_by_client_id(db, client_id)
+    if not client or not await credential_hasher.verify(client.client_secret, client_secret):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid client credentials")
-    return client
+    if needs_rehash(client.client_secret):
+        client.client_secret = await credential_hasher.hash(client_secret)
+        await db.commit()
+    verified = VerifiedClient(id=client.id, client_id=client.client_id, name=client.name)
+    if generation is not None:
+        _verified_clients.set(client_id, (generation, digest, verified))
+    return verified
 
-def create_oauth_client(db: Session, client_id: str, client_secret: str, name: str) -> OAuthClient:
+async def create_oauth_client(db: AsyncSession, client_id: str, client_secret: str, name: str) -> OAuthClient:
     """Create a new OAuth client."""
-    client = OAuthClient(client_id=client_id, name=name)
-    client.set_client_secret(client_secret)
+    client = OAuthClient(client_id=client_id, name=name, client_secret=await credential_hasher.hash(client_secret))
     db.add(client)
-    db.commit()
-    db.refresh(client)
+    await db.commit()
+    await invalidate_oauth_client(client_id)
+    await db.refresh(client)
+    return client
+
+async def rotate_oauth_client_secret(db: AsyncSession, client_id: str, client_secret: str) -> OAuthClient | None:
+    """Replace an OAuth client's secret."""
+    client = await get_oauth_client_by_client_id(db, client_id)
+    if not client:
+        return None
+    client.client_secret = await credential_hasher.hash(client_secret)
+    await db.commit()
+    await invalidate_oauth_client(client_id)
     return client
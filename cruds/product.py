@@ -1,84 +1,312 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc
+import time
+from typing import AsyncIterator
+from pydantic import ValidationError
+from fastapi_pagination.cursor import CursorParams
+from sqlalchemy import case, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.dialect import upsert_insert
 from models.product import Product
 from models.stock import Stock
 from schemas.product import ProductCreate, ProductUpdate
+from utils.bulk import CSV, encode_rows
+from utils.conditional import list_validator
+from utils.logger import get_logger
+from utils.pagination import paginate_keyset, paginate_ranked, row_to_dict
+from utils.shared_cache import catalog_cache
 from fastapi import HTTPException
 
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_ERRORS = 1000  # Errors reported back; further failures are only counted
+EXPORT_COLUMNS = ("id", "name", "vintage", "region", "grape_variety", "created_at", "updated_at")
+EXPORT_PARTITION_SIZE = 1000
+# ProductResponse fields as plain columns; list pages skip ORM instances and model validation
+RESPONSE_COLUMNS = (Product.id, Product.name, Product.vintage, Product.region, Product.grape_variety,
+                    Product.created_at, Product.updated_at)
 
-def get_wines(db: Session, name: str | None = None, region: str | None = None, vintage: int | None = None,
-              sort: str = "id_asc"):
-    query = db.query(Product)
+logger = get_logger(__name__)
+
+# Cache namespace of product reads; every product write invalidates it
+PRODUCTS_CACHE = "products"
+# Seconds before a database found without pg_trgm is checked again
+TRIGRAM_RECHECK_INTERVAL = 60
+_trigram_checked_at: float | None = None
+_trigram_available = False
+
+# Sort name -> (key column, or None to sort by id only, descending, key is nullable)
+WINE_SORTS = {
+    "id_asc": (None, False, False),
+    "id_desc": (None, True, False),
+    "name_asc": (Product.name, False, False),
+    "name_desc": (Product.name, True, False),
+    "vintage_asc": (Product.vintage, False, True),
+    "vintage_desc": (Product.vintage, True, True),
+}
+
+
+def filter_wines(name: str | None = None, region: str | None = None, vintage: int | None = None):
+    query = select(Product)
 
     # Apply filters
     if name:
-        query = query.filter(Product.name.ilike(f"%{name}%"))
+        query = query.where(Product.name.ilike(f"%{name}%"))
     if region:
-        query = query.filter(Product.region == region)
+        query = query.where(Product.region == region)
     if vintage:
-        query = query.filter(Product.vintage == vintage)
-
-    # Apply sorting (always include id for uniqueness)
-    if sort == "id_asc":
-        query = query.order_by(asc(Product.id))
-    elif sort == "id_desc":
-        query = query.order_by(desc(Product.id))
-    elif sort == "name_asc":
-        query = query.order_by(asc(Product.name), asc(Product.id))  # Include id for uniqueness
-    elif sort == "name_desc":
-        query = query.order_by(desc(Product.name), asc(Product.id))
-    elif sort == "vintage_asc":
-        query = query.order_by(asc(Product.vintage), asc(Product.id))
-    elif sort == "vintage_desc":
-        query = query.order_by(desc(Product.vintage), asc(Product.id))
-    else:
-        raise ValueError(f"Invalid sort parameter: {sort}")
+        query = query.where(Product.vintage == vintage)
 
     return query
 
 
-def get_wine(db: Session, wine_id: int):
+def order_wines(query, sort: str = "id_asc"):
+    """Apply a sort, always including id for uniqueness, in the same direction as the key."""
+    if sort not in WINE_SORTS:
+        raise ValueError(f"Invalid sort parameter: {sort}")
+    key, descending, nullable = WINE_SORTS[sort]
+    order_by = []
+    if key is not None:
+        clause = key.desc() if descending else key.asc()
+        if nullable:
+            # NULL vintages sort as the largest value, matching the keyset cursor
+            clause = clause.nulls_first() if descending else clause.nulls_last()
+        order_by.append(clause)
+    order_by.append(Product.id.desc() if descending else Product.id.asc())
+    return query.order_by(*order_by)
+
+
+def get_wines(name: str | None = None, region: str | None = None, vintage: int | None = None,
+              sort: str = "id_asc"):
+    return order_wines(filter_wines(name=name, region=region, vintage=vintage), sort)
+
+
+async def get_wines_page(db: AsyncSession, params: CursorParams, name: str | None = None, region: str | None = None,
+                         vintage: int | None = None, sort: str = "id_asc") -> dict:
+    """Get one keyset-paginated page of wines for the given filters and sort (cached)."""
+    if sort not in WINE_SORTS:
+        raise ValueError(f"Invalid sort parameter: {sort}")
+    key, descending, nullable = WINE_SORTS[sort]
+    query = filter_wines(name=name, region=region, vintage=vintage).with_only_columns(*RESPONSE_COLUMNS)
+    return await catalog_cache.get_or_load(
+        db, PRODUCTS_CACHE, ("page", name or None, region or None, vintage, sort, params.cursor, params.size),
+        lambda session: paginate_keyset(session, query, params, sort, key, Product.id, descending=descending,
+                                        nullable=nullable, row_factory=row_to_dict),
+    )
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def trigram_search_available(db: AsyncSession) -> bool:
+    """Whether the database has pg_trgm, so ?q= can use similarity instead of ILIKE.
+
+    Databases migrated before the extension was installed do not have it;
+    a positive answer is kept for the process, a negative one re-checked
+    every TRIGRAM_RECHECK_INTERVAL seconds.
+    """
+    global _trigram_checked_at, _trigram_available
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    if _trigram_available or (_trigram_checked_at and time.monotonic() - _trigram_checked_at < TRIGRAM_RECHECK_INTERVAL):
+        return _trigram_available
+    _trigram_available = bool(await db.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")))
+    _trigram_checked_at = time.monotonic()
+    if not _trigram_available:
+        logger.warning("pg_trgm is not installed, product search falls back to ILIKE; run the pending migrations")
+    return _trigram_available
+
+
+def search_wines(trigram: bool, q: str, region: str | None = None, vintage: int | None = None):
+    """Build a ranked search over name, region and grape variety.
+
+    With pg_trgm, matches use the GIN trigram indexes (similarity operator
+    plus name prefix) and are ranked by prefix match, then similarity.
+    Otherwise (other dialects, or Postgres without the extension) it falls
+    back to a substring ILIKE, prefix matches first.
+    """
+    query = filter_wines(region=region, vintage=vintage)
+    escaped = _like_escape(q)
+    prefix = Product.name.ilike(f"{escaped}%", escape="\\")
+    if trigram:
+        query = query.where(or_(
+            prefix,
+            Product.name.op("%")(q),
+            Product.region.op("%")(q),
+            Product.grape_variety.op("%")(q),
+        ))
+        rank = (
+            case((prefix, 1.0), else_=0.0)
+            + func.similarity(Product.name, q)
+            + 0.5 * func.coalesce(func.greatest(func.similarity(Product.region, q), func.similarity(Product.grape_variety, q)), 0.0)
+        )
+        return query.order_by(rank.desc(), Product.id.asc())
+    query = query.where(or_(
+        Product.name.ilike(f"%{escaped}%", escape="\\"),
+        Product.region.ilike(f"%{escaped}%", escape="\\"),
+        Product.grape_variety.ilike(f"%{escaped}%", escape="\\"),
+    ))
+    return query.order_by(case((prefix, 0), else_=1), Product.name.asc(), Product.id.asc())
+
+
+async def search_wines_page(db: AsyncSession, params: CursorParams, q: str, region: str | None = None,
+                            vintage: int | None = None) -> dict:
+    """Get one page of ranked search results (cached)."""
+    trigram = await trigram_search_available(db)
+    query = search_wines(trigram, q, region=region, vintage=vintage).with_only_columns(*RESPONSE_COLUMNS)
+    # The ranking differs between modes, so pages and cursors of one never serve the other
+    mode = "trigram" if trigram else "ilike"
+    return await catalog_cache.get_or_load(
+        db, PRODUCTS_CACHE, ("search", mode, q, region or None, vintage, params.cursor, params.size),
+        lambda session: paginate_ranked(session, query, params, tag=f"search:{mode}:{q}", row_factory=row_to_dict),
+    )
+
+
+async def get_wines_validator(db: AsyncSession, name: str | None = None, region: str | None = None,
+                              vintage: int | None = None, q: str | None = None):
+    """(latest updated_at, row count) of the products a list or search request covers (cached)."""
+    if q:
+        trigram = await trigram_search_available(db)
+        query = search_wines(trigram, q, region=region, vintage=vintage)
+        key = ("validator", "search", trigram, q, region or None, vintage)
+    else:
+        query = filter_wines(name=name, region=region, vintage=vintage)
+        key = ("validator", name or None, region or None, vintage)
+    return await catalog_cache.get_or_load(db, PRODUCTS_CACHE, key,
+                                           lambda session: list_validator(session, query, Product.updated_at))
+
+
+async def get_wine(db: AsyncSession, wine_id: int):
     """Get a wine by ID."""
-    return db.query(Product).filter(Product.id == wine_id).first()
+    return await db.scalar(select(Product).where(Product.id == wine_id))
+
 
+async def get_wine_response(db: AsyncSession, wine_id: int) -> dict | None:
+    """Get a wine by ID as a response dict (cached), for read-only use."""
+    async def load(session: AsyncSession):
+        row = (await session.execute(select(*RESPONSE_COLUMNS).where(Product.id == wine_id))).first()
+        return row_to_dict(row) if row else None
+    return await catalog_cache.get_or_load(db, PRODUCTS_CACHE, ("id", wine_id), load)
 
-def create_wine(db: Session, wine: ProductCreate):
+
+async def create_wine(db: AsyncSession, wine: ProductCreate):
     """Create a new wine."""
-    existing_wine = db.query(Product).filter(Product.name == wine.name).first()
+    existing_wine = await db.scalar(select(Product).where(Product.name == wine.name))
     if existing_wine:
         raise HTTPException(status_code=400, detail="Wine name already exists")
     db_wine = Product(**wine.model_dump())
     db.add(db_wine)
-    db.commit()
-    db.refresh(db_wine)
+    await db.commit()
+    await catalog_cache.invalidate(PRODUCTS_CACHE)
+    await db.refresh(db_wine)
     return db_wine
 
 
-def update_wine(db: Session, wine_id: int, wine_data: ProductUpdate):
+async def update_wine(db: AsyncSession, wine_id: int, wine_data: ProductUpdate):
     """Update a wine."""
-    wine = get_wine(db, wine_id)
+    wine = await get_wine(db, wine_id)
     if not wine:
         return None
     update_data = wine_data.model_dump(exclude_unset=True)
     if "name" in update_data and update_data["name"]:
-        existing_wine = db.query(Product).filter(Product.name == update_data["name"], Product.id != wine_id).first()
+        existing_wine = await db.scalar(select(Product).where(Product.name == update_data["name"], Product.id != wine_id))
         if existing_wine:
             raise HTTPException(status_code=400, detail="Wine name already exists")
     for key, value in update_data.items():
         setattr(wine, key, value)
-    db.commit()
-    db.refresh(wine)
+    await db.commit()
+    await catalog_cache.invalidate(PRODUCTS_CACHE)
+    await db.refresh(wine)
     return wine
 
 
-def delete_wine(db: Session, wine_id: int):
+async def delete_wine(db: AsyncSession, wine_id: int):
     """Delete a wine."""
-    wine = get_wine(db, wine_id)
+    wine = await get_wine(db, wine_id)
     if not wine:
         return False
     # Check for associated stock
-    if db.query(Stock).filter(Stock.product_id == wine_id).first():
+    if await db.scalar(select(Stock.id).where(Stock.product_id == wine_id).limit(1)):
         raise HTTPException(status_code=400, detail="Cannot delete wine with associated stock")
-    db.delete(wine)
-    db.commit()
-    return True
\ No newline at end of file
+    await db.delete(wine)
+    await db.commit()
+    await catalog_cache.invalidate(PRODUCTS_CACHE)
+    return True
+
+
+async def _upsert_wines(db: AsyncSession, rows: list[dict], mode: str) -> int:
+    """Insert one chunk of validated wines, skipping or updating existing names."""
+    stmt = upsert_insert(db, Product).values(rows)
+    if mode == "update":
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.name],
+            set_={
+                "vintage": stmt.excluded.vintage,
+                "region": stmt.excluded.region,
+                "grape_variety": stmt.excluded.grape_variety,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Product.name])
+    written = len((await db.scalars(stmt.returning(Product.id))).all())
+    await db.commit()
+    if written:
+        await catalog_cache.invalidate(PRODUCTS_CACHE)
+    return written
+
+
+async def import_wines(db: AsyncSession, records: AsyncIterator[tuple[int, dict | None, str | None]],
+                       mode: str = "skip") -> dict:
+    """Bulk import wines from parsed records, committing every IMPORT_CHUNK_SIZE rows.
+
+    Invalid rows are reported by line number and do not abort the import, and
+    so is every repeat of a name earlier in the file, whichever chunk it is in.
+    In "skip" mode existing names are left untouched, in "update" mode they are overwritten.
+    """
+    summary = {"received": 0, "written": 0, "skipped": 0, "failed": 0, "errors": []}
+
+    def fail(line_no: int, error: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < IMPORT_MAX_ERRORS:
+            summary["errors"].append({"line": line_no, "error": error})
+
+    chunk: list[dict] = []
+    seen: set[str] = set()  # names of the whole file, chunks are committed separately
+
+    async def flush():
+        if chunk:
+            written = await _upsert_wines(db, chunk, mode)
+            summary["written"] += written
+            summary["skipped"] += len(chunk) - written
+            chunk.clear()
+
+    async for line_no, record, error in records:
+        summary["received"] += 1
+        if error:
+            fail(line_no, error)
+            continue
+        try:
+            wine = ProductCreate.model_validate(record)
+        except ValidationError as e:
+            fail(line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        if wine.name in seen:
+            fail(line_no, f"Duplicate name in file: {wine.name}")
+            continue
+        seen.add(wine.name)
+        chunk.append(wine.model_dump())
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush()
+    await flush()
+    return summary
+
+
+async def export_wines(db: AsyncSession, fmt: str = CSV, **filters) -> AsyncIterator[str]:
+    """Stream wines matching the list filters as CSV or NDJSON text, one partition at a time."""
+    query = get_wines(**filters).with_only_columns(*(getattr(Product, column) for column in EXPORT_COLUMNS))
+    result = await db.stream(query.execution_options(yield_per=EXPORT_PARTITION_SIZE))
+    header = fmt == CSV
+    async for partition in result.mappings().partitions():
+        yield encode_rows(partition, fmt, EXPORT_COLUMNS, header=header)
+        header = False
+    if header:
+        yield encode_rows([], fmt, EXPORT_COLUMNS, header=True)
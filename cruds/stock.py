@@ -1,58 +1,388 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, bindparam, delete, func, insert, literal_column, or_, select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from db.dialect import upsert_insert
+from cruds.product import RESPONSE_COLUMNS as PRODUCT_RESPONSE_COLUMNS
+from cruds.stock_checkpoint import record_checkpoints
+from cruds.stock_event import record_stock_events
+from cruds.stock_shard import adjust_shard, rebalance_shards, sharded_stock, shards_latest_update, stock_quantity
 from models.stock import Stock
+from models.stock_shard import StockShard
+from models.stock_total import ProductStockTotal, BranchStockTotal
 from models.product import Product
 from models.branch import Branch
-from schemas.stock import StockCreate, StockUpdate
+from schemas.stock import StockAdjustment, StockCreate, StockUpdate
+from utils.logger import get_logger
+from utils.conditional import list_validator
 from fastapi import HTTPException
 
+logger = get_logger(__name__)
 
-def create_stock(db: Session, stock: StockCreate):
+# group_by value -> product column for grouped totals
+STOCK_TOTAL_GROUPS = {"region": Product.region, "vintage": Product.vintage}
+# Postgres advisory lock key so only one worker compacts shards at a time
+STOCK_SHARD_COMPACT_LOCK_KEY = 726_354_002
+
+
+async def apply_stock_totals(db: AsyncSession, deltas: dict[tuple[int, int], int]):
+    """Fold (product_id, branch_id) -> quantity changes into the summary tables.
+
+    Runs in the caller's transaction, so totals commit or roll back with the
+    stock change. Rows are upserted in key order to keep lock order stable.
+    """
+    by_product: dict[int, int] = {}
+    by_branch: dict[int, int] = {}
+    for (product_id, branch_id), delta in deltas.items():
+        by_product[product_id] = by_product.get(product_id, 0) + delta
+        by_branch[branch_id] = by_branch.get(branch_id, 0) + delta
+
+    for model, key, totals in ((ProductStockTotal, "product_id", by_product), (BranchStockTotal, "branch_id", by_branch)):
+        rows = [{key: k, "quantity": delta} for k, delta in sorted(totals.items()) if delta]
+        if not rows:
+            continue
+        stmt = upsert_insert(db, model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[getattr(model, key)],
+            set_={"quantity": model.quantity + stmt.excluded.quantity, "updated_at": stmt.excluded.updated_at},
+        )
+        await db.execute(stmt)
+
+
+async def rebuild_stock_totals(db: AsyncSession):
+    """Recompute the summary tables from the stock table, shards included."""
+    await db.execute(delete(ProductStockTotal))
+    await db.execute(delete(BranchStockTotal))
+    await db.execute(insert(ProductStockTotal).from_select(
+        ["product_id", "quantity", "updated_at"],
+        select(Stock.product_id, func.sum(stock_quantity()), func.now()).group_by(Stock.product_id),
+    ))
+    await db.execute(insert(BranchStockTotal).from_select(
+        ["branch_id", "quantity", "updated_at"],
+        select(Stock.branch_id, func.sum(stock_quantity()), func.now()).group_by(Stock.branch_id),
+    ))
+    # The rebuilt totals already count every shard change
+    await db.execute(update(StockShard).where(StockShard.pending_delta != 0).values(pending_delta=0))
+    await db.commit()
+
+
+async def ensure_stock_totals(db: AsyncSession):
+    """Build the summary tables once for databases that predate them."""
+    if await db.scalar(select(Stock.id).limit(1)) and \
+       not await db.scalar(select(literal_column("1")).select_from(ProductStockTotal).limit(1)):
+        await rebuild_stock_totals(db)
+
+
+def get_stock_entry_query(stock_id: int):
+    """Build a query for one stock entry with its product eagerly loaded."""
+    return select(Stock).options(joinedload(Stock.product)).where(Stock.id == stock_id)
+
+
+async def create_stock(db: AsyncSession, stock: StockCreate):
     """Create a new stock entry."""
     # Verify product and branch exist
-    product = db.query(Product).filter(Product.id == stock.product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == stock.product_id))
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    branch = db.query(Branch).filter(Branch.id == stock.branch_id).first()
+    branch = await db.scalar(select(Branch).where(Branch.id == stock.branch_id))
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
     # Check for existing stock entry
-    existing_stock = db.query(Stock).filter_by(product_id=stock.product_id, branch_id=stock.branch_id).first()
+    existing_stock = await db.scalar(select(Stock).filter_by(product_id=stock.product_id, branch_id=stock.branch_id))
     if existing_stock:
         raise HTTPException(status_code=400, detail="Stock entry already exists for this product and branch")
 
     db_stock = Stock(**stock.model_dump())
     db.add(db_stock)
-    db.commit()
-    db.refresh(db_stock)
-    return db_stock
+    key = (stock.product_id, stock.branch_id)
+    await apply_stock_totals(db, {key: stock.quantity})
+    await record_checkpoints(db, {key: stock.quantity})
+    await record_stock_events(db, "create", {key: stock.quantity}, {key: stock.quantity})
+    await db.commit()
+    # Reload with the product attached, lazy loads are not allowed on an async session
+    return await db.scalar(get_stock_entry_query(db_stock.id))
 
 
-def get_stock(db: Session, branch_id: int | None = None):
-    """Get stock entries, optionally filtered by branch_id."""
-    query = db.query(Stock)
+def get_stock(branch_id: int | None = None):
+    """Get stock entries with their product as plain columns, optionally filtered by branch_id."""
+    query = select(
+        Stock.id, Stock.product_id, Stock.branch_id, stock_quantity().label("quantity"), Stock.created_at, Stock.updated_at,
+        *(column.label(f"product__{column.key}") for column in PRODUCT_RESPONSE_COLUMNS),
+    ).join(Product, Product.id == Stock.product_id)
     if branch_id:
-        query = query.filter(Stock.branch_id == branch_id)
-    return query.all()
+        query = query.where(Stock.branch_id == branch_id)
+    return query
+
+
+async def get_stock_validator(db: AsyncSession, branch_id: int | None = None):
+    """(latest updated_at, row count) of a stock list; product and shard edits count too since pages include them."""
+    return await list_validator(db, get_stock(branch_id), Stock.updated_at, Product.updated_at, shards_latest_update(branch_id))
 
 
-def update_stock(db: Session, stock_id: int, stock_data: StockUpdate):
+def stock_row(row) -> dict:
+    """Shape a get_stock row like StockResponse, nesting the product columns."""
+    item = dict(row._mapping)
+    item["product"] = {column.key: item.pop(f"product__{column.key}") for column in PRODUCT_RESPONSE_COLUMNS}
+    return item
+
+
+async def update_stock(db: AsyncSession, stock_id: int, stock_data: StockUpdate):
     """Update a stock entry."""
-    stock = db.query(Stock).filter(Stock.id == stock_id).first()
+    # A new quantity replaces the shards too, fold them into the row first
+    await fold_stock_shards(db, Stock.id == stock_id)
+    # Lock the row so the totals delta is computed from the quantity being replaced
+    stock = await db.scalar(get_stock_entry_query(stock_id).with_for_update(of=Stock).execution_options(populate_existing=True))
     if not stock:
         return None
+    previous_quantity = stock.quantity
     for field, value in stock_data.model_dump(exclude_unset=True).items():
         setattr(stock, field, value)
-    db.commit()
-    db.refresh(stock)
+    key = (stock.product_id, stock.branch_id)
+    await apply_stock_totals(db, {key: stock.quantity - previous_quantity})
+    await record_checkpoints(db, {key: stock.quantity})
+    await record_stock_events(db, "update", {key: stock.quantity}, {key: stock.quantity - previous_quantity})
+    await db.commit()
+    await db.refresh(stock)
     return stock
 
 
-def delete_stock(db: Session, stock_id: int):
+def adjust_stock_statement(product_id: int, branch_id: int, delta: int):
+    """Relative change that only matches when the result stays non-negative; returns the quantity with shards."""
+    return (
+        update(Stock)
+        .where(Stock.product_id == product_id, Stock.branch_id == branch_id, Stock.quantity + delta >= 0)
+        .values(quantity=Stock.quantity + delta)
+        .returning(stock_quantity())
+    )
+
+
+async def fold_stock_shards(db: AsyncSession, *criteria) -> dict[tuple[int, int], int]:
+    """Move the shards of the stock rows matching criteria back into the rows, in the caller's transaction.
+
+    Writers that need the whole quantity on the row (absolute updates,
+    deletes, movements, adjustments larger than any shard) call this first;
+    writers locking several rows lock them all before folding, so rows are
+    always locked in (branch_id, product_id) order. Pending shard changes go
+    to the summary totals. Returns the folded rows' quantities by
+    (product_id, branch_id), empty when no row had shards.
+    """
+    stock_ids = (await db.scalars(
+        select(StockShard.stock_id).join(Stock, Stock.id == StockShard.stock_id).where(*criteria).distinct()
+    )).all()
+    if not stock_ids:
+        return {}
+    deltas, quantities = await rebalance_shards(db, stock_ids, spread=False)
+    await apply_stock_totals(db, deltas)
+    await checkpoint_shard_changes(db, deltas, quantities)
+    return quantities
+
+
+async def checkpoint_shard_changes(db: AsyncSession, deltas: dict[tuple[int, int], int], quantities: dict[tuple[int, int], int]):
+    """Checkpoint folded rows that had pending shard changes.
+
+    Shard adjustments record no checkpoint, since the quantity a writer reads
+    back can include or miss concurrent shard changes. Under the fold's locks
+    the quantity is exact, so history catches up here.
+    """
+    await record_checkpoints(db, {key: quantities[key] for key, delta in deltas.items() if delta})
+
+
+async def compact_stock_shards(db: AsyncSession) -> int:
+    """Fold pending shard changes into the summary totals and spread each sharded row evenly again.
+
+    Only rows with pending changes, or with an empty shard the reserve could
+    refill, are touched. Returns the number of rows compacted.
+    """
+    if db.get_bind().dialect.name == "postgresql" and \
+       not await db.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": STOCK_SHARD_COMPACT_LOCK_KEY}):
+        await db.rollback()
+        return 0  # another worker is compacting
+    stock_ids = (await db.scalars(
+        select(StockShard.stock_id)
+        .join(Stock, Stock.id == StockShard.stock_id)
+        .group_by(StockShard.stock_id, Stock.quantity)
+        .having(or_(
+            func.sum(func.abs(StockShard.pending_delta)) > 0,
+            and_(func.min(StockShard.quantity) == 0, Stock.quantity >= func.count()),
+        ))
+    )).all()
+    deltas, quantities = await rebalance_shards(db, stock_ids, spread=True)
+    await apply_stock_totals(db, deltas)
+    await checkpoint_shard_changes(db, deltas, quantities)
+    # Shard writers report the quantity they saw, which can miss concurrent shard changes; publish the settled one
+    await record_stock_events(db, "compaction", quantities)
+    await db.commit()
+    return len(stock_ids)
+
+
+async def set_stock_shards(db: AsyncSession, stock_id: int, shards: int) -> dict | None:
+    """Split a stock row into shards (0 turns sharding off); returns None if the row does not exist."""
+    stock = await db.scalar(select(Stock).where(Stock.id == stock_id).with_for_update())
+    if not stock:
+        return None
+    await fold_stock_shards(db, Stock.id == stock_id)
+    await db.execute(delete(StockShard).where(StockShard.stock_id == stock_id))
+    if shards:
+        await db.execute(insert(StockShard), [{"stock_id": stock_id, "shard": shard, "quantity": 0} for shard in range(shards)])
+    _, quantities = await rebalance_shards(db, [stock_id], spread=True)
+    await db.commit()
+
+    key = (stock.product_id, stock.branch_id)
+    # Other workers pick the change up on their next registry refresh
+    if shards:
+        sharded_stock[key] = shards
+    else:
+        sharded_stock.pop(key, None)
+    logger.info("Stock id=%s now has %s shards", stock_id, shards)
+    return {"stock_id": stock_id, "shards": shards, "quantity": quantities[key]}
+
+
+async def adjustment_failure(db: AsyncSession, adjustment: StockAdjustment) -> HTTPException:
+    """Explain why an adjustment matched no row (cold path only)."""
+    if await db.scalar(select(Stock.id).where(Stock.product_id == adjustment.product_id, Stock.branch_id == adjustment.branch_id)) is None:
+        return HTTPException(status_code=404, detail="Stock entry not found")
+    return HTTPException(status_code=400, detail="Insufficient stock")
+
+
+async def adjust_row(db: AsyncSession, adjustment: StockAdjustment) -> int | None:
+    """Conditional UPDATE of the stock row, folding its shards in once if the row alone cannot take the delta."""
+    statement = adjust_stock_statement(adjustment.product_id, adjustment.branch_id, adjustment.delta)
+    quantity = await db.scalar(statement)
+    if quantity is None and await fold_stock_shards(
+        db, Stock.product_id == adjustment.product_id, Stock.branch_id == adjustment.branch_id
+    ):
+        quantity = await db.scalar(statement)
+    return quantity
+
+
+async def adjust_stock(db: AsyncSession, adjustment: StockAdjustment) -> dict:
+    """Apply a quantity delta with one conditional UPDATE and no read first.
+
+    The row lock taken by the UPDATE serializes concurrent tills on the same
+    product and branch, and the condition keeps the quantity from going negative.
+    Sharded rows take the delta on a random shard instead and leave the
+    summary totals and the checkpoint to the compactor.
+    """
+    key = (adjustment.product_id, adjustment.branch_id)
+    shards = sharded_stock.get(key)
+    quantity = await adjust_shard(db, *key, adjustment.delta, shards) if shards else None
+    if quantity is None:
+        quantity = await adjust_row(db, adjustment)
+        if quantity is None:
+            await db.rollback()
+            raise await adjustment_failure(db, adjustment)
+        await apply_stock_totals(db, {key: adjustment.delta})
+        await record_checkpoints(db, {key: quantity})
+    await record_stock_events(db, "adjust", {key: quantity}, {key: adjustment.delta})
+    await db.commit()
+    return {"product_id": adjustment.product_id, "branch_id": adjustment.branch_id, "quantity": quantity}
+
+
+async def adjust_stock_batch(db: AsyncSession, adjustments: list[StockAdjustment], atomic: bool = True):
+    """Apply many deltas in one transaction with set-based reads and writes, all-or-nothing unless atomic is false.
+
+    The involved stock rows are read and locked in one query, in (branch_id,
+    product_id) order so concurrent batches lock them in the same order; items
+    are checked in request order against running balances, then the net
+    changes are written with one bulk UPDATE. Sharded rows are then folded,
+    like in movement batches, since balances are checked against the rows alone.
+    Returns the per-item results and the number of adjustments applied.
+    """
+    pairs = {(a.product_id, a.branch_id) for a in adjustments}
+    rows = await db.execute(
+        select(Stock.product_id, Stock.branch_id, Stock.quantity)
+        .where(tuple_(Stock.product_id, Stock.branch_id).in_(pairs))
+        .order_by(Stock.branch_id, Stock.product_id)
+        .with_for_update()
+    )
+    balances = {(r.product_id, r.branch_id): r.quantity for r in rows}
+    balances.update(await fold_stock_shards(db, tuple_(Stock.product_id, Stock.branch_id).in_(pairs)))
+
+    deltas: dict[tuple[int, int], int] = {}
+    results: list[dict] = []
+    for index, adjustment in enumerate(adjustments):
+        key = (adjustment.product_id, adjustment.branch_id)
+        if key not in balances or balances[key] + adjustment.delta < 0:
+            results.append({"index": index, "status": "failed", "error": "Stock entry not found or insufficient stock"})
+            continue
+        balances[key] += adjustment.delta
+        deltas[key] = deltas.get(key, 0) + adjustment.delta
+        results.append({"index": index, "status": "applied", "quantity": balances[key]})
+
+    applied = sum(result["status"] == "applied" for result in results)
+    if not applied or (atomic and applied < len(adjustments)):
+        await db.rollback()
+        for result in results:
+            if result["status"] == "applied":
+                result.update(status="skipped", quantity=None)
+        return results, 0
+
+    updates = [{"p": p, "b": b, "d": d} for (p, b), d in sorted(deltas.items(), key=lambda item: item[0][::-1]) if d]
+    if updates:
+        table = Stock.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.product_id == bindparam("p"), table.c.branch_id == bindparam("b"))
+            .values(quantity=table.c.quantity + bindparam("d")),
+            updates,
+        )
+    quantities = {key: balances[key] for key in deltas}
+    await apply_stock_totals(db, deltas)
+    await record_checkpoints(db, quantities)
+    await record_stock_events(db, "adjust", quantities, deltas)
+    await db.commit()
+    return results, applied
+
+
+async def delete_stock(db: AsyncSession, stock_id: int):
     """Delete a stock entry."""
-    stock = db.query(Stock).filter(Stock.id == stock_id).first()
+    await fold_stock_shards(db, Stock.id == stock_id)
+    stock = await db.scalar(select(Stock).where(Stock.id == stock_id).with_for_update().execution_options(populate_existing=True))
     if not stock:
         return False
-    db.delete(stock)
-    db.commit()
-    return True
\ No newline at end of file
+    await db.execute(delete(StockShard).where(StockShard.stock_id == stock_id))
+    await db.delete(stock)
+    key = (stock.product_id, stock.branch_id)
+    await apply_stock_totals(db, {key: -stock.quantity})
+    await record_checkpoints(db, {key: 0})
+    await record_stock_events(db, "delete", {key: 0}, {key: -stock.quantity})
+    await db.commit()
+    return True
+
+
+async def get_product_stock_total(db: AsyncSession, product_id: int) -> int | None:
+    """Company-wide quantity of a product, or None if the product does not exist."""
+    quantity = await db.scalar(select(ProductStockTotal.quantity).where(ProductStockTotal.product_id == product_id))
+    if quantity is None and not await db.scalar(select(Product.id).where(Product.id == product_id)):
+        return None
+    return quantity or 0
+
+
+async def get_branch_stock_total(db: AsyncSession, branch_id: int) -> int | None:
+    """Total quantity held by a branch, or None if the branch does not exist."""
+    quantity = await db.scalar(select(BranchStockTotal.quantity).where(BranchStockTotal.branch_id == branch_id))
+    if quantity is None and not await db.scalar(select(Branch.id).where(Branch.id == branch_id)):
+        return None
+    return quantity or 0
+
+
+async def list_branch_stock_totals(db: AsyncSession):
+    """Totals for every branch, including branches without stock."""
+    rows = await db.execute(
+        select(Branch.id.label("branch_id"), func.coalesce(BranchStockTotal.quantity, 0).label("quantity"))
+        .outerjoin(BranchStockTotal, BranchStockTotal.branch_id == Branch.id)
+        .order_by(Branch.id.asc())
+    )
+    return rows.mappings().all()
+
+
+async def list_grouped_stock_totals(db: AsyncSession, group_by: str):
+    """Company-wide totals grouped by a product attribute (region or vintage)."""
+    column = STOCK_TOTAL_GROUPS[group_by]
+    rows = await db.execute(
+        select(column.label("key"), func.sum(ProductStockTotal.quantity).label("quantity"), func.count().label("products"))
+        .join(Product, Product.id == ProductStockTotal.product_id)
+        .group_by(column)
+        .order_by(column)
+    )
+    return rows.mappings().all()
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, case, func, insert, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from cruds.stock_shard import stock_quantity
+from db.base import utcnow
+from db.dialect import block_writes
+from models.movement import Movement
+from models.stock import Stock
+from models.stock_checkpoint import StockCheckpoint
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """Normalize to naive UTC, the form timestamps are stored in."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def record_checkpoints(db: AsyncSession, quantities: dict[tuple[int, int], int]):
+    """Record (product_id, branch_id) -> quantity set by a direct stock write, in the caller's transaction."""
+    if quantities:
+        await db.execute(insert(StockCheckpoint), [
+            {"product_id": product_id, "branch_id": branch_id, "quantity": quantity}
+            for (product_id, branch_id), quantity in quantities.items()
+        ])
+
+
+async def take_stock_checkpoint(db: AsyncSession, branch_id: int | None = None) -> int:
+    """Copy the current stock rows into checkpoints so later replays start from here.
+
+    A movement is stamped before it commits, so one in flight could be stamped
+    before taken_at yet commit after the copy, and be missing from both the
+    checkpoint and the replay. Stock writers are therefore waited for and held
+    off first, and taken_at is stamped after that. Movements are stamped after
+    their stock writes, so each lands on exactly one side of taken_at.
+    """
+    await block_writes(db, Stock.__table__)
+    taken_at = literal(utcnow(), DateTime)
+    query = select(Stock.product_id, Stock.branch_id, stock_quantity(), taken_at)
+    if branch_id:
+        query = query.where(Stock.branch_id == branch_id)
+    result = await db.execute(
+        insert(StockCheckpoint).from_select(["product_id", "branch_id", "quantity", "taken_at"], query)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def get_stock_at(db: AsyncSession, branch_id: int, at: datetime, product_id: int | None = None) -> dict[int, int]:
+    """Rebuild product_id -> quantity at a branch at a point in time.
+
+    Starts from each product's latest checkpoint at or before `at` (or zero if
+    there is none) and replays the movements recorded after that checkpoint,
+    so each query is one index range scan over checkpoints and movements.
+    """
+    at = _utc_naive(at)
+
+    ranked = select(
+        StockCheckpoint.product_id,
+        StockCheckpoint.quantity,
+        StockCheckpoint.taken_at,
+        func.row_number().over(partition_by=StockCheckpoint.product_id, order_by=StockCheckpoint.taken_at.desc()).label("rn"),
+    ).where(StockCheckpoint.branch_id == branch_id, StockCheckpoint.taken_at <= at)
+    if product_id:
+        ranked = ranked.where(StockCheckpoint.product_id == product_id)
+    ranked = ranked.subquery()
+    latest = select(ranked.c.product_id, ranked.c.quantity, ranked.c.taken_at).where(ranked.c.rn == 1).subquery()
+
+    signed_quantity = case((Movement.destination_branch_id == branch_id, Movement.quantity), else_=-Movement.quantity)
+    replay = (
+        select(Movement.product_id, func.sum(signed_quantity).label("delta"))
+        .outerjoin(latest, latest.c.product_id == Movement.product_id)
+        .where(
+            or_(Movement.origin_branch_id == branch_id, Movement.destination_branch_id == branch_id),
+            Movement.timestamp <= at,
+            or_(latest.c.taken_at.is_(None), Movement.timestamp > latest.c.taken_at),
+        )
+        .group_by(Movement.product_id)
+    )
+    if product_id:
+        replay = replay.where(Movement.product_id == product_id)
+
+    quantities = {row.product_id: row.quantity for row in await db.execute(select(latest))}
+    for row in await db.execute(replay):
+        quantities[row.product_id] = quantities.get(row.product_id, 0) + row.delta
+    return quantities
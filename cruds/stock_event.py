@@ -0,0 +1,72 @@
+from datetime import timedelta
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.base import utcnow
+from models.stock_event import StockEvent
+
+# Postgres NOTIFY channel that wakes the feed dispatchers of every worker
+STOCK_EVENTS_CHANNEL = "stock_events"
+
+EVENT_COLUMNS = (
+    StockEvent.id, StockEvent.product_id, StockEvent.branch_id, StockEvent.quantity,
+    StockEvent.delta, StockEvent.source, StockEvent.created_at,
+)
+
+
+async def record_stock_events(db: AsyncSession, source: str, quantities: dict[tuple[int, int], int],
+                              deltas: dict[tuple[int, int], int] | None = None):
+    """Write (product_id, branch_id) -> quantity changes to the outbox, in the caller's transaction.
+
+    On Postgres the dispatchers are notified too; the notification is only
+    delivered if the transaction commits.
+    """
+    if not quantities:
+        return
+    deltas = deltas or {}
+    await db.execute(insert(StockEvent), [
+        {"product_id": product_id, "branch_id": branch_id, "quantity": quantity,
+         "delta": deltas.get((product_id, branch_id), 0), "source": source}
+        for (product_id, branch_id), quantity in quantities.items()
+    ])
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_notify(:channel, '')"), {"channel": STOCK_EVENTS_CHANNEL})
+
+
+async def list_stock_events(db: AsyncSession, after: int, until: int | None = None, branch_id: int | None = None,
+                            product_id: int | None = None, limit: int = 500) -> list[dict]:
+    """Events with after < id <= until in id order, optionally for one branch and/or product."""
+    query = select(*EVENT_COLUMNS).where(StockEvent.id > after).order_by(StockEvent.id).limit(limit)
+    if until is not None:
+        query = query.where(StockEvent.id <= until)
+    if branch_id:
+        query = query.where(StockEvent.branch_id == branch_id)
+    if product_id:
+        query = query.where(StockEvent.product_id == product_id)
+    return [dict(row) for row in (await db.execute(query)).mappings()]
+
+
+async def outbox_snapshot(db: AsyncSession) -> tuple[int, int] | None:
+    """(xmin, xmax) of the snapshot the rest of this transaction reads with, on Postgres; None elsewhere.
+
+    Starts a REPEATABLE READ transaction, so every outbox read in it sees the
+    same snapshot these transaction ids describe.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    row = (await db.execute(text(
+        "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint, pg_snapshot_xmax(pg_current_snapshot())::text::bigint"
+    ))).one()
+    return row[0], row[1]
+
+
+async def latest_stock_event_id(db: AsyncSession) -> int:
+    return await db.scalar(select(func.max(StockEvent.id))) or 0
+
+
+async def purge_stock_events(db: AsyncSession, retention: float) -> int:
+    """Delete events older than retention seconds; clients cannot resume from before them."""
+    cutoff = utcnow() - timedelta(seconds=retention)
+    result = await db.execute(delete(StockEvent).where(StockEvent.created_at < cutoff))
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,110 @@
+import random
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.stock import Stock
+from models.stock_shard import StockShard
+
+# Shards a decrement tries before the caller folds the row, which keeps per-request statements bounded
+STOCK_SHARD_ATTEMPTS = 3
+
+# (product_id, branch_id) -> shard count of the sharded stock rows, refreshed periodically per worker.
+# A stale entry is harmless: shard updates for a row without shards match nothing and fall back to the row.
+sharded_stock: dict[tuple[int, int], int] = {}
+
+
+def stock_quantity():
+    """Quantity of a stock row including its shards, for projections over Stock."""
+    shard_total = select(func.coalesce(func.sum(StockShard.quantity), 0)).where(StockShard.stock_id == Stock.id)
+    return Stock.quantity + shard_total.correlate_except(StockShard).scalar_subquery()
+
+
+def shards_latest_update(branch_id: int | None = None):
+    """Latest shard change among the stock rows of a branch (or all), as a scalar subquery."""
+    query = select(func.max(StockShard.updated_at)).join(Stock, Stock.id == StockShard.stock_id)
+    if branch_id:
+        query = query.where(Stock.branch_id == branch_id)
+    # Not correlated: it is embedded in queries over Stock but covers every row of the branch
+    return query.correlate(None).scalar_subquery()
+
+
+async def refresh_sharded_stock(db: AsyncSession):
+    """Reload the sharded_stock registry of this worker."""
+    rows = await db.execute(
+        select(Stock.product_id, Stock.branch_id, func.count())
+        .join(StockShard, StockShard.stock_id == Stock.id)
+        .group_by(Stock.product_id, Stock.branch_id)
+    )
+    current = {(product_id, branch_id): count for product_id, branch_id, count in rows}
+    sharded_stock.clear()
+    sharded_stock.update(current)
+
+
+async def adjust_shard(db: AsyncSession, product_id: int, branch_id: int, delta: int, shards: int) -> int | None:
+    """Apply a delta to one shard of a sharded row; returns the row's new quantity, or None when no shard can take it.
+
+    Writers start at a random shard so they rarely wait on each other's row
+    lock. Increments land on that shard; decrements move on to the next shards
+    (up to STOCK_SHARD_ATTEMPTS) until one holds enough. A shard that cannot take the delta is not locked,
+    so a writer holds at most one shard lock and cannot deadlock with others.
+    """
+    stock_id = select(Stock.id).where(Stock.product_id == product_id, Stock.branch_id == branch_id).scalar_subquery()
+    start = random.randrange(shards)
+    for offset in range(min(shards, STOCK_SHARD_ATTEMPTS) if delta < 0 else 1):
+        stmt = (
+            update(StockShard)
+            .where(StockShard.stock_id == stock_id, StockShard.shard == (start + offset) % shards,
+                   StockShard.quantity + delta >= 0)
+            .values(quantity=StockShard.quantity + delta, pending_delta=StockShard.pending_delta + delta)
+            .returning(StockShard.shard)
+        )
+        if await db.scalar(stmt) is not None:
+            return await db.scalar(select(stock_quantity()).where(Stock.product_id == product_id, Stock.branch_id == branch_id))
+    return None
+
+
+async def rebalance_shards(db: AsyncSession, stock_ids: list[int], spread: bool):
+    """Fold the shards of stock rows into the rows, then split each total evenly over the shards again if spread.
+
+    Locks the stock rows, then their shards, in (branch_id, product_id) order,
+    the order transfers and batches lock stock rows in, so they cannot
+    deadlock with each other. Returns the pending deltas to fold into the
+    summary totals and the resulting quantities, both keyed by (product_id, branch_id).
+    """
+    if not stock_ids:
+        return {}, {}
+    rows = (await db.execute(
+        select(Stock.id, Stock.product_id, Stock.branch_id, Stock.quantity)
+        .where(Stock.id.in_(stock_ids)).order_by(Stock.branch_id, Stock.product_id).with_for_update()
+    )).all()
+    shards: dict[int, list] = {}
+    for shard in await db.execute(
+        select(StockShard.stock_id, StockShard.quantity, StockShard.pending_delta)
+        .join(Stock, Stock.id == StockShard.stock_id)
+        .where(StockShard.stock_id.in_(stock_ids))
+        .order_by(Stock.branch_id, Stock.product_id, StockShard.shard)
+        .with_for_update(of=StockShard)
+    ):
+        shards.setdefault(shard.stock_id, []).append(shard)
+
+    deltas, quantities, row_updates, shard_updates = {}, {}, [], []
+    for row in rows:
+        row_shards = shards.get(row.id, [])
+        total = row.quantity + sum(shard.quantity for shard in row_shards)
+        per_shard = total // len(row_shards) if spread and row_shards else 0
+        key = (row.product_id, row.branch_id)
+        deltas[key] = sum(shard.pending_delta for shard in row_shards)
+        quantities[key] = total
+        row_updates.append({"sid": row.id, "reserve": total - per_shard * len(row_shards)})
+        shard_updates.append({"sid": row.id, "per_shard": per_shard})
+
+    stock_table, shard_table = Stock.__table__, StockShard.__table__
+    await db.execute(
+        update(stock_table).where(stock_table.c.id == bindparam("sid")).values(quantity=bindparam("reserve")),
+        row_updates,
+    )
+    await db.execute(
+        update(shard_table).where(shard_table.c.stock_id == bindparam("sid"))
+        .values(quantity=bindparam("per_shard"), pending_delta=0),
+        shard_updates,
+    )
+    return deltas, quantities
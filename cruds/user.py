@@ -1,71 +1,85 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import User
 from schemas.user import UserCreate, UserUpdate
-from werkzeug.security import generate_password_hash
+from utils.auth import invalidate_user
+from utils.hashing import credential_hasher, needs_rehash
 from fastapi import HTTPException
 
-def create_user(db: Session, user: UserCreate):
+async def create_user(db: AsyncSession, user: UserCreate):
     """Create a new user."""
-    if db.query(User).filter(User.username == user.username).first():
+    if await db.scalar(select(User).where(User.username == user.username)):
         raise HTTPException(status_code=400, detail="Username already exists")
-    if user.email and db.query(User).filter(User.email == user.email).first():
+    if user.email and await db.scalar(select(User).where(User.email == user.email)):
         raise HTTPException(status_code=400, detail="Email already exists")
     db_user = User(
         username=user.username,
         name=user.name,
         email=user.email,
-        hashed_password=generate_password_hash(user.password),
+        hashed_password=await credential_hasher.hash(user.password),
         role=user.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def get_user(db: Session, user_id: int):
+async def get_user(db: AsyncSession, user_id: int):
     """Get a user by ID."""
-    return db.query(User).filter(User.id == user_id).first()
+    return await db.scalar(select(User).where(User.id == user_id))
 
-def get_user_by_username(db: Session, username: str):
+async def get_user_by_username(db: AsyncSession, username: str):
     """Get a user by username."""
-    return db.query(User).filter(User.username == username).first()
+    return await db.scalar(select(User).where(User.username == username))
 
-def get_user_by_email(db: Session, email: str):
+async def get_user_by_email(db: AsyncSession, email: str):
     """Get a user by email."""
-    return db.query(User).filter(User.email == email).first()
+    return await db.scalar(select(User).where(User.email == email))
 
-def list_users(db: Session):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    """Return the user if the password matches, upgrading outdated hashes on the way."""
+    user = await get_user_by_username(db, username)
+    if not user or not await credential_hasher.verify(user.hashed_password, password):
+        return None
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await credential_hasher.hash(password)
+        await db.commit()
+    return user
+
+def list_users():
     """Get all users."""
-    return db.query(User).order_by(User.id.asc())
+    return select(User).order_by(User.id.asc())
 
-def update_user(db: Session, user_id: int, update: UserUpdate):
+async def update_user(db: AsyncSession, user_id: int, update: UserUpdate):
     """Update a user."""
-    user = get_user(db, user_id)
+    user = await get_user(db, user_id)
     if not user:
         return None
     update_data = update.model_dump(exclude_unset=True)
     if "username" in update_data and update_data["username"]:
-        existing_user = db.query(User).filter(User.username == update_data["username"], User.id != user_id).first()
+        existing_user = await db.scalar(select(User).where(User.username == update_data["username"], User.id != user_id))
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already exists")
     if "email" in update_data and update_data["email"]:
-        existing_user = db.query(User).filter(User.email == update_data["email"], User.id != user_id).first()
+        existing_user = await db.scalar(select(User).where(User.email == update_data["email"], User.id != user_id))
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already exists")
     if "password" in update_data:
-        update_data["hashed_password"] = generate_password_hash(update_data["password"])
+        update_data["hashed_password"] = await credential_hasher.hash(update_data["password"])
         del update_data["password"]
     for key, value in update_data.items():
         setattr(user, key, value)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await invalidate_user(user_id)
+    await db.refresh(user)
     return user
 
-def delete_user(db: Session, user_id: int):
+async def delete_user(db: AsyncSession, user_id: int):
     """Delete a user."""
-    user = get_user(db, user_id)
+    user = await get_user(db, user_id)
     if not user:
         return False
-    db.delete(user)
-    db.commit()
-    return True
\ No newline at end of file
+    await db.delete(user)
+    await db.commit()
+    await invalidate_user(user_id)
+    return True
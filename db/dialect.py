@@ -0,0 +1,21 @@
+from sqlalchemy import delete, false, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def upsert_insert(db, table):
+    """Return an INSERT for the session's dialect that supports ON CONFLICT."""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+async def block_writes(db, table):
+    """Wait for the transactions writing to table to commit, and hold off new writers until this one ends.
+
+    Postgres takes a SHARE lock on the table. SQLite has one writer at a
+    time, so a write that matches no row takes the database write lock.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        await db.execute(delete(table).where(false()))
+    else:
+        await db.execute(text(f"LOCK TABLE {table.name} IN SHARE MODE"))
@@ -0,0 +1,61 @@
+"""Versioned schema migrations.
+
+Each module named vNNNN_<description>.py in this package is one migration with
+an `upgrade(conn)` function taking a sync Connection. Applied versions are
+recorded in schema_migrations; pending ones run in version order in a single
+transaction. Migrations are explicit DDL or table definitions frozen in the
+module, never the models, so a version always creates the same schema; make
+them idempotent (checkfirst, IF NOT EXISTS) where a database may already have
+the change.
+"""
+import importlib
+import pkgutil
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select
+from sqlalchemy.engine import Connection
+from db.base import utcnow
+
+schema_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _discover() -> list[tuple[int, str, object]]:
+    migrations = []
+    for module in pkgutil.iter_modules(__path__):
+        if module.name.startswith("v") and module.name[1:5].isdigit():
+            migrations.append((int(module.name[1:5]), module.name[6:], importlib.import_module(f"{__name__}.{module.name}")))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+MIGRATIONS = _discover()
+LATEST_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn: Connection) -> int:
+    """Highest applied version, 0 for a database without migrations."""
+    if not inspect(conn).has_table(schema_migrations.name):
+        return 0
+    return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def upgrade(conn: Connection) -> list[int]:
+    """Apply pending migrations in order; returns the versions applied."""
+    schema_metadata.create_all(conn)
+    version = current_version(conn)
+    applied = []
+    for migration_version, description, module in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        module.upgrade(conn)
+        conn.execute(schema_migrations.insert().values(
+            version=migration_version,
+            description=description,
+            applied_at=utcnow(),
+        ))
+        applied.append(migration_version)
+    return applied
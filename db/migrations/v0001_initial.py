@@ -0,0 +1,93 @@
+"""Baseline: the original tables, as create_all built them before any later feature.
+
+The schema is frozen here rather than taken from the models, so later model
+changes never alter what this version creates. Uses checkfirst, so databases
+created by earlier versions of the app are adopted as they are; indexes added
+to their tables since are created by later migrations.
+"""
+from sqlalchemy import (CheckConstraint, Column, DateTime, Enum, ForeignKey, Integer, MetaData, String, Table,
+                        UniqueConstraint)
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String(50), unique=True, index=True, nullable=False),
+    Column("name", String(100), nullable=False),
+    Column("email", String(120), unique=True, nullable=True),
+    Column("hashed_password", String(255), nullable=False),
+    Column("role", Enum("user", "admin", name="role"), nullable=False),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "clients", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(100), nullable=False),
+    Column("email", String(120), unique=True, nullable=False, index=True),
+    Column("phone", String(20), nullable=False),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "oauth_clients", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("client_id", String, unique=True, index=True, nullable=False),
+    Column("client_secret", String, nullable=False),
+    Column("name", String, nullable=False),
+)
+
+Table(
+    "branches", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(100), unique=True, nullable=False),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(100), unique=True, nullable=False),
+    Column("vintage", Integer, nullable=True),
+    Column("region", String(100), nullable=True),
+    Column("grape_variety", String(100), nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "stock", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id"), nullable=False),
+    Column("branch_id", Integer, ForeignKey("branches.id"), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    UniqueConstraint("product_id", "branch_id", name="uix_product_branch"),
+    CheckConstraint("quantity >= 0", name="check_quantity_non_negative"),
+)
+
+Table(
+    "movements", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id"), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("origin_branch_id", Integer, ForeignKey("branches.id"), nullable=False),
+    Column("destination_branch_id", Integer, ForeignKey("branches.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("timestamp", DateTime),
+    Column("notes", String(500), nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    CheckConstraint("quantity > 0", name="check_quantity_positive"),
+    CheckConstraint("origin_branch_id != destination_branch_id", name="check_different_branches"),
+)
+
+
+def upgrade(conn: Connection):
+    metadata.create_all(conn, checkfirst=True)
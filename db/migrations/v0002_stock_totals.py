@@ -0,0 +1,31 @@
+"""Materialized per-product and per-branch stock totals.
+
+Created empty; the bootstrap backfills them from stock (ensure_stock_totals).
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+# Only referenced for the foreign keys; created by v0001
+Table("products", metadata, Column("id", Integer, primary_key=True))
+Table("branches", metadata, Column("id", Integer, primary_key=True))
+
+product_stock_totals = Table(
+    "product_stock_totals", metadata,
+    Column("product_id", Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+    Column("quantity", Integer, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+branch_stock_totals = Table(
+    "branch_stock_totals", metadata,
+    Column("branch_id", Integer, ForeignKey("branches.id", ondelete="CASCADE"), primary_key=True),
+    Column("quantity", Integer, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+
+def upgrade(conn: Connection):
+    product_stock_totals.create(conn, checkfirst=True)
+    branch_stock_totals.create(conn, checkfirst=True)
@@ -0,0 +1,23 @@
+"""Periodic copies of stock, the starting points for historical stock queries."""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+# Only referenced for the foreign keys; created by v0001
+Table("products", metadata, Column("id", Integer, primary_key=True))
+Table("branches", metadata, Column("id", Integer, primary_key=True))
+
+stock_checkpoints = Table(
+    "stock_checkpoints", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+    Column("branch_id", Integer, ForeignKey("branches.id", ondelete="CASCADE"), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("taken_at", DateTime, nullable=False),
+    Index("ix_stock_checkpoints_branch_product_taken_at", "branch_id", "product_id", "taken_at"),
+)
+
+
+def upgrade(conn: Connection):
+    stock_checkpoints.create(conn, checkfirst=True)
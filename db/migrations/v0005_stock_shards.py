@@ -0,0 +1,22 @@
+"""Sub-counter rows for sharded (hot) stock rows."""
+from sqlalchemy import CheckConstraint, Column, DateTime, ForeignKey, Integer, MetaData, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+# Only referenced for the foreign key; created by v0001
+Table("stock", metadata, Column("id", Integer, primary_key=True))
+
+stock_shards = Table(
+    "stock_shards", metadata,
+    Column("stock_id", Integer, ForeignKey("stock.id", ondelete="CASCADE"), primary_key=True),
+    Column("shard", Integer, primary_key=True),
+    Column("quantity", Integer, nullable=False),
+    Column("pending_delta", Integer, nullable=False),
+    Column("updated_at", DateTime),
+    CheckConstraint("quantity >= 0", name="check_shard_quantity_non_negative"),
+)
+
+
+def upgrade(conn: Connection):
+    stock_shards.create(conn, checkfirst=True)
@@ -0,0 +1,22 @@
+"""Outbox of stock changes for the live stock feed."""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "stock_events", metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("product_id", Integer, nullable=False),
+    Column("branch_id", Integer, nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("delta", Integer, nullable=False),
+    Column("source", String(20), nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_stock_events_branch_id_id", "branch_id", "id"),
+    Index("ix_stock_events_created_at", "created_at"),
+)
+
+
+def upgrade(conn: Connection):
+    metadata.create_all(conn, checkfirst=True)
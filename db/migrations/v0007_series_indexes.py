@@ -0,0 +1,36 @@
+"""Indexes added to existing tables since the baseline, and pg_trgm for product search.
+
+The baseline adopts existing tables as they are, so databases created before
+these indexes existed never got them. Every statement is IF NOT EXISTS, which
+makes this a no-op where create_all already built them. The indexes are built
+without CONCURRENTLY, blocking writes to the table while they build.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+INDEXES = [
+    # Keyset pagination of product listings
+    "CREATE INDEX IF NOT EXISTS ix_products_name_id ON products (name, id)",
+    "CREATE INDEX IF NOT EXISTS ix_products_vintage_id ON products (vintage, id)",
+    # Ledger replay over one time range per product or branch
+    "CREATE INDEX IF NOT EXISTS ix_movements_product_timestamp ON movements (product_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_movements_origin_timestamp ON movements (origin_branch_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_movements_destination_timestamp ON movements (destination_branch_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_stock_checkpoints_branch_product_taken_at "
+    "ON stock_checkpoints (branch_id, product_id, taken_at)",
+]
+
+POSTGRES_INDEXES = [
+    # ?q= product search
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_region_trgm ON products USING gin (region gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_grape_variety_trgm ON products USING gin (grape_variety gin_trgm_ops)",
+]
+
+
+def upgrade(conn: Connection):
+    statements = list(INDEXES)
+    if conn.dialect.name == "postgresql":
+        statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm", *statements, *POSTGRES_INDEXES]
+    for statement in statements:
+        conn.execute(text(statement))
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Connection pool settings, one pool per engine per worker process."""
+    size: int = 5
+    max_overflow: int = 10
+    timeout: float = 30.0
+    recycle: int = 1800
+    pre_ping: bool = True
+    echo: bool = False
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """Read pool settings from DB_POOL_* / DB_ECHO environment variables."""
+        return cls(
+            size=int(os.getenv("DB_POOL_SIZE", cls.size)),
+            max_overflow=int(os.getenv("DB_POOL_MAX_OVERFLOW", cls.max_overflow)),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", cls.timeout)),
+            recycle=int(os.getenv("DB_POOL_RECYCLE", cls.recycle)),
+            pre_ping=_env_bool("DB_POOL_PRE_PING", cls.pre_ping),
+            echo=_env_bool("DB_ECHO", cls.echo),
+        )
+
+    def engine_kwargs(self) -> dict:
+        """Keyword arguments for create_engine / create_async_engine."""
+        return {
+            "pool_size": self.size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.timeout,
+            "pool_recycle": self.recycle,
+            "pool_pre_ping": self.pre_ping,
+            "echo": self.echo,
+        }
+
+
+class PoolStats:
+    """Counters fed by pool events and by the instrumented pool classes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_time_total += seconds
+            self.wait_time_max = max(self.wait_time_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_time_total": round(self.wait_time_total, 6),
+                "wait_time_max": round(self.wait_time_max, 6),
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Time how long callers wait for a connection to become available."""
+    stats: PoolStats | None = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            if self.stats:
+                self.stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        if self.stats:
+            self.stats.record_wait(time.perf_counter() - start)
+        return conn
+
+    def recreate(self):
+        # Keep the counters when the engine is disposed and the pool rebuilt
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_pool(pool) -> PoolStats:
+    """Attach a PoolStats to a pool and register the event hooks that feed it."""
+    stats = PoolStats()
+    pool.stats = stats
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.incr("connects")
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.incr("checkouts")
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.incr("checkins")
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.incr("invalidations")
+
+    return stats
+
+
+def pool_status(pool) -> dict:
+    """Current pool occupancy plus the accumulated counters."""
+    status = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+    stats = getattr(pool, "stats", None)
+    if stats:
+        status.update(stats.snapshot())
+    return status
@@ -0,0 +1,187 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from db.pool import pool_status
+from utils.cache import TTLCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between replica health checks, and the replication lag beyond which a replica is skipped
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 5))
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 5))
+# Seconds a replica is skipped after a request failed to reach it
+DB_REPLICA_RETRY_AFTER = float(os.getenv("DB_REPLICA_RETRY_AFTER", 30))
+# Reads from a client stay on the primary this long after its last write; at least the tolerated lag
+DB_PRIMARY_PIN_SECONDS = float(os.getenv("DB_PRIMARY_PIN_SECONDS", DB_REPLICA_MAX_LAG))
+PRIMARY_PIN_COOKIE = "db_primary_until"
+DB_PRIMARY_PIN_USERS = int(os.getenv("DB_PRIMARY_PIN_USERS", 100_000))
+READ_METHODS = ("GET", "HEAD")
+# Requests that never write, so never pin (CORS preflights included)
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+# 0 when caught up (or not a standby at all), else seconds since the last replayed transaction
+_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaSet:
+    """Round-robin over read replicas, skipping the ones that are down or lagging."""
+
+    def __init__(self, engines: list[AsyncEngine]):
+        self.engines = engines
+        self.sessionmakers = [async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False) for engine in engines]
+        self._down_until = [0.0] * len(engines)
+        self._lag: list[float | None] = [None] * len(engines)
+        self._counter = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def pick(self) -> int | None:
+        """Index of the next healthy replica, or None to read from the primary."""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            index = next(self._counter) % len(self.engines)
+            if self._down_until[index] <= now:
+                return index
+        return None
+
+    def mark_down(self, index: int, reason, seconds: float = DB_REPLICA_RETRY_AFTER):
+        if self._down_until[index] <= time.monotonic():
+            logger.warning("Replica %s taken out of rotation: %s", index, reason)
+        self._down_until[index] = time.monotonic() + seconds
+
+    async def _probe(self, engine: AsyncEngine) -> float:
+        async with engine.connect() as conn:
+            if engine.dialect.name != "postgresql":
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+            return float(await conn.scalar(_LAG_QUERY) or 0.0)
+
+    async def check(self):
+        """Probe every replica once, taking failed or lagging ones out of rotation until the next check."""
+        for index, engine in enumerate(self.engines):
+            try:
+                lag = await asyncio.wait_for(self._probe(engine), timeout=DB_REPLICA_CHECK_INTERVAL)
+            except Exception as e:
+                self._lag[index] = None
+                self.mark_down(index, e, seconds=float("inf"))
+                continue
+            self._lag[index] = lag
+            if lag > DB_REPLICA_MAX_LAG:
+                self.mark_down(index, f"lag {lag:.1f}s", seconds=float("inf"))
+            elif self._down_until[index] > time.monotonic():
+                logger.info("Replica %s back in rotation", index)
+                self._down_until[index] = 0.0
+
+    async def monitor(self):
+        """Run health checks until cancelled; started from the app lifespan."""
+        while True:
+            await self.check()
+            await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "replica": index,
+                "healthy": self._down_until[index] <= now,
+                "lag_seconds": self._lag[index],
+                "pool": pool_status(engine.sync_engine.pool),
+            }
+            for index, engine in enumerate(self.engines)
+        ]
+
+    async def dispose(self):
+        for engine in self.engines:
+            await engine.dispose()
+
+
+def is_pinned(cookies: dict) -> bool:
+    """Whether the client wrote recently enough that a replica may not have its write yet."""
+    try:
+        return float(cookies.get(PRIMARY_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryPins:
+    """User ids whose reads stay on the primary for DB_PRIMARY_PIN_SECONDS after a write.
+
+    Kept per worker and, with a shared cache (Redis protocol), there too, so a
+    write handled by one worker pins that user's reads on every worker.
+    """
+
+    def __init__(self, shared=None, seconds: float = DB_PRIMARY_PIN_SECONDS, prefix: str = "primary_pin"):
+        self.shared = shared
+        self.seconds = seconds
+        self.prefix = prefix
+        self._local = TTLCache(maxsize=DB_PRIMARY_PIN_USERS, ttl=seconds)
+
+    async def pin(self, user_id: str):
+        self._local.set(user_id, True)
+        if self.shared is None:
+            return
+        try:
+            await self.shared.set(f"{self.prefix}:{user_id}", b"1", ex=max(1, math.ceil(self.seconds)))
+        except Exception as e:
+            logger.warning("Shared cache unavailable, primary pin of user %s is local to this worker: %s", user_id, e)
+
+    async def is_pinned(self, user_id: str) -> bool:
+        """Whether the user wrote recently; also when the shared cache cannot tell, erring towards the primary."""
+        if self._local.get(user_id):
+            return True
+        if self.shared is None:
+            return False
+        try:
+            return await self.shared.get(f"{self.prefix}:{user_id}") is not None
+        except Exception as e:
+            logger.warning("Shared cache unavailable, reading from the primary: %s", e)
+            return True
+
+
+class PrimaryPinMiddleware:
+    """Pins a client's reads to the primary for a short time after each successful write.
+
+    Clients are pinned by a cookie, which holds across workers and API
+    replicas, and by user id (from `identify(scope)`), which also covers
+    token clients that do not keep cookies. Only non-safe methods that
+    succeed pin; pinned reads are flagged in request.state.primary_pinned.
+    """
+
+    def __init__(self, app, identify: Callable[[dict], str | None] | None = None, shared=None):
+        self.app = app
+        self.identify = identify
+        self.pins = PrimaryPins(shared)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        user_id = self.identify(scope) if self.identify else None
+
+        if scope["method"] in SAFE_METHODS:
+            if user_id is not None and scope["method"] in READ_METHODS and await self.pins.is_pinned(user_id):
+                scope.setdefault("state", {})["primary_pinned"] = True
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                # Recorded before the response leaves, so the client's next read already sees it
+                if user_id is not None:
+                    await self.pins.pin(user_id)
+                until = int(time.time() + DB_PRIMARY_PIN_SECONDS) + 1
+                cookie = f"{PRIMARY_PIN_COOKIE}={until}; Max-Age={int(DB_PRIMARY_PIN_SECONDS) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
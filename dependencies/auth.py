@@ -1,19 +1,18 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
-from utils.auth import SECRET_KEY, ALGORITHM, jwt, get_current_user
-from models.user import User
+from utils.auth import decode_token, get_current_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 def require_scopes(required_scopes: list[str]):
     """Ensure the user has all required scopes."""
-    async def scope_checker(user: User = Depends(get_current_user)):
+    async def scope_checker(user: dict = Depends(get_current_user)):
         try:
             token = await oauth2_scheme(None)
             if not token:
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No token provided")
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = decode_token(token)
             token_scopes = payload.get("scope", "").split()
             for scope in required_scopes:
                 if scope not in token_scopes:
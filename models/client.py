@@ -1,6 +1,5 @@
 from sqlalchemy import Column, Integer, String, DateTime
-from datetime import datetime, timezone
-from db.base import Base
+from db.base import Base, utcnow
 
 class Client(Base):
     __tablename__ = 'clients'
@@ -8,8 +7,8 @@ class Client(Base):
     name = Column(String(100), nullable=False)
     email = Column(String(120), unique=True, nullable=False, index=True)
     phone = Column(String(20), nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
     def __repr__(self):
         return f'<Client {self.name}>'
\ No newline at end of file
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Index
+from db.base import Base, utcnow
+
+
+class IdempotencyKey(Base):
+    """Outcome of a mutating request sent with an Idempotency-Key, replayed on retries.
+
+    status_code is NULL while the first attempt is still running.
+    """
+    __tablename__ = 'idempotency_keys'
+    owner_id = Column(Integer, primary_key=True)  # user the key belongs to
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} of User {self.owner_id}: {self.status_code}>'
@@ -1,7 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
-from datetime import datetime, timezone
-from db.base import Base
+from db.base import Base, utcnow
 
 class Movement(Base):
     __tablename__ = 'movements'
@@ -11,10 +10,10 @@ class Movement(Base):
     origin_branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
     destination_branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    timestamp = Column(DateTime, default=utcnow)
     notes = Column(String(500), nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
     product = relationship('Product', backref='movements', lazy='select')
     origin_branch = relationship('Branch', foreign_keys=[origin_branch_id], backref='outgoing_movements', lazy='select')
@@ -24,6 +23,10 @@ class Movement(Base):
     __table_args__ = (
         CheckConstraint('quantity > 0', name='check_quantity_positive'),
         CheckConstraint('origin_branch_id != destination_branch_id', name='check_different_branches'),
+        # Ledger replay scans one time range per product or branch
+        Index('ix_movements_product_timestamp', 'product_id', 'timestamp'),
+        Index('ix_movements_origin_timestamp', 'origin_branch_id', 'timestamp'),
+        Index('ix_movements_destination_timestamp', 'destination_branch_id', 'timestamp'),
     )
 
     def __repr__(self):
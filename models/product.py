@@ -1,6 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime
-from datetime import datetime, timezone
-from db.base import Base
+from sqlalchemy import Column, Integer, String, DateTime, Index, DDL, event
+from db.base import Base, utcnow
 
 
 class Product(Base):
@@ -10,8 +9,28 @@ class Product(Base):
     vintage = Column(Integer, nullable=True)
     region = Column(String(100), nullable=True)
     grape_variety = Column(String(100), nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        # Keyset pagination seeks on (sort key, id)
+        Index('ix_products_name_id', 'name', 'id'),
+        Index('ix_products_vintage_id', 'vintage', 'id'),
+        # Trigram indexes backing ?q= search (Postgres only, requires pg_trgm)
+        Index('ix_products_name_trgm', 'name', postgresql_using='gin',
+              postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_products_region_trgm', 'region', postgresql_using='gin',
+              postgresql_ops={'region': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_products_grape_variety_trgm', 'grape_variety', postgresql_using='gin',
+              postgresql_ops={'grape_variety': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
 
     def __repr__(self):
-        return f'<Wine {self.name}>'
\ No newline at end of file
+        return f'<Wine {self.name}>'
+
+
+event.listen(
+    Product.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
@@ -1,7 +1,6 @@
 from sqlalchemy import Column, Integer, DateTime, ForeignKey, UniqueConstraint, CheckConstraint
 from sqlalchemy.orm import relationship
-from datetime import datetime, timezone
-from db.base import Base
+from db.base import Base, utcnow
 
 class Stock(Base):
     __tablename__ = 'stock'
@@ -9,8 +8,8 @@ class Stock(Base):
     product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
     branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
     quantity = Column(Integer, nullable=False, default=0)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.UTC))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.UTC), onupdate=lambda: datetime.now(timezone.UTC))
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
     product = relationship('Product', backref='stocks', lazy='select')
     branch = relationship('Branch', backref='stocks', lazy='select')
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from db.base import Base, utcnow
+
+
+class StockCheckpoint(Base):
+    """Known quantity of a product at a branch at a point in time.
+
+    Written for every direct stock write and by periodic full checkpoints;
+    historical stock is the latest checkpoint plus the movements after it.
+    """
+    __tablename__ = 'stock_checkpoints'
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    branch_id = Column(Integer, ForeignKey('branches.id', ondelete='CASCADE'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        Index('ix_stock_checkpoints_branch_product_taken_at', 'branch_id', 'product_id', 'taken_at'),
+    )
+
+    def __repr__(self):
+        return f'<StockCheckpoint Product {self.product_id} at Branch {self.branch_id}: {self.quantity}>'
@@ -0,0 +1,26 @@
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Index
+from db.base import Base, utcnow
+
+
+class StockEvent(Base):
+    """Outbox row for a stock change, written in the same transaction as the change.
+
+    The id is the feed offset clients resume from. product_id and branch_id
+    are not foreign keys so events outlive deleted stock, products and branches.
+    """
+    __tablename__ = 'stock_events'
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    product_id = Column(Integer, nullable=False)
+    branch_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)  # quantity after the change
+    delta = Column(Integer, nullable=False)
+    source = Column(String(20), nullable=False)  # create, update, adjust, delete, movement or compaction
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        Index('ix_stock_events_branch_id_id', 'branch_id', 'id'),
+        Index('ix_stock_events_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<StockEvent {self.id} Product {self.product_id} at Branch {self.branch_id}: {self.quantity}>'
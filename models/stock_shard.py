@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, CheckConstraint
+from db.base import Base, utcnow
+
+
+class StockShard(Base):
+    """Sub-counter of a hot stock row.
+
+    A sharded row's quantity is its own plus the sum of its shards'. Every
+    shard stays non-negative like the row itself, so the sum does too.
+    pending_delta is the change not yet folded into the summary totals.
+    """
+    __tablename__ = 'stock_shards'
+    stock_id = Column(Integer, ForeignKey('stock.id', ondelete='CASCADE'), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    pending_delta = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        CheckConstraint('quantity >= 0', name='check_shard_quantity_non_negative'),
+    )
+
+    def __repr__(self):
+        return f'<StockShard {self.shard} of Stock {self.stock_id}: {self.quantity}>'
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from db.base import Base, utcnow
+
+
+class ProductStockTotal(Base):
+    """Company-wide quantity of a product, kept in step with the stock table."""
+    __tablename__ = 'product_stock_totals'
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+    def __repr__(self):
+        return f'<ProductStockTotal Product {self.product_id}: {self.quantity}>'
+
+
+class BranchStockTotal(Base):
+    """Total quantity held by a branch across all products."""
+    __tablename__ = 'branch_stock_totals'
+    branch_id = Column(Integer, ForeignKey('branches.id', ondelete='CASCADE'), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+    def __repr__(self):
+        return f'<BranchStockTotal Branch {self.branch_id}: {self.quantity}>'
@@ -1,7 +1,6 @@
 from sqlalchemy import Column, Integer, String, DateTime, Enum
-from datetime import datetime, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
-from db.base import Base
+from db.base import Base, utcnow
 import enum
 
 # Define Role Enum for PostgreSQL
@@ -18,8 +17,8 @@ class User(Base):
     email = Column(String(120), unique=True, nullable=True)
     hashed_password = Column(String(255), nullable=False)
     role = Column(Enum(Role), default=Role.user, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
     def set_password(self, password):
         self.hashed_password = generate_password_hash(password)
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination.ext.sqlalchemy import paginate as paginate_sqlalchemy
 from fastapi_pagination.cursor import CursorPage
 from db.base import get_db
 from schemas.branch import BranchCreate, BranchUpdate, BranchResponse
 from cruds import branch as crud_branch
 from utils.auth import get_current_admin
+from utils.conditional import is_not_modified, make_etag, not_modified_response, validator_headers
 from utils.logger import get_logger
 from utils.pagination import CustomCursorParams
 
@@ -14,40 +15,49 @@ logger = get_logger(__name__)
 router = APIRouter(prefix="/branches", tags=["Branches"])
 
 @router.get("", response_model=CursorPage[BranchResponse])
-def list_branches(db: Session = Depends(get_db), params: CustomCursorParams = Depends()):
-    """Get all branches with cursor-based pagination."""
-    logger.info(f"Fetching branches with cursor={params.cursor}, size={params.size}, order={params.order}")
-    query = crud_branch.get_branches(db)
-    return paginate_sqlalchemy(query, params)
+async def list_branches(request: Request, response: Response, db: AsyncSession = Depends(get_db), params: CustomCursorParams = Depends()):
+    """Get all branches with cursor-based pagination (conditional with If-None-Match)."""
+    logger.info("Fetching branches with cursor=%s, size=%s, order=%s", params.cursor, params.size, params.order)
+    latest, count = await crud_branch.get_branches_validator(db)
+    etag = make_etag("branches", params.cursor, params.size, params.order, latest, count)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    response.headers.update(validator_headers(etag))
+    query = crud_branch.get_branches()
+    return await paginate_sqlalchemy(db, query, params)
 
 @router.get("/{branch_id}", response_model=BranchResponse)
-def get_branch(branch_id: int, db: Session = Depends(get_db)):
-    """Get a branch by ID."""
-    branch = crud_branch.get_branch(db, branch_id)
+async def get_branch(branch_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Get a branch by ID (conditional with If-None-Match/If-Modified-Since)."""
+    branch = await crud_branch.get_branch_response(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
+    etag = make_etag("branch", branch["id"], branch["updated_at"])
+    if is_not_modified(request, etag, branch["updated_at"]):
+        return not_modified_response(etag, branch["updated_at"])
+    response.headers.update(validator_headers(etag, branch["updated_at"]))
     return branch
 
 @router.post("", response_model=BranchResponse, status_code=201, dependencies=[Depends(get_current_admin)])
-def create_branch(branch: BranchCreate, db: Session = Depends(get_db)):
+async def create_branch(branch: BranchCreate, db: AsyncSession = Depends(get_db)):
     """Create a new branch (admin only)."""
-    logger.info(f"Creating branch: {branch.name}")
-    return crud_branch.create_branch(db, branch)
+    logger.info("Creating branch: %s", branch.name)
+    return await crud_branch.create_branch(db, branch)
 
 @router.put("/{branch_id}", response_model=BranchResponse, dependencies=[Depends(get_current_admin)])
-def update_branch(branch_id: int, branch: BranchUpdate, db: Session = Depends(get_db)):
+async def update_branch(branch_id: int, branch: BranchUpdate, db: AsyncSession = Depends(get_db)):
     """Update a branch (admin only)."""
-    updated = crud_branch.update_branch(db, branch_id, branch)
+    updated = await crud_branch.update_branch(db, branch_id, branch)
     if not updated:
         raise HTTPException(status_code=404, detail="Branch not found")
-    logger.info(f"Updated branch ID: {branch_id}")
+    logger.info("Updated branch ID: %s", branch_id)
     return updated
 
 @router.delete("/{branch_id}", dependencies=[Depends(get_current_admin)])
-def delete_branch(branch_id: int, db: Session = Depends(get_db)):
+async def delete_branch(branch_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a branch (admin only)."""
-    deleted = crud_branch.delete_branch(db, branch_id)
+    deleted = await crud_branch.delete_branch(db, branch_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Branch not found")
-    logger.info(f"Deleted branch ID: {branch_id}")
+    logger.info("Deleted branch ID: %s", branch_id)
     return {"message": "Branch deleted"}
@@ -1,9 +1,21 @@
 from fastapi import APIRouter, status
 from fastapi.responses import JSONResponse
+from db.base import engine, async_engine, replicas
+from db.pool import pool_status
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
 @router.get("")
-def health():
+async def health():
     content = {"health": "OK"}
     return JSONResponse(content=content, status_code=status.HTTP_200_OK)
+
+@router.get("/pool")
+async def pool_health():
+    """Connection pool occupancy and wait-time counters for this worker, plus replica health."""
+    content = {
+        "async": pool_status(async_engine.sync_engine.pool),
+        "sync": pool_status(engine.pool),
+        "replicas": replicas.status(),
+    }
+    return JSONResponse(content=content, status_code=status.HTTP_200_OK)
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, status, Query, Request, Cookie
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 from datetime import datetime, timezone, timedelta
 from db.base import get_db
 from cruds import user, oauth_client
-from utils.auth import verify_password, create_access_token, SECRET_KEY, ALGORITHM, validate_scopes
-from schemas.auth import OAuth2PasswordRequest, TokenResponse
+from utils.auth import create_access_token, get_current_admin, SECRET_KEY, ALGORITHM, validate_scopes
+from schemas.auth import ClientSecretRotate, OAuth2PasswordRequest, TokenResponse
 from utils.logger import get_logger
 from fastapi import Form
 from typing import Optional
@@ -32,13 +32,12 @@ async def token(
     query_scope: Optional[str] = Query(None),
     query_client_id: Optional[str] = Query(None),
     query_client_secret: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Authenticate a user and issue an OAuth 2.0 access token."""
-    # Log request details for debugging
-    logger.debug(f"Request headers: {dict(request.headers)}")
-    logger.debug(f"Request query params: {dict(request.query_params)}")
-    logger.debug(f"Form data: {form_data.model_dump() if form_data else {'grant_type': grant_type, 'username': username, 'password': password, 'scope': scope, 'client_id': client_id, 'client_secret': client_secret}}")
+    # Log request details for debugging; arguments are formatted only when DEBUG is enabled, never the secrets
+    logger.debug("Token request: grant_type=%s, username=%s, scope=%s, client_id=%s, query params=%s",
+                 grant_type, username, scope, client_id, list(request.query_params.keys()))
 
     # Extract client_id and client_secret from Authorization header if present
     auth_header = request.headers.get("authorization")
@@ -49,9 +48,9 @@ async def token(
             encoded_credentials = auth_header.split(" ")[1]
             decoded_credentials = base64.b64decode(encoded_credentials).decode("utf-8")
             header_client_id, header_client_secret = decoded_credentials.split(":")
-            logger.debug(f"Extracted client_id from Authorization header: {header_client_id}")
+            logger.debug("Extracted client_id from Authorization header: %s", header_client_id)
         except (base64.binascii.Error, ValueError, UnicodeDecodeError) as e:
-            logger.warning(f"Invalid Authorization header: {e}")
+            logger.warning("Invalid Authorization header: %s", e)
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Authorization header")
 
     # Prioritize form/JSON data, fall back to query params
@@ -83,24 +82,23 @@ async def token(
     final_client_id = header_client_id if header_client_id else data.client_id
     final_client_secret = header_client_secret if header_client_secret else data.client_secret
 
-    logger.debug(f"Processed request data: {data.dict()}")
-    logger.debug(f"Final client credentials: client_id={final_client_id}, client_secret={'[REDACTED]' if final_client_secret else None}")
+    logger.debug("Final client credentials: client_id=%s, client_secret=%s", final_client_id, "[REDACTED]" if final_client_secret else None)
 
     # Validate grant_type
     if data.grant_type != "password":
-        logger.warning(f"Invalid grant type: {data.grant_type}")
+        logger.warning("Invalid grant type: %s", data.grant_type)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid grant type")
 
     # Validate client credentials
     if not final_client_id or not final_client_secret:
         logger.warning("Missing client_id or client_secret")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Client authentication required")
-    oauth_client.validate_oauth_client(db, final_client_id, final_client_secret)
+    await oauth_client.validate_oauth_client(db, final_client_id, final_client_secret)
 
     # Validate user credentials
-    login_user = user.get_user_by_username(db, data.username)
-    if not login_user or not verify_password(login_user.hashed_password, data.password):
-        logger.warning(f"Login failed for {data.username}")
+    login_user = await user.authenticate_user(db, data.username, data.password)
+    if not login_user:
+        logger.warning("Login failed for %s", data.username)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user credentials")
 
     # Validate scopes
@@ -128,7 +126,7 @@ async def token(
         path="/"
     )
 
-    logger.info(f"Token issued for {data.username}")
+    logger.info("Token issued for %s", data.username)
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -152,7 +150,7 @@ async def logout(response: Response):
 async def refresh_token(
     response: Response,
     access_token: str = Cookie(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Refresh the JWT token."""
     if not access_token:
@@ -196,4 +194,12 @@ async def refresh_token(
         }
 
     except JWTError as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token") from e
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token") from e
+
+@router.put("/clients/{client_id}/secret", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(get_current_admin)])
+async def rotate_client_secret(client_id: str, body: ClientSecretRotate, db: AsyncSession = Depends(get_db)):
+    """Replace an OAuth client's secret (admin only); the old secret stops working on every worker."""
+    if not await oauth_client.rotate_oauth_client_secret(db, client_id, body.client_secret):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="OAuth client not found")
+    logger.info("Rotated secret of OAuth client %s", client_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from utils.metrics import CONTENT_TYPE_LATEST, metrics_payload
+
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this worker (or all workers with PROMETHEUS_MULTIPROC_DIR)."""
+    return Response(content=metrics_payload(), media_type=CONTENT_TYPE_LATEST)
@@ -1,30 +1,59 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from fastapi_pagination.ext.sqlalchemy import paginate as paginate_sqlalchemy
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination.cursor import CursorPage
 from db.base import get_db
-from schemas.movement import MovementCreate, MovementResponse
+from schemas.movement import MovementCreate, MovementResponse, MovementBatchCreate, MovementBatchResponse
 from cruds import movement
-from models.user import User
-from utils.auth import get_current_user
+from models.movement import Movement
+from utils.auth import CurrentUser, get_current_user
+from utils.idempotency import run_idempotent
 from utils.logger import get_logger
-from utils.pagination import CustomCursorParams
+from utils.pagination import CustomCursorParams, paginate_keyset, row_to_dict
+from utils.query_audit import query_budget
 
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/movements", tags=["Movements"])
 
-@router.post("", response_model=MovementResponse, status_code=201)
-def create_movement(new_movement: MovementCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Create a stock movement between branches."""
+@router.post("", response_model=MovementResponse, status_code=201, dependencies=[Depends(query_budget(20))])
+async def create_movement(new_movement: MovementCreate, request: Request, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Create a stock movement between branches.
+
+    Send an Idempotency-Key header to make retries safe: a repeated request
+    returns the stored response instead of moving the stock again.
+    """
+    user: CurrentUser = current_user["user"]
     new_movement.user_id = user.id  # Set user_id from authenticated user
-    logger.info(f"Creating movement for product ID: {new_movement.product_id} by user ID: {user.id}")
-    return movement.create_movement(db, new_movement)
+    logger.info("Creating movement for product ID: %s by user ID: %s", new_movement.product_id, user.id)
+    return await run_idempotent(request, db, user.id, new_movement, lambda session: movement.create_movement(session, new_movement),
+                                MovementResponse, status_code=201)
+
+@router.post("/batch", response_model=MovementBatchResponse, status_code=201)
+async def create_movements_batch(batch: MovementBatchCreate, request: Request, current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Create many stock movements in one request, all-or-nothing unless atomic is false.
+
+    Answers 400 with the per-item results when nothing was created. Send an
+    Idempotency-Key header to make retries safe, like POST /movements.
+    """
+    user: CurrentUser = current_user["user"]
+    for item in batch.items:
+        item.user_id = user.id  # Set user_id from authenticated user
+    logger.info("Creating batch of %s movements by user ID: %s (atomic=%s)", len(batch.items), user.id, batch.atomic)
+
+    async def create_batch(session: AsyncSession):
+        results, created = await movement.create_movements_batch(session, batch.items, atomic=batch.atomic)
+        return {"created": created, "failed": sum(r["status"] == "failed" for r in results), "results": results}
+
+    return await run_idempotent(request, db, user.id, batch, create_batch, MovementBatchResponse,
+                                status_code=lambda result: status.HTTP_201_CREATED if result["created"] else status.HTTP_400_BAD_REQUEST)
 
-@router.get("", response_model=CursorPage[MovementResponse])
-def get_movements(db: Session = Depends(get_db), params: CustomCursorParams = Depends()):
+@router.get("", response_model=CursorPage[MovementResponse], dependencies=[Depends(query_budget(1))])
+async def get_movements(db: AsyncSession = Depends(get_db), params: CustomCursorParams = Depends()):
     """Get all movements with cursor-based pagination."""
-    logger.info(f"Fetching movements with cursor={params.cursor}, size={params.size}, order={params.order}")
-    query = movement.list_movements(db)  # Ensure this returns a SQLAlchemy query
-    return paginate_sqlalchemy(query, params)
+    logger.info("Fetching movements with cursor=%s, size=%s, order=%s", params.cursor, params.size, params.order)
+    query = movement.list_movements()
+    page = await paginate_keyset(db, query, params, "id_asc", None, Movement.id, row_factory=row_to_dict)
+    # Rows are projected to the response shape already, serialize them without revalidating
+    return ORJSONResponse(page)
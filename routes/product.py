@@ -1,81 +1,158 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination.cursor import CursorPage
-from fastapi_pagination.ext.sqlalchemy import paginate as paginate_sqlalchemy
-from db.base import get_db
-from schemas.product import ProductResponse, ProductCreate, ProductUpdate
-from cruds.product import get_wine, get_wines, create_wine, update_wine, delete_wine
+from db.base import choose_session, get_db
+from schemas.product import ProductResponse, ProductCreate, ProductUpdate, ProductImportResponse
+from cruds.product import WINE_SORTS, get_wine_response, get_wines_page, get_wines_validator, search_wines_page, create_wine, update_wine, delete_wine, import_wines, export_wines
 from utils.auth import get_current_admin
+from utils.conditional import is_not_modified, make_etag, not_modified_response, validator_headers
 from utils.logger import get_logger
 from utils.pagination import CustomCursorParams
+from utils.query_audit import query_budget
+from utils.bulk import FORMATS, MEDIA_TYPES, format_from_content_type, iter_records
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
-@router.get("", response_model=CursorPage[ProductResponse])
-def read_wines(
-    db: Session = Depends(get_db),
+VALID_SORTS = list(WINE_SORTS)
+
+@router.get("", response_model=CursorPage[ProductResponse], dependencies=[Depends(query_budget(3))])
+async def read_wines(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     name: str | None = None,
     region: str | None = None,
     vintage: int | None = None,
     sort: str = "id_asc",  # Change default to id_asc for cursor compatibility
+    q: str | None = None,
     params: CustomCursorParams = Depends()
 ):
     """
     Get products with cursor-based pagination, optionally filtered by name, region, or vintage.
 
+    With `q`, products are searched by name, region and grape variety and returned
+    ranked by relevance (name prefix matches first); `name` and `sort` are ignored.
+
+    Pages carry an ETag derived from the latest update and the row count of the
+    filtered set; a matching If-None-Match is answered with 304 without reading the page.
+
     Args:
         db: Database session.
         name: Optional filter by product name (partial match).
         region: Optional filter by product region.
         vintage: Optional filter by product vintage year.
         sort: Sort order (e.g., 'id_asc', 'id_desc', 'name_asc', 'name_desc', 'vintage_asc', 'vintage_desc').
-        params: Cursor pagination parameters (cursor and size).
+        q: Optional search text (trigram similarity and prefix match on Postgres).
+        params: Keyset cursor pagination parameters (cursor and size); cursors are tied to the sort.
     """
-    valid_sorts = ["id_asc", "id_desc", "name_asc", "name_desc", "vintage_asc", "vintage_desc"]
-    if sort not in valid_sorts:
-        raise HTTPException(status_code=400, detail=f"Invalid sort parameter. Must be one of: {', '.join(valid_sorts)}")
-    logger.info(f"Fetching products with filters: name={name}, region={region}, vintage={vintage}, sort={sort}, cursor={params.cursor}, size={params.size}")
+    if sort not in VALID_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort parameter. Must be one of: {', '.join(VALID_SORTS)}")
+    logger.info("Fetching products with filters: q=%s, name=%s, region=%s, vintage=%s, sort=%s, cursor=%s, size=%s", q, name, region, vintage, sort, params.cursor, params.size)
+    search = q.strip() if q else None
     try:
-        query = get_wines(db, name=name, region=region, vintage=vintage, sort=sort)
-        return paginate_sqlalchemy(query, params)
+        latest, count = await get_wines_validator(db, name=name, region=region, vintage=vintage, q=search)
+        etag = make_etag("products", search, name, region, vintage, sort, params.cursor, params.size, latest, count)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        if search:
+            page = await search_wines_page(db, params, search, region=region, vintage=vintage)
+        else:
+            page = await get_wines_page(db, params, name=name, region=region, vintage=vintage, sort=sort)
+        # Rows are projected to the response shape already, serialize them without revalidating
+        return ORJSONResponse(page, headers=validator_headers(etag))
+    except HTTPException:
+        raise
     except ValueError as e:
-        logger.error(f"Invalid sort parameter: {str(e)}")
+        logger.error("Invalid sort parameter: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error fetching products: {str(e)}")
+        logger.error("Error fetching products: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error while fetching products")
 
-@router.get("/{wine_id}", response_model=ProductResponse)
-def read_wine(wine_id: int, db: Session = Depends(get_db)):
-    """Get a product by ID."""
-    logger.info(f"Fetching product ID={wine_id}")
-    db_wine = get_wine(db, wine_id=wine_id)
+@router.get("/export")
+async def export_products(
+    request: Request,
+    format: str = "csv",
+    name: str | None = None,
+    region: str | None = None,
+    vintage: int | None = None,
+    sort: str = "id_asc",
+):
+    """Stream all products matching the filters as CSV or NDJSON."""
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(FORMATS)}")
+    if sort not in VALID_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort parameter. Must be one of: {', '.join(VALID_SORTS)}")
+    logger.info("Exporting products as %s with filters: name=%s, region=%s, vintage=%s, sort=%s", format, name, region, vintage, sort)
+
+    _, session_factory = choose_session(request)
+
+    async def body():
+        # The request-scoped session is closed before the response streams, use a dedicated one
+        async with session_factory() as db:
+            async for chunk in export_wines(db, format, name=name, region=region, vintage=vintage, sort=sort):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
+
+@router.post("/import", response_model=ProductImportResponse, dependencies=[Depends(get_current_admin)])
+async def import_products(request: Request, format: str | None = None, mode: str = "skip", db: AsyncSession = Depends(get_db)):
+    """
+    Bulk import products from a CSV or NDJSON request body (admin only).
+
+    The body is streamed and inserted in chunks. The format is taken from the `format`
+    query parameter or the Content-Type header. With mode=skip existing names are kept,
+    with mode=update they are overwritten. Invalid rows are reported and skipped.
+    """
+    fmt = format or format_from_content_type(request.headers.get("content-type"))
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(FORMATS)}")
+    if mode not in ("skip", "update"):
+        raise HTTPException(status_code=400, detail="Invalid mode. Must be one of: skip, update")
+    logger.info("Importing products as %s with mode=%s", fmt, mode)
+    summary = await import_wines(db, iter_records(request.stream(), fmt), mode=mode)
+    logger.info("Imported products: written=%s, skipped=%s, failed=%s", summary['written'], summary['skipped'], summary['failed'])
+    return summary
+
+@router.get("/{wine_id}", response_model=ProductResponse, dependencies=[Depends(query_budget(1))])
+async def read_wine(wine_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Get a product by ID (conditional with If-None-Match/If-Modified-Since)."""
+    logger.info("Fetching product ID=%s", wine_id)
+    db_wine = await get_wine_response(db, wine_id)
     if db_wine is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    etag = make_etag("product", db_wine["id"], db_wine["updated_at"])
+    if is_not_modified(request, etag, db_wine["updated_at"]):
+        return not_modified_response(etag, db_wine["updated_at"])
+    response.headers.update(validator_headers(etag, db_wine["updated_at"]))
     return db_wine
 
 @router.post("", response_model=ProductResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(get_current_admin)])
-def create_new_wine(wine: ProductCreate, db: Session = Depends(get_db)):
+async def create_new_wine(wine: ProductCreate, db: AsyncSession = Depends(get_db)):
     """Create a new product (admin only)."""
-    logger.info(f"Creating product: {wine.name}")
-    return create_wine(db, wine)
+    logger.info("Creating product: %s", wine.name)
+    return await create_wine(db, wine)
 
 @router.put("/{wine_id}", response_model=ProductResponse, dependencies=[Depends(get_current_admin)])
-def update_existing_wine(wine_id: int, wine: ProductUpdate, db: Session = Depends(get_db)):
+async def update_existing_wine(wine_id: int, wine: ProductUpdate, db: AsyncSession = Depends(get_db)):
     """Update a product (admin only)."""
-    logger.info(f"Updating product ID={wine_id}")
-    db_wine = update_wine(db, wine_id, wine)
+    logger.info("Updating product ID=%s", wine_id)
+    db_wine = await update_wine(db, wine_id, wine)
     if db_wine is None:
         raise HTTPException(status_code=404, detail=" product's not found")
     return db_wine
 
 @router.delete("/{wine_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(get_current_admin)])
-def delete_existing_wine(wine_id: int, db: Session = Depends(get_db)):
+async def delete_existing_wine(wine_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a product (admin only)."""
-    logger.info(f"Deleting product ID={wine_id}")
-    success = delete_wine(db, wine_id)
+    logger.info("Deleting product ID=%s", wine_id)
+    success = await delete_wine(db, wine_id)
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
     return None
@@ -1,47 +1,190 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from fastapi_pagination.ext.sqlalchemy import paginate as paginate_sqlalchemy
+from datetime import datetime
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_pagination.cursor import CursorPage
 from db.base import get_db
+from schemas.stock import StockAdjustment, StockAdjustmentBatch, StockAdjustmentResponse, StockAdjustmentBatchResponse, StockShardsUpdate, StockShardsResponse, StockEventResponse, StockCreate, StockUpdate, StockResponse, ProductStockTotalResponse, BranchStockTotalResponse, GroupedStockTotalResponse, StockSnapshotResponse, StockCheckpointResponse
+from cruds import stock, stock_checkpoint
 from models.stock import Stock
-from schemas.stock import StockCreate, StockUpdate, StockResponse
-from cruds import stock
-from utils.auth import get_current_admin
+from utils.auth import CurrentUser, authenticate_websocket, get_current_admin, get_current_user, get_stream_user
+from utils.conditional import is_not_modified, make_etag, not_modified_response, validator_headers
+from utils.idempotency import run_idempotent
 from utils.logger import get_logger
-from utils.pagination import CustomCursorParams
+from utils.pagination import CustomCursorParams, paginate_keyset
+from utils.query_audit import query_budget
+from utils.stock_feed import stock_feed
 
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/stock", tags=["Stock"])
 
-@router.get("", response_model=CursorPage[StockResponse])
-def list_stock(branch_id: int | None = None, db: Session = Depends(get_db), params: CustomCursorParams = Depends()):
-    """Get stock entries, optionally filtered by branch_id, with cursor-based pagination."""
-    logger.info(f"Fetching stock entries with branch_id={branch_id}, cursor={params.cursor}, size={params.size}, order={params.order}")
-    query = db.query(Stock).options(joinedload(Stock.product))
-    if branch_id:
-        query = query.filter(Stock.branch_id == branch_id)
-    query = query.order_by(Stock.id.asc())  # Ensure stable sorting
-    return paginate_sqlalchemy(query, params)
-
-@router.post("", response_model=StockResponse, status_code=201, dependencies=[Depends(get_current_admin)])
-def create_stock(new_stock: StockCreate, db: Session = Depends(get_db)):
-    """Create a new stock entry (admin only)."""
-    return stock.create_stock(db, new_stock)
+@router.get("", response_model=CursorPage[StockResponse], dependencies=[Depends(query_budget(2))])
+async def list_stock(request: Request, branch_id: int | None = None, db: AsyncSession = Depends(get_db), params: CustomCursorParams = Depends()):
+    """Get stock entries, optionally filtered by branch_id, with cursor-based pagination.
+
+    Pages carry an ETag; a matching If-None-Match is answered with 304 without reading the page.
+    """
+    logger.info("Fetching stock entries with branch_id=%s, cursor=%s, size=%s, order=%s", branch_id, params.cursor, params.size, params.order)
+    latest, count = await stock.get_stock_validator(db, branch_id)
+    etag = make_etag("stock", branch_id, params.cursor, params.size, latest, count)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    query = stock.get_stock(branch_id)
+    page = await paginate_keyset(db, query, params, "id_asc", None, Stock.id, row_factory=stock.stock_row)
+    # Rows are projected to the response shape already, serialize them without revalidating
+    return ORJSONResponse(page, headers=validator_headers(etag))
+
+def sse_message(event: dict | None) -> bytes:
+    """Encode a feed event as a Server-Sent Event, or a heartbeat comment for None."""
+    if event is None:
+        return b": heartbeat\n\n"
+    return b"id: %d\nevent: stock\ndata: %s\n\n" % (event["id"], orjson.dumps(event))
+
+@router.get("/events", response_class=StreamingResponse, dependencies=[Depends(get_stream_user)],
+            responses={200: {"model": StockEventResponse, "content": {"text/event-stream": {}}}})
+async def stream_stock_events(request: Request, branch_id: int | None = None, product_id: int | None = None,
+                              after: int | None = None):
+    """
+    Stream stock changes as Server-Sent Events, optionally for one branch and/or product.
+
+    Each change is an `event: stock` whose `id` is the feed offset. Reconnecting
+    clients resume after `after`, or after the `Last-Event-ID` header that
+    EventSource sends, and receive the changes they missed first. EventSource
+    cannot set headers, so the access token may be passed as `token` instead.
+    """
+    if after is None and request.headers.get("last-event-id"):
+        try:
+            after = int(request.headers["last-event-id"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be a feed offset")
+    logger.info("Streaming stock events for branch_id=%s, product_id=%s after=%s", branch_id, product_id, after)
+
+    async def body():
+        async for event in stock_feed.subscribe(branch_id, product_id, after):
+            yield sse_message(event)
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/events/ws")
+async def stock_events_socket(websocket: WebSocket, branch_id: int | None = None, product_id: int | None = None,
+                              after: int | None = None):
+    """Stock changes over a WebSocket; same filters and resume offset as GET /stock/events, token as a query parameter."""
+    user = await authenticate_websocket(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    logger.info("Streaming stock events over WebSocket to user ID: %s", user.id)
+    try:
+        async for event in stock_feed.subscribe(branch_id, product_id, after):
+            message = {"type": "heartbeat"} if event is None else {"type": "stock", **event}
+            await websocket.send_text(orjson.dumps(message).decode())
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/totals", response_model=list[GroupedStockTotalResponse])
+async def list_grouped_totals(group_by: str = "region", db: AsyncSession = Depends(get_db)):
+    """Get company-wide stock totals grouped by product region or vintage."""
+    if group_by not in stock.STOCK_TOTAL_GROUPS:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by. Must be one of: {', '.join(stock.STOCK_TOTAL_GROUPS)}")
+    logger.info("Fetching stock totals grouped by %s", group_by)
+    return await stock.list_grouped_stock_totals(db, group_by)
+
+@router.get("/totals/products/{product_id}", response_model=ProductStockTotalResponse)
+async def get_product_total(product_id: int, db: AsyncSession = Depends(get_db)):
+    """Get the company-wide quantity of a product."""
+    quantity = await stock.get_product_stock_total(db, product_id)
+    if quantity is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"product_id": product_id, "quantity": quantity}
+
+@router.get("/totals/branches", response_model=list[BranchStockTotalResponse])
+async def list_branch_totals(db: AsyncSession = Depends(get_db)):
+    """Get the total quantity held by each branch."""
+    return await stock.list_branch_stock_totals(db)
+
+@router.get("/totals/branches/{branch_id}", response_model=BranchStockTotalResponse)
+async def get_branch_total(branch_id: int, db: AsyncSession = Depends(get_db)):
+    """Get the total quantity held by a branch."""
+    quantity = await stock.get_branch_stock_total(db, branch_id)
+    if quantity is None:
+        raise HTTPException(status_code=404, detail="Branch not found")
+    return {"branch_id": branch_id, "quantity": quantity}
+
+@router.get("/history", response_model=list[StockSnapshotResponse])
+async def get_stock_history(branch_id: int, at: datetime, product_id: int | None = None, db: AsyncSession = Depends(get_db)):
+    """Get the stock held by a branch at a point in time, optionally for one product."""
+    logger.info("Rebuilding stock at branch_id=%s, product_id=%s, at=%s", branch_id, product_id, at)
+    quantities = await stock_checkpoint.get_stock_at(db, branch_id, at, product_id=product_id)
+    if product_id and product_id not in quantities:
+        quantities[product_id] = 0
+    return [
+        {"product_id": pid, "branch_id": branch_id, "quantity": quantity, "at": at}
+        for pid, quantity in sorted(quantities.items())
+    ]
+
+@router.post("/checkpoints", response_model=StockCheckpointResponse, status_code=201, dependencies=[Depends(get_current_admin)])
+async def create_checkpoint(branch_id: int | None = None, db: AsyncSession = Depends(get_db)):
+    """Checkpoint current stock so history queries replay fewer movements (admin only, run periodically)."""
+    checkpointed = await stock_checkpoint.take_stock_checkpoint(db, branch_id=branch_id)
+    logger.info("Checkpointed %s stock rows", checkpointed)
+    return {"checkpointed": checkpointed}
+
+@router.post("", response_model=StockResponse, status_code=201, dependencies=[Depends(query_budget(16))])
+async def create_stock(new_stock: StockCreate, request: Request, admin: CurrentUser = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
+    """Create a new stock entry (admin only); retries with the same Idempotency-Key replay the stored response."""
+    return await run_idempotent(request, db, admin.id, new_stock, lambda session: stock.create_stock(session, new_stock),
+                                StockResponse, status_code=201)
+
+@router.patch("/adjust", response_model=StockAdjustmentResponse | StockAdjustmentBatchResponse, dependencies=[Depends(query_budget(20))])
+async def adjust_stock(adjustment: StockAdjustment | StockAdjustmentBatch, request: Request,
+                       current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Apply relative quantity changes, e.g. point-of-sale decrements.
+
+    Takes one `{product_id, branch_id, delta}` or a batch `{items, atomic}`. Each
+    adjustment is a single conditional UPDATE, so concurrent tills never overwrite
+    each other and stock never goes negative; sharded entries take single
+    adjustments on one of their shards. A single adjustment fails with 400
+    on insufficient stock and 404 for an unknown stock entry; a batch reports
+    per-item results. Send an Idempotency-Key header to make retries safe.
+    """
+    user: CurrentUser = current_user["user"]
+    if isinstance(adjustment, StockAdjustmentBatch):
+        logger.info("Adjusting %s stock entries by user ID: %s (atomic=%s)", len(adjustment.items), user.id, adjustment.atomic)
+
+        async def apply_batch(session: AsyncSession):
+            results, applied = await stock.adjust_stock_batch(session, adjustment.items, atomic=adjustment.atomic)
+            return {"applied": applied, "failed": sum(r["status"] == "failed" for r in results), "results": results}
+
+        return await run_idempotent(request, db, user.id, adjustment, apply_batch, StockAdjustmentBatchResponse)
+    return await run_idempotent(request, db, user.id, adjustment, lambda session: stock.adjust_stock(session, adjustment),
+                                StockAdjustmentResponse)
 
 @router.put("/{stock_id}", response_model=StockResponse, dependencies=[Depends(get_current_admin)])
-def update_stock(stock_id: int, updated_stock: StockUpdate, db: Session = Depends(get_db)):
+async def update_stock(stock_id: int, updated_stock: StockUpdate, db: AsyncSession = Depends(get_db)):
     """Update a stock entry (admin only)."""
-    updated = stock.update_stock(db, stock_id, updated_stock)
+    updated = await stock.update_stock(db, stock_id, updated_stock)
     if not updated:
         raise HTTPException(status_code=404, detail="Stock ID not found")
     return updated
 
+@router.put("/{stock_id}/shards", response_model=StockShardsResponse, dependencies=[Depends(get_current_admin)])
+async def set_stock_shards(stock_id: int, body: StockShardsUpdate, db: AsyncSession = Depends(get_db)):
+    """Split a hot stock entry into shards that concurrent adjustments spread over (admin only, 0 turns it off)."""
+    result = await stock.set_stock_shards(db, stock_id, body.shards)
+    if not result:
+        raise HTTPException(status_code=404, detail="Stock ID not found")
+    return result
+
 @router.delete("/{stock_id}", dependencies=[Depends(get_current_admin)])
-def delete_stock(stock_id: int, db: Session = Depends(get_db)):
+async def delete_stock(stock_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a stock entry (admin only)."""
-    deleted = stock.delete_stock(db, stock_id)
+    deleted = await stock.delete_stock(db, stock_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Stock ID not found")
     return {"message": "Stock ID deleted"}
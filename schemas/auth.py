@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class OAuth2PasswordRequest(BaseModel):
     grant_type: str
@@ -12,4 +12,7 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str
     expires_in: int
-    scope: str | None = None
\ No newline at end of file
+    scope: str | None = None
+
+class ClientSecretRotate(BaseModel):
+    client_secret: str = Field(min_length=16, max_length=255)
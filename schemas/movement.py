@@ -1,6 +1,6 @@
-from pydantic import BaseModel, PositiveInt, field_validator, ConfigDict
+from pydantic import BaseModel, Field, PositiveInt, field_validator, ConfigDict
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 class MovementCreate(BaseModel):
     product_id: PositiveInt
@@ -25,3 +25,18 @@ class MovementResponse(MovementCreate):
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+class MovementBatchCreate(BaseModel):
+    items: List[MovementCreate] = Field(min_length=1, max_length=10000)
+    atomic: bool = True  # All-or-nothing; when False, valid items are applied and failures reported
+
+class MovementBatchItemResult(BaseModel):
+    index: int
+    status: Literal["created", "failed", "skipped"]
+    movement_id: Optional[int] = None
+    error: Optional[str] = None
+
+class MovementBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[MovementBatchItemResult]
@@ -66,4 +66,15 @@ class ProductListResponse(BaseModel):
     total: int
     next_cursor: Optional[int] = None
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class ProductImportError(BaseModel):
+    line: int
+    error: str
+
+class ProductImportResponse(BaseModel):
+    received: int
+    written: int
+    skipped: int
+    failed: int
+    errors: List[ProductImportError]
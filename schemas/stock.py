@@ -1,6 +1,6 @@
-from pydantic import BaseModel, PositiveInt, NonNegativeInt, ConfigDict
+from pydantic import BaseModel, Field, PositiveInt, NonNegativeInt, ConfigDict
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 from schemas.product import ProductResponse
 
 class StockCreate(BaseModel):
@@ -11,6 +11,48 @@ class StockCreate(BaseModel):
 class StockUpdate(BaseModel):
     quantity: Optional[NonNegativeInt] = None
 
+class StockAdjustment(BaseModel):
+    product_id: PositiveInt
+    branch_id: PositiveInt
+    delta: int  # Negative for sales, positive for returns and receipts
+
+class StockAdjustmentBatch(BaseModel):
+    items: List[StockAdjustment] = Field(min_length=1, max_length=1000)
+    atomic: bool = True  # All-or-nothing; when False, the adjustments that fit are applied and failures reported
+
+class StockAdjustmentResponse(BaseModel):
+    product_id: int
+    branch_id: int
+    quantity: int
+
+class StockAdjustmentItemResult(BaseModel):
+    index: int
+    status: Literal["applied", "failed", "skipped"]
+    quantity: Optional[int] = None
+    error: Optional[str] = None
+
+class StockAdjustmentBatchResponse(BaseModel):
+    applied: int
+    failed: int
+    results: List[StockAdjustmentItemResult]
+
+class StockShardsUpdate(BaseModel):
+    shards: int = Field(ge=0, le=64)  # 0 turns sharding off
+
+class StockShardsResponse(BaseModel):
+    stock_id: int
+    shards: int
+    quantity: int
+
+class StockEventResponse(BaseModel):
+    id: int  # feed offset, resume with after=id or Last-Event-ID
+    product_id: int
+    branch_id: int
+    quantity: int
+    delta: int
+    source: Literal["create", "update", "adjust", "delete", "movement", "compaction"]
+    created_at: datetime
+
 class StockResponse(BaseModel):
     id: int
     product_id: PositiveInt
@@ -20,4 +62,26 @@ class StockResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class ProductStockTotalResponse(BaseModel):
+    product_id: int
+    quantity: int
+
+class BranchStockTotalResponse(BaseModel):
+    branch_id: int
+    quantity: int
+
+class GroupedStockTotalResponse(BaseModel):
+    key: Optional[str | int]
+    quantity: int
+    products: int
+
+class StockSnapshotResponse(BaseModel):
+    product_id: int
+    branch_id: int
+    quantity: int
+    at: datetime
+
+class StockCheckpointResponse(BaseModel):
+    checkpointed: int
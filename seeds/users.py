@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from models.user import User, Role
 from utils.auth import hash_password
@@ -6,10 +7,10 @@ from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-def seed_admin_user(db: Session):
+async def seed_admin_user(db: AsyncSession):
     """Seed a default admin user if it doesn't exist."""
     logger.debug("Checking for existing admin user...")
-    existing = db.query(User).filter(User.username == "admin").first()
+    existing = await db.scalar(select(User).where(User.username == "admin"))
     if existing:
         logger.info("Admin user already exists, skipping seed.")
         return
@@ -25,9 +26,9 @@ def seed_admin_user(db: Session):
 
     try:
         db.add(admin_user)
-        db.commit()
+        await db.commit()
         logger.info("✅ Default admin user created.")
     except IntegrityError as e:
-        db.rollback()
-        logger.error(f"Failed to create admin user: {e}")
+        await db.rollback()
+        logger.error("Failed to create admin user: %s", e)
         raise
\ No newline at end of file
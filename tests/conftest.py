@@ -0,0 +1,76 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+import pytest
+
+# Point the app at throwaway SQLite databases (a primary and one read replica) before any app module creates its engines
+_tmp = tempfile.mkdtemp(prefix="stock-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/primary.db")
+os.environ.setdefault("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{_tmp}/primary.db")
+os.environ.setdefault("ASYNC_REPLICA_DATABASE_URLS", f"sqlite+aiosqlite:///{_tmp}/replica.db")
+os.environ.setdefault("JWT_KEY", "test-secret")
+# Tests compact sharded rows themselves
+os.environ.setdefault("STOCK_SHARD_COMPACT_INTERVAL", "3600")
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    """The full app over the bootstrapped primary, logged in as the seeded admin."""
+    from fastapi.testclient import TestClient
+    from app.bootstrap import bootstrap
+    from app.main import app
+
+    asyncio.run(bootstrap())
+    with TestClient(app) as client:
+        response = client.post("/auth/token", data={
+            "grant_type": "password", "username": "admin", "password": "admin123",
+            "client_id": "app123", "client_secret": "secret456",
+        })
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        yield client
+
+
+@pytest.fixture
+def api(app_client, monkeypatch):
+    """app_client with reads on the primary too; replica routing is covered by test_primary_pin."""
+    from db.base import replicas
+
+    monkeypatch.setattr(replicas, "pick", lambda: None)
+    return app_client
+
+
+@pytest.fixture
+def new_branch(api):
+    """Create a branch with a unique name and return its id."""
+    def create() -> int:
+        return api.post("/branches", json={"name": f"Branch {next(_names)}"}).json()["id"]
+    return create
+
+
+@pytest.fixture
+def new_product(api):
+    """Create a product with a unique name and return its id."""
+    def create(**fields) -> int:
+        return api.post("/products", json={"name": f"Wine {next(_names)}", **fields}).json()["id"]
+    return create
+
+
+@pytest.fixture
+def stock_row(api):
+    """Create a stock row and return it."""
+    def create(product_id: int, branch_id: int, quantity: int) -> dict:
+        return api.post("/stock", json={"product_id": product_id, "branch_id": branch_id, "quantity": quantity}).json()
+    return create
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic, for the TTL caches."""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
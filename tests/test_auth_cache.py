@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from models.user import Role, User
+from tests.test_shared_cache import FakeRedis
+from utils import auth
+from utils.cache import TTLCache
+from utils.shared_cache import TieredCache
+
+
+class Database:
+    """Session stand-in that returns one user and counts the loads."""
+
+    def __init__(self):
+        self.loads = 0
+
+    async def scalar(self, query):
+        self.loads += 1
+        now = datetime(2026, 1, 1)
+        return User(id=1, username="till", name="Till", email=None, role=Role.user, created_at=now, updated_at=now)
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    """A FakeRedis behind the auth caches of this worker, which start empty."""
+    shared = FakeRedis()
+    monkeypatch.setattr(auth, "catalog_cache", TieredCache(shared))
+    monkeypatch.setattr(auth, "_user_cache", TTLCache(maxsize=100, ttl=60))
+    return shared
+
+
+def snapshot(db: Database):
+    return asyncio.run(auth.get_user_snapshot(db, 1))
+
+
+def test_hits_skip_the_shared_cache_within_the_generation_ttl(shared, clock):
+    db = Database()
+    assert snapshot(db).username == "till"
+    gets = shared.gets
+    snapshot(db)
+    snapshot(db)
+    assert shared.gets == gets
+    assert db.loads == 1
+
+    clock[0] += auth.AUTH_GENERATION_TTL
+    snapshot(db)
+    assert shared.gets == gets + 1
+    assert db.loads == 1
+
+
+def test_other_workers_invalidation_applies_after_the_generation_ttl(shared, clock):
+    db = Database()
+    snapshot(db)
+    asyncio.run(TieredCache(shared).invalidate(auth.USERS_CACHE))
+    snapshot(db)
+    assert db.loads == 1
+
+    clock[0] += auth.AUTH_GENERATION_TTL
+    snapshot(db)
+    assert db.loads == 2
+
+
+def test_unreachable_shared_cache_serves_local_snapshots(shared, clock):
+    db = Database()
+    snapshot(db)
+    shared.down = True
+    clock[0] += auth.AUTH_GENERATION_TTL
+    assert snapshot(db).id == 1
+    assert snapshot(db).id == 1
+    assert db.loads == 1
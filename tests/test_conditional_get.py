@@ -0,0 +1,71 @@
+def test_product_etag_answers_304_until_the_product_changes(api, new_product):
+    product = new_product(vintage=2012)
+    first = api.get(f"/products/{product}")
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    cached = api.get(f"/products/{product}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+    # Weak comparison, lists and the wildcard
+    assert api.get(f"/products/{product}", headers={"If-None-Match": etag.removeprefix("W/")}).status_code == 304
+    assert api.get(f"/products/{product}", headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+    assert api.get(f"/products/{product}", headers={"If-None-Match": "*"}).status_code == 304
+
+    api.put(f"/products/{product}", json={"vintage": 2013})
+    changed = api.get(f"/products/{product}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["vintage"] == 2013
+    assert changed.headers["ETag"] != etag
+
+
+def test_branch_if_modified_since(api, new_branch):
+    branch = new_branch()
+    last_modified = api.get(f"/branches/{branch}").headers["Last-Modified"]
+
+    assert api.get(f"/branches/{branch}", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert api.get(f"/branches/{branch}", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    assert api.get(f"/branches/{branch}", headers={"If-Modified-Since": "not a date"}).status_code == 200
+    # If-None-Match takes precedence
+    headers = {"If-Modified-Since": last_modified, "If-None-Match": '"stale"'}
+    assert api.get(f"/branches/{branch}", headers=headers).status_code == 200
+
+
+def test_stock_page_etag_changes_with_quantities_and_rows(api, new_branch, new_product, stock_row):
+    branch, product = new_branch(), new_product()
+    stock_row(product, branch, 5)
+
+    def etag() -> str:
+        response = api.get("/stock", params={"branch_id": branch})
+        assert response.status_code == 200
+        return response.headers["ETag"]
+
+    first = etag()
+    assert api.get("/stock", params={"branch_id": branch}, headers={"If-None-Match": first}).status_code == 304
+
+    api.patch("/stock/adjust", json={"product_id": product, "branch_id": branch, "delta": -1})
+    adjusted = etag()
+    assert adjusted != first
+
+    stock_row(new_product(), branch, 1)
+    assert etag() != adjusted
+    # Other branches are not part of this page
+    same = etag()
+    stock_row(product, new_branch(), 1)
+    assert etag() == same
+
+
+def test_list_etags_follow_filters_and_inserts(api, request, new_branch, new_product):
+    region = request.node.name
+    new_product(region=region)
+    products = api.get("/products", params={"region": region})
+    assert api.get("/products", params={"region": region}, headers={"If-None-Match": products.headers["ETag"]}).status_code == 304
+    assert api.get("/products", params={"region": region, "sort": "name_asc"}).headers["ETag"] != products.headers["ETag"]
+    new_product(region=region)
+    assert api.get("/products", params={"region": region}, headers={"If-None-Match": products.headers["ETag"]}).status_code == 200
+
+    branches = api.get("/branches").headers["ETag"]
+    assert api.get("/branches", headers={"If-None-Match": branches}).status_code == 304
+    new_branch()
+    assert api.get("/branches", headers={"If-None-Match": branches}).status_code == 200
@@ -0,0 +1,43 @@
+from schemas.movement import MovementResponse
+from schemas.product import ProductResponse
+from schemas.stock import StockResponse
+
+
+def validated(model, item: dict) -> dict:
+    """What the response model would have produced for the item."""
+    return model.model_validate(item).model_dump(mode="json")
+
+
+def test_stock_page_items_have_the_stock_response_shape(api, request, new_branch, new_product, stock_row):
+    branch = new_branch()
+    created = stock_row(new_product(region=request.node.name, vintage=2015), branch, 4)
+
+    items = api.get("/stock", params={"branch_id": branch}).json()["items"]
+    assert items == [created]
+    assert items[0] == validated(StockResponse, items[0])
+    assert items[0]["product"]["region"] == request.node.name
+
+
+def test_movement_page_items_have_the_movement_response_shape(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 4)
+    created = api.post("/movements", json={"product_id": product, "origin_branch_id": origin,
+                                           "destination_branch_id": destination, "quantity": 1, "user_id": 1,
+                                           "notes": "restock"}).json()
+
+    items, params = [], {"size": 100}
+    while params.get("cursor", True):
+        page = api.get("/movements", params=params).json()
+        items += [item for item in page["items"] if item["id"] == created["id"]]
+        params["cursor"] = page["next_page"]
+    assert items == [created]
+    assert items[0] == validated(MovementResponse, items[0])
+
+
+def test_product_page_items_have_the_product_response_shape(api, request, new_product):
+    region = request.node.name
+    product = new_product(region=region, vintage=2001, grape_variety="Malbec")
+
+    items = api.get("/products", params={"region": region}).json()["items"]
+    assert items == [api.get(f"/products/{product}").json()]
+    assert items[0] == validated(ProductResponse, items[0])
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+import app.main  # noqa: F401 (registers every model on Base.metadata)
+from app import bootstrap
+from db.base import Base
+from db.migrations import LATEST_VERSION, MIGRATIONS, upgrade
+
+
+def schema(engine) -> dict[str, list]:
+    inspector = inspect(engine)
+    return {
+        table: [
+            sorted((column["name"], str(column["type"]), column["nullable"]) for column in inspector.get_columns(table)),
+            sorted((index["name"], tuple(index["column_names"])) for index in inspector.get_indexes(table)),
+            sorted((tuple(fk["constrained_columns"]), fk["referred_table"]) for fk in inspector.get_foreign_keys(table)),
+        ]
+        for table in inspector.get_table_names() if table != "schema_migrations"
+    }
+
+
+def test_migrations_build_the_schema_of_the_models(tmp_path):
+    migrated, created = create_engine(f"sqlite:///{tmp_path}/migrated.db"), create_engine(f"sqlite:///{tmp_path}/created.db")
+    with migrated.begin() as conn:
+        assert upgrade(conn) == [version for version, _, _ in MIGRATIONS]
+    Base.metadata.create_all(created)
+    assert schema(migrated) == schema(created)
+
+
+def test_baseline_holds_only_the_original_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/baseline.db")
+    with engine.begin() as conn:
+        MIGRATIONS[0][2].upgrade(conn)
+    assert set(inspect(engine).get_table_names()) == {
+        "users", "clients", "oauth_clients", "branches", "products", "stock", "movements",
+    }
+
+
+def test_workers_refuse_a_schema_behind_instead_of_migrating(monkeypatch):
+    async def schema_version():
+        return LATEST_VERSION - 1
+
+    async def bootstrap_run():
+        raise AssertionError("workers must not bootstrap by default")
+
+    monkeypatch.setattr(bootstrap, "schema_version", schema_version)
+    monkeypatch.setattr(bootstrap, "bootstrap", bootstrap_run)
+    assert bootstrap.DB_MIGRATE_ON_STARTUP is False
+    with pytest.raises(RuntimeError, match="run python -m app.bootstrap"):
+        asyncio.run(bootstrap.check_schema())
@@ -0,0 +1,191 @@
+from concurrent.futures import ThreadPoolExecutor
+
+MISSING_ID = 999_999
+
+
+def transfer(api, product_id: int, origin: int, destination: int, quantity: int):
+    return api.post("/movements", json={
+        "product_id": product_id, "origin_branch_id": origin, "destination_branch_id": destination,
+        "quantity": quantity, "user_id": 1,
+    })
+
+
+def stock_at(api, branch_id: int) -> dict[int, int]:
+    items = api.get("/stock", params={"branch_id": branch_id, "size": 100}).json()["items"]
+    return {item["product_id"]: item["quantity"] for item in items}
+
+
+def movements_of(api, product_id: int) -> list[dict]:
+    movements, params = [], {"size": 100}
+    while True:
+        page = api.get("/movements", params=params).json()
+        movements += [item for item in page["items"] if item["product_id"] == product_id]
+        if not page["next_page"]:
+            return movements
+        params["cursor"] = page["next_page"]
+
+
+def test_missing_destination_branch_is_404_without_stock_rows(api, new_branch, new_product, stock_row):
+    origin, product = new_branch(), new_product()
+    stock_row(product, origin, 10)
+
+    response = transfer(api, product, origin, MISSING_ID, 3)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Destination branch not found"
+    assert stock_at(api, MISSING_ID) == {}
+    assert stock_at(api, origin) == {product: 10}
+
+
+def test_missing_product_is_404_without_stock_rows(api, new_branch):
+    origin, destination = new_branch(), new_branch()
+
+    response = transfer(api, MISSING_ID, origin, destination, 1)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Product not found"
+    assert stock_at(api, origin) == {}
+    assert stock_at(api, destination) == {}
+
+
+def test_missing_origin_branch_is_404_without_stock_rows(api, new_branch, new_product):
+    destination, product = new_branch(), new_product()
+
+    response = transfer(api, product, MISSING_ID, destination, 1)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Origin branch not found"
+    assert stock_at(api, destination) == {}
+
+
+def test_transfer_debits_the_origin_and_creates_the_destination_row(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 10)
+
+    response = transfer(api, product, origin, destination, 3)
+    assert response.status_code == 201
+    assert response.json()["quantity"] == 3
+    assert stock_at(api, origin) == {product: 7}
+    assert stock_at(api, destination) == {product: 3}
+
+    # Back the other way: the destination row now exists and is credited
+    assert transfer(api, product, destination, origin, 2).status_code == 201
+    assert stock_at(api, origin) == {product: 9}
+    assert stock_at(api, destination) == {product: 1}
+    assert [(m["origin_branch_id"], m["quantity"]) for m in movements_of(api, product)] == [(origin, 3), (destination, 2)]
+
+
+def test_insufficient_stock_is_400_and_moves_nothing(api, new_branch, new_product, stock_row):
+    # The destination has the lower id, so its credit runs before the debit fails
+    destination, origin, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 2)
+
+    response = transfer(api, product, origin, destination, 3)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Insufficient stock at origin branch"
+    assert stock_at(api, origin) == {product: 2}
+    assert stock_at(api, destination) == {}
+    assert movements_of(api, product) == []
+
+
+def test_concurrent_transfers_do_not_oversell(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 5)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        codes = list(pool.map(lambda _: transfer(api, product, origin, destination, 1).status_code, range(8)))
+    assert sorted(codes) == [201] * 5 + [400] * 3
+    assert stock_at(api, origin) == {product: 0}
+    assert stock_at(api, destination) == {product: 5}
+
+
+def batch(api, items: list[dict], key: str, atomic: bool = True):
+    return api.post("/movements/batch", json={"items": items, "atomic": atomic}, headers={"Idempotency-Key": key})
+
+
+def test_batch_with_idempotency_key_is_replayed_without_moving_stock_again(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 10)
+    items = [{"product_id": product, "origin_branch_id": origin, "destination_branch_id": destination,
+              "quantity": 4, "user_id": 1}]
+
+    first = batch(api, items, "batch-replay")
+    assert first.status_code == 201
+    assert first.json()["created"] == 1
+    replay = batch(api, items, "batch-replay")
+    assert replay.status_code == 201
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+    assert stock_at(api, origin) == {product: 6}
+    assert stock_at(api, destination) == {product: 4}
+
+    assert batch(api, [{**items[0], "quantity": 5}], "batch-replay").status_code == 422
+
+
+def test_failed_batch_stores_its_400(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 1)
+    items = [{"product_id": product, "origin_branch_id": origin, "destination_branch_id": destination,
+              "quantity": 2, "user_id": 1}]
+
+    first = batch(api, items, "batch-failed")
+    assert first.status_code == 400
+    assert first.json()["results"] == [
+        {"index": 0, "status": "failed", "movement_id": None, "error": "Insufficient stock at origin branch"},
+    ]
+    replay = batch(api, items, "batch-failed")
+    assert replay.status_code == 400
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+def test_batch_without_key_reports_status_from_results(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 1)
+    item = {"product_id": product, "origin_branch_id": origin, "destination_branch_id": destination, "user_id": 1}
+
+    response = api.post("/movements/batch", json={"items": [{**item, "quantity": 2}]})
+    assert response.status_code == 400
+    response = api.post("/movements/batch", json={"items": [{**item, "quantity": 1}]})
+    assert response.status_code == 201
+    assert response.json()["created"] == 1
+
+
+def test_atomic_batch_applies_nothing_when_one_item_fails(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 5)
+    item = {"product_id": product, "origin_branch_id": origin, "destination_branch_id": destination, "user_id": 1}
+
+    response = api.post("/movements/batch", json={"items": [
+        {**item, "quantity": 2},
+        {**item, "product_id": MISSING_ID, "quantity": 1},
+        {**item, "destination_branch_id": MISSING_ID, "quantity": 1},
+    ]})
+    assert response.status_code == 400
+    assert response.json()["created"] == 0
+    assert [(r["status"], r["error"]) for r in response.json()["results"]] == [
+        ("skipped", None), ("failed", "Product not found"), ("failed", "Destination branch not found"),
+    ]
+    assert stock_at(api, origin) == {product: 5}
+    assert movements_of(api, product) == []
+
+
+def test_non_atomic_batch_checks_items_against_running_balances(api, new_branch, new_product, stock_row):
+    first, second, third, product = new_branch(), new_branch(), new_branch(), new_product()
+    stock_row(product, first, 5)
+    item = {"product_id": product, "user_id": 1}
+
+    response = api.post("/movements/batch", json={"atomic": False, "items": [
+        {**item, "origin_branch_id": first, "destination_branch_id": second, "quantity": 4},
+        # Only possible thanks to the credit of the first item
+        {**item, "origin_branch_id": second, "destination_branch_id": third, "quantity": 3},
+        {**item, "origin_branch_id": first, "destination_branch_id": third, "quantity": 2},
+        {**item, "origin_branch_id": MISSING_ID, "destination_branch_id": third, "quantity": 1},
+    ]})
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 2)
+    assert [(r["status"], r["error"]) for r in body["results"]] == [
+        ("created", None), ("created", None),
+        ("failed", "Insufficient stock at origin branch"), ("failed", "Origin branch not found"),
+    ]
+    assert [m["id"] for m in movements_of(api, product)] == [r["movement_id"] for r in body["results"][:2]]
+    assert stock_at(api, first) == {product: 1}
+    assert stock_at(api, second) == {product: 1}
+    assert stock_at(api, third) == {product: 3}
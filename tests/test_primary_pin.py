@@ -0,0 +1,89 @@
+import sqlite3
+from datetime import timedelta
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.base import async_engine, get_db, replicas
+from db.replicas import PrimaryPinMiddleware
+from utils.auth import create_access_token, request_user_id
+
+
+@pytest.fixture
+def client():
+    """App with the pin middleware over the primary and replica SQLite databases, each labelled with its role."""
+    for engine, role in ((async_engine, "primary"), (replicas.engines[0], "replica")):
+        with sqlite3.connect(engine.url.database) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS db_role (name TEXT)")
+            conn.execute("DELETE FROM db_role")
+            conn.execute("INSERT INTO db_role VALUES (?)", (role,))
+
+    app = FastAPI()
+    app.add_middleware(PrimaryPinMiddleware, identify=request_user_id)
+
+    async def role(db: AsyncSession = Depends(get_db)):
+        return {"db": await db.scalar(text("SELECT name FROM db_role"))}
+
+    @app.get("/role")
+    async def read_role(db_role: dict = Depends(role)):
+        return db_role
+
+    @app.post("/write")
+    async def write(fail: bool = False):
+        if fail:
+            raise HTTPException(status_code=400, detail="rejected")
+        return {"ok": True}
+
+    @app.options("/write")
+    async def preflight():
+        return {}
+
+    with TestClient(app) as client:
+        yield client
+
+
+def bearer(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)}, timedelta(minutes=5))}"}
+
+
+def read_db(client: TestClient, headers: dict | None = None) -> str:
+    client.cookies.clear()
+    return client.get("/role", headers=headers).json()["db"]
+
+
+def test_reads_go_to_the_replica_without_writes(client):
+    assert read_db(client) == "replica"
+    assert read_db(client, bearer(1)) == "replica"
+
+
+def test_write_pins_that_users_reads_without_cookies(client):
+    assert client.post("/write", headers=bearer(2)).status_code == 200
+    assert read_db(client, bearer(2)) == "primary"
+    assert read_db(client, bearer(3)) == "replica"
+    assert read_db(client) == "replica"
+
+
+def test_write_pins_by_cookie(client):
+    client.cookies.clear()
+    response = client.post("/write")
+    assert "db_primary_until" in response.headers["set-cookie"]
+    assert client.get("/role").json()["db"] == "primary"
+
+
+def test_failed_write_does_not_pin(client):
+    response = client.post("/write", params={"fail": True}, headers=bearer(4))
+    assert response.status_code == 400
+    assert "set-cookie" not in response.headers
+    assert read_db(client, bearer(4)) == "replica"
+
+
+def test_safe_methods_do_not_pin(client):
+    client.cookies.clear()
+    for method, path in (("OPTIONS", "/write"), ("GET", "/role")):
+        response = client.request(method, path, headers=bearer(5))
+        assert response.status_code == 200
+        assert "set-cookie" not in response.headers
+    assert read_db(client, bearer(5)) == "replica"
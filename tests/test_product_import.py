@@ -0,0 +1,26 @@
+from cruds import product
+
+
+def import_csv(api, body: str, mode: str = "skip"):
+    return api.post("/products/import", params={"format": "csv", "mode": mode}, content=body.encode())
+
+
+def test_repeated_name_fails_whichever_chunk_it_falls_in(api, monkeypatch):
+    monkeypatch.setattr(product, "IMPORT_CHUNK_SIZE", 2)
+    body = (
+        "name,vintage,region,grape_variety\n"
+        "Import A,2001,Rioja,Tempranillo\n"
+        "Import A,2002,Rioja,Tempranillo\n"  # same chunk
+        "Import B,2003,Rioja,Garnacha\n"
+        "Import C,2004,Rioja,Garnacha\n"
+        "Import A,2005,Rioja,Tempranillo\n"  # later chunk
+    )
+    summary = import_csv(api, body, mode="update").json()
+    assert summary["received"] == 5
+    assert summary["written"] == 3
+    assert summary["failed"] == 2
+    assert [error["line"] for error in summary["errors"]] == [3, 6]
+    assert all(error["error"] == "Duplicate name in file: Import A" for error in summary["errors"])
+
+    names = {item["name"]: item["vintage"] for item in api.get("/products", params={"name": "Import", "size": 10}).json()["items"]}
+    assert names["Import A"] == 2001
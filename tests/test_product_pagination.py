@@ -0,0 +1,51 @@
+import pytest
+
+VINTAGES = [2010, None, 2005, None, 2010, 2020, 2005]
+
+
+@pytest.fixture
+def catalog(request, new_product):
+    """Products in a region of their own, with repeated and NULL vintages; returns the region and {id: vintage}."""
+    region = request.node.name
+    return region, {new_product(region=region, vintage=vintage): vintage for vintage in VINTAGES}
+
+
+def walk(api, region: str, sort: str, size: int = 2) -> tuple[list[int], list[dict]]:
+    """All ids of the region, following next_page cursors, and the pages seen."""
+    ids, pages, params = [], [], {"region": region, "sort": sort, "size": size}
+    while True:
+        page = api.get("/products", params=params).json()
+        pages.append(page)
+        ids += [item["id"] for item in page["items"]]
+        if not page["next_page"]:
+            return ids, pages
+        params["cursor"] = page["next_page"]
+
+
+@pytest.mark.parametrize("sort", ["vintage_asc", "vintage_desc"])
+def test_vintage_sort_pages_through_nulls_without_gaps_or_repeats(api, catalog, sort):
+    region, vintages = catalog
+    descending = sort.endswith("desc")
+    # NULL vintages sort as the largest value, ties broken by id in the same direction
+    expected = sorted(vintages, key=lambda i: (vintages[i] is None, vintages[i] or 0, i), reverse=descending)
+
+    ids, pages = walk(api, region, sort)
+    assert ids == expected
+    assert len(pages) == 4
+    assert ids == [item["id"] for item in api.get("/products", params={"region": region, "sort": sort, "size": 100}).json()["items"]]
+
+
+def test_previous_page_returns_the_same_items(api, catalog):
+    region, _ = catalog
+    _, pages = walk(api, region, "vintage_asc", size=3)
+    for earlier, later in zip(pages, pages[1:]):
+        params = {"region": region, "sort": "vintage_asc", "size": 3, "cursor": later["previous_page"]}
+        assert api.get("/products", params=params).json()["items"] == earlier["items"]
+
+
+def test_cursor_is_tied_to_its_sort(api, catalog):
+    region, _ = catalog
+    cursor = walk(api, region, "vintage_asc")[1][0]["next_page"]
+    response = api.get("/products", params={"region": region, "sort": "name_asc", "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils import query_audit
+from utils.query_audit import QueryBudgetExceeded, audit_engine, audit_queries, query_budget
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """In-memory SQLite engine audited in "raise" mode."""
+    monkeypatch.setattr(query_audit, "SQL_AUDIT", "raise")
+    engine = create_engine("sqlite://")
+    audit_engine(engine)
+    run(engine, "SELECT 1")  # connect once outside any audit
+    yield engine
+    engine.dispose()
+
+
+def run(engine, statement: str, **params):
+    with engine.connect() as conn:
+        conn.execute(text(statement), params)
+
+
+def test_statements_within_budget_pass(engine):
+    with audit_queries(budget=3) as audit:
+        for _ in range(3):
+            run(engine, "SELECT 1")
+    assert audit.count == 3
+    assert not audit.over_budget
+
+
+def test_statement_over_budget_raises(engine):
+    with audit_queries(budget=2, label="test") as audit:
+        run(engine, "SELECT 1")
+        run(engine, "SELECT 2")
+        with pytest.raises(QueryBudgetExceeded, match="3 SQL statements exceed the budget of 2"):
+            run(engine, "SELECT 3")
+    assert audit.over_budget
+
+
+def test_query_budget_dependency_raises_when_already_over(engine):
+    with audit_queries() as audit:
+        for value in range(3):
+            run(engine, f"SELECT {value}")
+        with pytest.raises(QueryBudgetExceeded, match="exceed the budget of 2"):
+            asyncio.run(query_budget(2)())
+    assert audit.budget == 2
+
+
+def test_repeated_statement_with_different_parameters_raises(engine):
+    threshold = query_audit.SQL_AUDIT_REPEAT_THRESHOLD
+    with audit_queries() as audit:
+        for value in range(threshold - 1):
+            run(engine, "SELECT :value", value=value)
+        with pytest.raises(QueryBudgetExceeded, match="possible N\\+1"):
+            run(engine, "SELECT :value", value=threshold)
+    assert audit.repeated == ["SELECT ?"]
+
+
+def test_repeated_statement_with_same_parameters_is_not_n_plus_one(engine):
+    with audit_queries() as audit:
+        for _ in range(query_audit.SQL_AUDIT_REPEAT_THRESHOLD * 2):
+            run(engine, "SELECT :value", value=1)
+    assert audit.repeated == []
+
+
+def test_log_mode_reports_without_raising(engine, monkeypatch):
+    monkeypatch.setattr(query_audit, "SQL_AUDIT", "log")
+    with audit_queries(budget=1) as audit:
+        for value in range(query_audit.SQL_AUDIT_REPEAT_THRESHOLD):
+            run(engine, "SELECT :value", value=value)
+    assert audit.over_budget
+    assert audit.repeated == ["SELECT ?"]
+
+
+def test_transaction_control_is_not_counted(engine):
+    with audit_queries(budget=1) as audit:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("BEGIN")
+            conn.exec_driver_sql("SAVEPOINT sp")
+            conn.exec_driver_sql("SELECT 1")
+            conn.exec_driver_sql("RELEASE SAVEPOINT sp")
+            conn.exec_driver_sql("ROLLBACK")
+    assert audit.count == 1
+
+
+def test_statements_outside_an_audit_are_not_counted(engine):
+    run(engine, "SELECT 1")
+    with audit_queries(budget=0) as audit:
+        pass
+    assert audit.count == 0
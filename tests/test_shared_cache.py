@@ -0,0 +1,161 @@
+import asyncio
+
+from db.base import AsyncSessionLocal
+from utils.shared_cache import LocalSharedCache, TieredCache
+
+
+class FakeRedis(LocalSharedCache):
+    """LocalSharedCache that counts reads and can be taken down like an unreachable Redis."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.gets = 0
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("shared cache down")
+
+    async def get(self, key: str):
+        self._check()
+        self.gets += 1
+        return await super().get(key)
+
+    async def set(self, key: str, value, ex: int | None = None):
+        self._check()
+        await super().set(key, value, ex)
+
+    async def incr(self, key: str) -> int:
+        self._check()
+        return await super().incr(key)
+
+
+class Loader:
+    """Loader returning the current value and counting database loads."""
+
+    def __init__(self, value="v1"):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self, session):
+        self.calls += 1
+        return self.value
+
+
+def read(cache: TieredCache, loader: Loader, key=("page", 1)):
+    async def go():
+        async with AsyncSessionLocal() as db:
+            return await cache.get_or_load(db, "products", key, loader)
+    return asyncio.run(go())
+
+
+def test_hit_after_first_load():
+    cache, loader = TieredCache(FakeRedis()), Loader()
+    assert read(cache, loader) == "v1"
+    assert read(cache, loader) == "v1"
+    assert loader.calls == 1
+
+
+def test_invalidate_bumps_generation_and_reloads():
+    shared = FakeRedis()
+    cache, loader = TieredCache(shared), Loader()
+    read(cache, loader)
+    loader.value = "v2"
+    asyncio.run(cache.invalidate("products"))
+    assert asyncio.run(cache.generation("products")) == 1
+    assert read(cache, loader) == "v2"
+    assert loader.calls == 2
+
+
+def test_invalidate_on_one_worker_retires_other_workers_local_entries():
+    shared = FakeRedis()
+    worker_a, worker_b = TieredCache(shared), TieredCache(shared)
+    loader = Loader()
+    read(worker_a, loader)
+    assert read(worker_b, loader) == "v1"  # served from the shared tier
+    assert loader.calls == 1
+
+    loader.value = "v2"
+    asyncio.run(worker_b.invalidate("products"))
+    assert read(worker_a, loader) == "v2"
+    assert loader.calls == 2
+
+
+def test_local_tier_expires_to_shared_tier(clock):
+    shared = FakeRedis()
+    cache, loader = TieredCache(shared, ttl=300, local_ttl=30), Loader()
+    read(cache, loader)
+    gets = shared.gets
+    read(cache, loader)
+    assert shared.gets == gets + 1  # generation only, value from the local tier
+
+    clock[0] += 31
+    assert read(cache, loader) == "v1"
+    assert shared.gets == gets + 3  # generation and value from the shared tier
+    assert loader.calls == 1
+
+
+def test_shared_tier_expiry_reloads(clock):
+    cache, loader = TieredCache(FakeRedis(), ttl=60, local_ttl=30), Loader()
+    read(cache, loader)
+    clock[0] += 61
+    read(cache, loader)
+    assert loader.calls == 2
+
+
+def test_shared_cache_down_falls_back_to_database():
+    shared = FakeRedis()
+    cache, loader = TieredCache(shared), Loader()
+    read(cache, loader)
+
+    shared.down = True
+    assert asyncio.run(cache.generation("products")) is None
+    assert read(cache, loader) == "v1"
+    assert read(cache, loader) == "v1"
+    assert loader.calls == 3  # no local hits while the generation cannot be checked
+    asyncio.run(cache.invalidate("products"))  # logged, not raised
+
+    shared.down = False
+    read(cache, loader)
+    assert loader.calls == 3
+
+
+def test_none_results_are_not_cached():
+    cache, loader = TieredCache(FakeRedis()), Loader(value=None)
+    assert read(cache, loader) is None
+    assert read(cache, loader) is None
+    assert loader.calls == 2
+
+
+def test_without_shared_cache_every_read_loads():
+    cache, loader = TieredCache(None), Loader()
+    read(cache, loader)
+    read(cache, loader)
+    assert loader.calls == 2
+    assert asyncio.run(cache.generation("products")) == 0
+
+
+def test_generation_max_age_reuses_the_last_read(clock):
+    shared = FakeRedis()
+    cache, other_worker = TieredCache(shared), TieredCache(shared)
+    assert asyncio.run(cache.generation("users", max_age=1)) == 0
+    asyncio.run(other_worker.invalidate("users"))
+    gets = shared.gets
+    assert asyncio.run(cache.generation("users", max_age=1)) == 0
+    assert shared.gets == gets
+
+    clock[0] += 1
+    assert asyncio.run(cache.generation("users", max_age=1)) == 1
+    asyncio.run(cache.invalidate("users"))
+    assert asyncio.run(cache.generation("users", max_age=1)) == 2  # own invalidations at once
+
+
+def test_generation_max_age_reuses_a_failure(clock):
+    shared = FakeRedis()
+    cache = TieredCache(shared)
+    shared.down = True
+    assert asyncio.run(cache.generation("users", max_age=1)) is None
+    shared.down = False
+    assert asyncio.run(cache.generation("users", max_age=1)) is None
+    clock[0] += 1
+    assert asyncio.run(cache.generation("users", max_age=1)) == 0
@@ -0,0 +1,92 @@
+import asyncio
+
+from utils import stock_feed
+from utils.stock_feed import StockFeed, Subscription
+
+
+def event(event_id: int) -> dict:
+    return {"id": event_id, "product_id": 1, "branch_id": 1, "quantity": 0, "delta": 0, "source": "adjust"}
+
+
+def feed_at(position: int) -> tuple[StockFeed, Subscription]:
+    feed, subscription = StockFeed(), Subscription(None, None)
+    feed._subscribers.add(subscription)
+    feed._position = position
+    return feed, subscription
+
+
+def queued(subscription: Subscription) -> list[int]:
+    ids = []
+    while not subscription.queue.empty():
+        ids.append(subscription.queue.get_nowait()["id"])
+    return ids
+
+
+def test_gap_waits_for_a_transaction_still_running_then_delivers_in_order():
+    feed, subscription = feed_at(4)
+    assert feed._deliver([event(6), event(7)], (100, 105)) == 0
+    # Transactions from the first snapshot are still running
+    assert feed._deliver([event(6), event(7)], (103, 110)) == 0
+    # The missing id committed late: nothing is skipped
+    assert feed._deliver([event(5), event(6), event(7)], (104, 110)) == 3
+    assert queued(subscription) == [5, 6, 7]
+    assert feed._position == 7
+
+
+def test_gap_is_skipped_once_every_transaction_that_could_commit_it_ended():
+    feed, subscription = feed_at(4)
+    assert feed._deliver([event(6)], (100, 105)) == 0
+    assert feed._deliver([event(6), event(7)], (105, 112)) == 2
+    assert queued(subscription) == [6, 7]
+
+
+def test_gap_with_nothing_in_flight_is_skipped_at_once():
+    feed, subscription = feed_at(4)
+    assert feed._deliver([event(6)], (105, 105)) == 1
+    assert queued(subscription) == [6]
+
+
+def test_gap_is_skipped_at_once_without_snapshots():
+    feed, subscription = feed_at(4)
+    assert feed._deliver([event(6), event(8)], None) == 2
+    assert queued(subscription) == [6, 8]
+
+
+def test_dispatch_while_a_subscriber_starts_keeps_the_position(monkeypatch):
+    feed, sessions = StockFeed(), stock_feed.AsyncSessionLocal
+
+    class DispatchOnClose:
+        """The first session, which reads the start position; the dispatcher runs while it closes."""
+
+        def __init__(self):
+            self.session = sessions()
+
+        async def __aenter__(self):
+            return await self.session.__aenter__()
+
+        async def __aexit__(self, *exc_info):
+            await self.session.__aexit__(*exc_info)
+            await feed._dispatch()
+
+    opened = []
+
+    def session_factory():
+        opened.append(True)
+        return DispatchOnClose() if len(opened) == 1 else sessions()
+
+    async def latest_stock_event_id(db):
+        return 7
+
+    monkeypatch.setattr(stock_feed, "AsyncSessionLocal", session_factory)
+    monkeypatch.setattr(stock_feed, "latest_stock_event_id", latest_stock_event_id)
+    monkeypatch.setattr(stock_feed, "STOCK_FEED_HEARTBEAT", 0.01)
+
+    async def first_message():
+        stream = feed.subscribe()
+        try:
+            return await anext(stream)
+        finally:
+            await stream.aclose()
+
+    assert asyncio.run(first_message()) is None
+    assert feed._position == 7
@@ -0,0 +1,34 @@
+import asyncio
+
+from cruds.movement import credit_stock_statement, debit_stock_statement
+from cruds.stock_checkpoint import get_stock_at, take_stock_checkpoint
+from db.base import AsyncSessionLocal, utcnow
+from models.movement import Movement
+
+
+def test_checkpoint_waits_for_a_movement_in_flight(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 10)
+
+    async def scenario():
+        async with AsyncSessionLocal() as movement:
+            await movement.scalar(debit_stock_statement(product, origin, 3))
+            await movement.scalar(credit_stock_statement(movement, product, destination, 3))
+
+            async def checkpoint():
+                async with AsyncSessionLocal() as db:
+                    return await take_stock_checkpoint(db)
+
+            # The checkpoint starts while the transfer has written stock but not its movement row
+            checkpointed = asyncio.create_task(checkpoint())
+            await asyncio.sleep(0.2)
+            movement.add(Movement(product_id=product, quantity=3, origin_branch_id=origin,
+                                  destination_branch_id=destination, user_id=1))
+            await movement.commit()
+        assert await checkpointed > 0
+
+        async with AsyncSessionLocal() as db:
+            now = utcnow()
+            return await get_stock_at(db, origin, now, product), await get_stock_at(db, destination, now, product)
+
+    assert asyncio.run(scenario()) == ({product: 7}, {product: 3})
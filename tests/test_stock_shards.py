@@ -0,0 +1,138 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import select
+
+from cruds.stock import compact_stock_shards
+from db.base import AsyncSessionLocal, utcnow
+from models.stock import Stock
+from models.stock_shard import StockShard
+
+
+@pytest.fixture
+def sharded(api, new_branch, new_product, stock_row):
+    """A stock row of 40 split into 4 shards of 10."""
+    branch, product = new_branch(), new_product()
+    row = stock_row(product, branch, 40)
+    assert api.put(f"/stock/{row['id']}/shards", json={"shards": 4}).json()["quantity"] == 40
+    return product, branch
+
+
+def shard_quantities(product: int, branch: int) -> list[int]:
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return (await db.scalars(
+                select(StockShard.quantity).join(Stock, Stock.id == StockShard.stock_id)
+                .where(Stock.product_id == product, Stock.branch_id == branch)
+                .order_by(StockShard.shard)
+            )).all()
+    return asyncio.run(run())
+
+
+def compact():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await compact_stock_shards(db)
+    return asyncio.run(run())
+
+
+def adjust(api, product: int, branch: int, delta: int):
+    return api.patch("/stock/adjust", json={"product_id": product, "branch_id": branch, "delta": delta})
+
+
+def listed(api, product: int, branch: int) -> dict:
+    items = api.get("/stock", params={"branch_id": branch}).json()["items"]
+    return {item["product_id"]: item["quantity"] for item in items}
+
+
+def product_total(api, product: int) -> int:
+    return api.get(f"/stock/totals/products/{product}").json()["quantity"]
+
+
+def history(api, product: int, branch: int) -> int:
+    params = {"branch_id": branch, "product_id": product, "at": utcnow().isoformat()}
+    return api.get("/stock/history", params=params).json()[0]["quantity"]
+
+
+def test_shard_adjustments_reach_totals_and_history_on_compaction(api, sharded):
+    product, branch = sharded
+    for expected in (38, 36, 34):
+        assert adjust(api, product, branch, -2).json()["quantity"] == expected
+
+    # Documented lag: until the compactor runs, the totals and history still show the folded quantity
+    assert product_total(api, product) == 40
+    assert history(api, product, branch) == 40
+
+    assert compact() >= 1
+    assert product_total(api, product) == 34
+    assert history(api, product, branch) == 34
+
+
+def test_decrement_larger_than_any_shard_folds_the_row(api, sharded):
+    product, branch = sharded
+    assert adjust(api, product, branch, -2).json()["quantity"] == 38
+
+    assert adjust(api, product, branch, -25).json()["quantity"] == 13
+    # The fold settles the pending shard change, the row write adds its own
+    assert product_total(api, product) == 13
+    assert history(api, product, branch) == 13
+    assert adjust(api, product, branch, -14).status_code == 400
+
+
+def test_batch_folds_shards_before_checking_balances(api, sharded):
+    product, branch = sharded
+    adjust(api, product, branch, -2)
+
+    response = api.patch("/stock/adjust", json={"items": [
+        {"product_id": product, "branch_id": branch, "delta": -30},
+        {"product_id": product, "branch_id": branch, "delta": -9},
+    ], "atomic": False})
+    assert [r["status"] for r in response.json()["results"]] == ["applied", "failed"]
+    assert response.json()["results"][0]["quantity"] == 8
+    assert product_total(api, product) == 8
+    assert history(api, product, branch) == 8
+
+
+def test_set_shards_spreads_the_quantity_and_reads_sum_them(api, sharded):
+    product, branch = sharded
+    assert shard_quantities(product, branch) == [10, 10, 10, 10]
+    adjust(api, product, branch, -3)
+    assert sum(shard_quantities(product, branch)) == 37
+    # Reads sum the shards without waiting for compaction
+    assert listed(api, product, branch) == {product: 37}
+
+
+def test_sharded_row_never_goes_negative(api, sharded):
+    product, branch = sharded
+    assert [adjust(api, product, branch, -1).status_code for _ in range(40)] == [200] * 40
+    response = adjust(api, product, branch, -1)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Insufficient stock"
+    assert listed(api, product, branch) == {product: 0}
+    assert all(quantity >= 0 for quantity in shard_quantities(product, branch))
+
+
+def test_concurrent_adjustments_on_a_sharded_row(api, sharded):
+    product, branch = sharded
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        codes = list(pool.map(lambda _: adjust(api, product, branch, -1).status_code, range(24)))
+    assert codes == [200] * 24
+    assert listed(api, product, branch) == {product: 16}
+
+
+def test_zero_shards_folds_them_back_into_the_row(api, sharded):
+    product, branch = sharded
+    adjust(api, product, branch, -5)
+    stock_id = api.get("/stock", params={"branch_id": branch}).json()["items"][0]["id"]
+
+    response = api.put(f"/stock/{stock_id}/shards", json={"shards": 0})
+    assert response.json() == {"stock_id": stock_id, "shards": 0, "quantity": 35}
+    assert shard_quantities(product, branch) == []
+    assert product_total(api, product) == 35
+    assert adjust(api, product, branch, -35).json()["quantity"] == 0
+
+
+def test_shard_count_is_validated(api):
+    assert api.put("/stock/999999/shards", json={"shards": 4}).status_code == 404
+    assert api.put("/stock/999999/shards", json={"shards": 65}).status_code == 422
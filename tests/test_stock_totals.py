@@ -0,0 +1,64 @@
+MISSING_ID = 999_999
+
+
+def product_total(api, product_id: int) -> int:
+    return api.get(f"/stock/totals/products/{product_id}").json()["quantity"]
+
+
+def branch_total(api, branch_id: int) -> int:
+    return api.get(f"/stock/totals/branches/{branch_id}").json()["quantity"]
+
+
+def test_totals_follow_every_stock_write(api, new_branch, new_product, stock_row):
+    first, second, product, other = new_branch(), new_branch(), new_product(), new_product()
+    assert (product_total(api, product), branch_total(api, first)) == (0, 0)
+
+    row = stock_row(product, first, 10)
+    stock_row(other, first, 4)
+    assert (product_total(api, product), branch_total(api, first)) == (10, 14)
+
+    api.put(f"/stock/{row['id']}", json={"quantity": 7})
+    assert (product_total(api, product), branch_total(api, first)) == (7, 11)
+
+    api.patch("/stock/adjust", json={"product_id": product, "branch_id": first, "delta": 2})
+    assert (product_total(api, product), branch_total(api, first)) == (9, 13)
+
+    # A transfer moves the branch totals only
+    api.post("/movements", json={"product_id": product, "origin_branch_id": first, "destination_branch_id": second,
+                                 "quantity": 5, "user_id": 1})
+    assert (product_total(api, product), branch_total(api, first), branch_total(api, second)) == (9, 8, 5)
+
+    api.post("/movements/batch", json={"items": [
+        {"product_id": other, "origin_branch_id": first, "destination_branch_id": second, "quantity": 3, "user_id": 1},
+    ]})
+    assert (product_total(api, other), branch_total(api, first), branch_total(api, second)) == (4, 5, 8)
+
+    api.delete(f"/stock/{row['id']}")
+    assert (product_total(api, product), branch_total(api, first), branch_total(api, second)) == (5, 1, 8)
+
+
+def test_failed_writes_leave_totals_alone(api, new_branch, new_product, stock_row):
+    origin, destination, product = new_branch(), new_branch(), new_product()
+    stock_row(product, origin, 2)
+
+    assert api.patch("/stock/adjust", json={"product_id": product, "branch_id": origin, "delta": -3}).status_code == 400
+    assert api.post("/movements", json={"product_id": product, "origin_branch_id": origin,
+                                        "destination_branch_id": destination, "quantity": 3, "user_id": 1}).status_code == 400
+    assert (product_total(api, product), branch_total(api, origin), branch_total(api, destination)) == (2, 2, 0)
+
+
+def test_totals_of_missing_product_or_branch_are_404(api):
+    assert api.get(f"/stock/totals/products/{MISSING_ID}").status_code == 404
+    assert api.get(f"/stock/totals/branches/{MISSING_ID}").status_code == 404
+
+
+def test_totals_grouped_by_region(api, request, new_branch, new_product, stock_row):
+    region, branch = request.node.name, new_branch()
+    stock_row(new_product(region=region), branch, 6)
+    stock_row(new_product(region=region), branch, 3)
+    # Never stocked, so not counted
+    new_product(region=region)
+
+    groups = {group["key"]: group for group in api.get("/stock/totals", params={"group_by": "region"}).json()}
+    assert groups[region] == {"key": region, "quantity": 9, "products": 2}
+    assert api.get("/stock/totals", params={"group_by": "grape"}).status_code == 400
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from db.base import async_engine, replicas
+from models.user import User
+from utils.auth import create_access_token, get_stream_user
+
+USER_ID = 1000
+
+
+@pytest.fixture
+def client():
+    """App with one route behind get_stream_user, over primary and replica databases holding its user."""
+    for database in (async_engine.url.database, replicas.engines[0].url.database):
+        engine = create_engine(f"sqlite:///{database}")
+        User.__table__.create(engine, checkfirst=True)
+        with engine.begin() as conn:
+            conn.execute(User.__table__.delete().where(User.id == USER_ID))
+            conn.execute(User.__table__.insert(), {"id": USER_ID, "username": "till", "name": "Till", "hashed_password": "x"})
+        engine.dispose()
+
+    app = FastAPI()
+
+    @app.get("/events")
+    async def events(current_user: dict = Depends(get_stream_user)):
+        return {"user_id": current_user["user"].id}
+
+    with TestClient(app) as client:
+        yield client
+
+
+def token(user_id: int) -> str:
+    return create_access_token({"sub": str(user_id)}, timedelta(minutes=5))
+
+
+def test_token_query_parameter(client):
+    response = client.get("/events", params={"token": token(USER_ID)})
+    assert response.status_code == 200
+    assert response.json() == {"user_id": USER_ID}
+
+
+def test_authorization_header(client):
+    response = client.get("/events", headers={"Authorization": f"Bearer {token(USER_ID)}"})
+    assert response.json() == {"user_id": USER_ID}
+
+
+def test_missing_or_invalid_token(client):
+    assert client.get("/events").status_code == 401
+    assert client.get("/events", params={"token": "garbage"}).status_code == 401
+    assert client.get("/events", params={"token": token(USER_ID + 1)}).status_code == 401
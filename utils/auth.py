@@ -1,20 +1,60 @@
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
-from fastapi import Depends, HTTPException, status
+import time
+from dataclasses import dataclass
+from werkzeug.security import generate_password_hash
+from fastapi import Depends, HTTPException, Query, WebSocket, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from starlette.datastructures import Headers
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone, timedelta
 from enum import Enum
-from db.base import get_db
-from models.user import User
+from db.base import AsyncSessionLocal, get_db
+from models.user import User, Role as UserRole
+from utils.cache import TTLCache
+from utils.hashing import PASSWORD_HASH_METHOD
 from utils.logger import get_logger
+from utils.metrics import AUTH_DURATION
+from utils.shared_cache import catalog_cache
 
 SECRET_KEY = os.getenv("JWT_KEY")  # Replace with a secure key
 ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token", auto_error=False)
 logger = get_logger(__name__)
 
+# Per-worker caches: verified token claims (never past the token's exp) and user snapshots.
+# Snapshots are tagged with the USERS_CACHE generation, so user writes on any worker retire them.
+USERS_CACHE = "users"
+_token_cache = TTLCache(maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000)), ttl=float(os.getenv("AUTH_TOKEN_CACHE_TTL", 300)))
+_user_cache = TTLCache(maxsize=int(os.getenv("AUTH_USER_CACHE_SIZE", 10000)), ttl=float(os.getenv("AUTH_USER_CACHE_TTL", 60)))
+# Seconds a worker reuses the USERS_CACHE generation before asking the shared cache again
+AUTH_GENERATION_TTL = float(os.getenv("AUTH_GENERATION_TTL", 1))
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Detached, read-only snapshot of the authenticated user."""
+    id: int
+    username: str
+    name: str
+    email: str | None
+    role: UserRole
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "CurrentUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            name=user.name,
+            email=user.email,
+            role=user.role,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+        )
+
 class Role(str, Enum):
     user = "user"
     admin = "admin"
@@ -25,12 +65,8 @@ class Scope(str, Enum):
     admin = "admin"
 
 def hash_password(password: str) -> str:
-    """Hash a password using Werkzeug."""
-    return generate_password_hash(password, method='pbkdf2:sha256')
-
-def verify_password(hashed_password: str, plain_password: str) -> bool:
-    """Verify a plain password against a hashed password."""
-    return check_password_hash(pwhash=hashed_password, password=plain_password)
+    """Hash a password using Werkzeug (blocking; request handlers use utils.hashing.credential_hasher)."""
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
 
 def validate_scopes(requested_scopes: str) -> list[str]:
     """Validate and return a list of requested scopes."""
@@ -54,20 +90,64 @@ def create_access_token(data: dict, expires_delta: timedelta) -> str:
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> dict:
+def decode_token(token: str) -> dict:
+    """Verify a JWT and return its claims, reusing earlier verifications of the same token."""
+    payload = _token_cache.get(token)
+    if payload is None:
+        with AUTH_DURATION.labels("jwt_decode").time():
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        exp = payload.get("exp")
+        _token_cache.set(token, payload, ttl=exp - time.time() if exp else None)
+    return payload
+
+def request_user_id(scope: dict) -> str | None:
+    """User id of a request's valid bearer token, None without one; for middleware, which runs before auth."""
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_token(token).get("sub")
+    except JWTError:
+        return None
+
+async def get_user_snapshot(db: AsyncSession, user_id: int) -> CurrentUser | None:
+    """Get a cached snapshot of a user, loading it from the database on a miss.
+
+    The generation check stays in process too: other workers may serve a
+    changed or deleted user for up to AUTH_GENERATION_TTL seconds. Without a
+    shared cache (CACHE_URL unset), or while it is unreachable, that goes up
+    to AUTH_USER_CACHE_TTL seconds.
+    """
+    generation = await catalog_cache.generation(USERS_CACHE, max_age=AUTH_GENERATION_TTL)
+    cached = _user_cache.get(user_id)
+    if cached is not None and (generation is None or cached[0] == generation):
+        return cached[1]
+    user = await db.scalar(select(User).where(User.id == user_id))
+    if user is None:
+        return None
+    snapshot = CurrentUser.from_user(user)
+    _user_cache.set(user_id, (generation, snapshot))
+    return snapshot
+
+async def invalidate_user(user_id: int):
+    """Drop a user's cached snapshot on every worker after it was changed or deleted."""
+    _user_cache.pop(user_id)
+    await catalog_cache.invalidate(USERS_CACHE)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> dict:
     """Get the current user and additional details from the JWT token."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         user_id: str = payload.get("sub")
         email: str = payload.get("email")
         username: str = payload.get("username")
         name: str = payload.get("name")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        user = await get_user_snapshot(db, int(user_id))
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
-        logger.debug(f"Returning user data: {user.__dict__}, email={email}, username={username}, name={name}")
+        logger.debug("Authenticated user id=%s, username=%s", user.id, username)
         return {
             "user": user,
             "email": email,
@@ -75,12 +155,41 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             "name": name
         }
     except JWTError as e:
-        logger.error(f"JWT decode error: {str(e)}")
+        logger.error("JWT decode error: %s", e)
         raise HTTPException(status_code=401, detail="Invalid token") from e
 
-async def get_current_admin(user: dict = Depends(get_current_user)) -> User:
+async def get_stream_user(token: str | None = Query(None), bearer: str | None = Depends(optional_oauth2_scheme),
+                          db: AsyncSession = Depends(get_db)) -> dict:
+    """get_current_user that also takes the token as a `token` query parameter.
+
+    For streams opened by EventSource, which cannot set an Authorization header.
+    """
+    if not (token or bearer):
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return await get_current_user(token or bearer, db)
+
+async def authenticate_websocket(websocket: WebSocket) -> CurrentUser | None:
+    """User of a WebSocket from its `token` query parameter or Authorization header, None if invalid.
+
+    Browsers cannot set headers on WebSockets, and the OAuth2 dependency only reads HTTP requests.
+    """
+    token = websocket.query_params.get("token")
+    if token is None:
+        scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer":
+            return None
+    try:
+        user_id = decode_token(token).get("sub")
+    except JWTError:
+        return None
+    if user_id is None:
+        return None
+    async with AsyncSessionLocal() as db:
+        return await get_user_snapshot(db, int(user_id))
+
+async def get_current_admin(user: dict = Depends(get_current_user)) -> CurrentUser:
     """Ensure the current user is an admin."""
     if user["user"].role.value != Role.admin.value:
-        logger.warning(f"Non-admin user attempted admin access: {user['username']}")
+        logger.warning("Non-admin user attempted admin access: %s", user["username"])
         raise HTTPException(status_code=403, detail="Admin access required")
     return user["user"]
\ No newline at end of file
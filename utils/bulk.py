@@ -0,0 +1,107 @@
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterable
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (CSV, NDJSON)
+MEDIA_TYPES = {CSV: "text/csv", NDJSON: "application/x-ndjson"}
+
+
+def format_from_content_type(content_type: str | None) -> str | None:
+    """Map a request Content-Type to a bulk format."""
+    if not content_type:
+        return None
+    content_type = content_type.split(";")[0].strip().lower()
+    for fmt, media_type in MEDIA_TYPES.items():
+        if content_type == media_type:
+            return fmt
+    if content_type in ("application/ndjson", "application/jsonl", "application/json-seq"):
+        return NDJSON
+    return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines without buffering the whole body."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Yield (line number, record, error) for each non-empty record of a CSV or NDJSON body.
+
+    CSV records may span lines inside quoted fields (RFC 4180); their line number is the first line's.
+    """
+    header = None
+    line_no = 0
+    record_start, record_lines = 0, []
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if fmt == NDJSON:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "Each line must be a JSON object"
+                continue
+            yield line_no, record, None
+            continue
+
+        if not record_lines:
+            if not line.strip():
+                continue
+            record_start = line_no
+        record_lines.append(line)
+        text = "\n".join(record_lines)
+        # Quotes are escaped by doubling, so an odd count means a quoted field continues on the next line
+        if text.count('"') % 2:
+            continue
+        record_lines = []
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            yield record_start, None, f"Invalid CSV: {e}"
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        if len(values) != len(header):
+            yield record_start, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty CSV cells mean "no value"
+        yield record_start, {key: (value if value != "" else None) for key, value in zip(header, values)}, None
+
+    if record_lines:
+        yield record_start, None, "Unterminated quoted field"
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_rows(rows: Iterable[dict], fmt: str, columns: Iterable[str], header: bool = False) -> str:
+    """Encode a batch of rows as CSV or NDJSON text."""
+    if fmt == NDJSON:
+        return "".join(json.dumps(dict(row), default=_json_default) + "\n" for row in rows)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns), extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
@@ -0,0 +1,90 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+from utils.metrics import AUTH_DURATION
+
+# Werkzeug method string: "pbkdf2:sha256[:iterations]" or "scrypt[:n:r:p]"
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+# "thread" works because hashlib releases the GIL while deriving keys; "process" isolates it fully
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# Hash/verify calls allowed to wait for a worker before new ones are rejected with 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 16))
+
+_SCRYPT_DEFAULTS = ("32768", "8", "1")
+
+
+def normalize_method(method: str) -> str:
+    """Spell out the default cost parameters so methods can be compared."""
+    parts = method.split(":")
+    if parts[0] == "pbkdf2":
+        digest = parts[1] if len(parts) > 1 else "sha256"
+        iterations = parts[2] if len(parts) > 2 else str(DEFAULT_PBKDF2_ITERATIONS)
+        return f"pbkdf2:{digest}:{iterations}"
+    if parts[0] == "scrypt":
+        return ":".join(["scrypt", *(parts[1:] + list(_SCRYPT_DEFAULTS))[:3]])
+    return method
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True when a stored hash was made with another method or cost than configured."""
+    return normalize_method(hashed.split("$", 1)[0]) != normalize_method(PASSWORD_HASH_METHOD)
+
+
+class CredentialHasher:
+    """Runs password/secret hashing off the event loop on a bounded worker pool."""
+
+    def __init__(self, method: str, executor: str, workers: int, max_pending: int):
+        self.method = method
+        self.executor_kind = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hasher")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        # Shed load instead of queueing without bound during login storms
+        if self.pending >= self.workers + self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, plain: str) -> str:
+        """Hash a password or secret with the configured method."""
+        with AUTH_DURATION.labels("hash_password").time():
+            return await self._run(generate_password_hash, plain, self.method)
+
+    async def verify(self, hashed: str, plain: str) -> bool:
+        """Verify a password or secret against its stored hash."""
+        with AUTH_DURATION.labels("verify_password").time():
+            return await self._run(check_password_hash, hashed, plain)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+credential_hasher = CredentialHasher(
+    method=PASSWORD_HASH_METHOD,
+    executor=PASSWORD_HASH_EXECUTOR,
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, Awaitable, Callable
+import orjson
+from fastapi import HTTPException, Request, Response, status
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from cruds.idempotency_key import claim_key, complete_key, get_key, lease_expired, purge_expired_keys, release_key
+from db.base import AsyncSessionLocal, async_engine
+from utils.logger import get_logger
+from utils.query_audit import audit_queries
+
+logger = get_logger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Seconds a key and its stored response are kept
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 86400))
+# Seconds a duplicate waits for the first attempt before giving up with 409
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 10))
+# Seconds after which a key whose attempt never finished (crashed worker) can be taken over by a retry;
+# must exceed the slowest handler, an attempt that overruns it is rolled back
+IDEMPOTENCY_LEASE = float(os.getenv("IDEMPOTENCY_LEASE", 60))
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", 300))
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(request: Request, payload: BaseModel) -> str:
+    """Hash of the route and the validated body; a key reused for a different request is rejected."""
+    body = orjson.dumps(payload.model_dump(mode="json"), option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(f"{request.method} {request.url.path}\n".encode() + body).hexdigest()
+
+
+def _response_body(response_model: type[BaseModel], result) -> bytes:
+    return orjson.dumps(response_model.model_validate(result).model_dump(mode="json"))
+
+
+def _stored_response(record) -> Response:
+    return Response(
+        content=record.response_body,
+        status_code=record.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def _wait_for_outcome(owner_id: int, key: str):
+    """Poll until the first attempt stored its response, or fail with 409 after IDEMPOTENCY_WAIT_TIMEOUT.
+
+    None means the key is free to claim again: released, or its lease expired.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+    delay = 0.02
+    # Polls are audited apart from the request, whose query budget does not cover waiting
+    with audit_queries(label="idempotency wait"):
+        async with AsyncSessionLocal() as store:
+            while True:
+                record = await get_key(store, owner_id, key)
+                await store.commit()  # end the read transaction so the next poll sees new commits (keeps record loaded)
+                if record is None or record.status_code is not None:
+                    return record
+                if lease_expired(record, IDEMPOTENCY_LEASE):
+                    return None
+                if time.monotonic() >= deadline:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="A request with this Idempotency-Key is still in progress",
+                        headers={"Retry-After": str(max(1, int(IDEMPOTENCY_WAIT_TIMEOUT)))},
+                    )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.5)
+
+
+async def run_idempotent(request: Request, db: AsyncSession, owner_id: int, payload: BaseModel,
+                         handler: Callable[[AsyncSession], Awaitable[Any]], response_model: type[BaseModel],
+                         status_code: int | Callable[[Any], int] = status.HTTP_200_OK):
+    """Run a mutating handler(session) at most once per Idempotency-Key.
+
+    Without the header the handler runs on db and its result is returned as
+    is. With it, the key is claimed in its own committed transaction before
+    the handler runs; retries with the same key and body get the stored
+    response (marked with Idempotent-Replayed) without running the handler,
+    and concurrent duplicates wait for the first attempt to finish.
+
+    The handler gets a session inside an outer transaction, where its commits
+    and rollbacks only release or roll back savepoints, and the response is
+    stored in that same transaction. So the change and its stored response
+    commit together: an attempt that crashed or was cancelled applied
+    nothing, and a retry takes its key over after IDEMPOTENCY_LEASE seconds.
+    Client errors are stored like successes; server errors release the key
+    so the request can be retried. status_code may be a function of the
+    handler's result, for handlers that report failures in their response.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        result = await handler(db)
+        if callable(status_code):
+            return Response(content=_response_body(response_model, result), status_code=status_code(result),
+                            media_type="application/json")
+        return result
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+    fingerprint = request_fingerprint(request, payload)
+
+    while True:
+        async with AsyncSessionLocal() as store:
+            await purge_expired_keys(store, IDEMPOTENCY_PURGE_INTERVAL)
+            claimed_at = await claim_key(store, owner_id, key, fingerprint, IDEMPOTENCY_TTL, IDEMPOTENCY_LEASE)
+            if claimed_at is not None:
+                break
+        record = await _wait_for_outcome(owner_id, key)
+        if record is None:
+            continue  # the first attempt failed or died, take the key over
+        if record.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different request")
+        logger.info("Replaying stored response for idempotency key of user id=%s", owner_id)
+        return _stored_response(record)
+
+    # Leaving the block without conn.commit() rolls back the handler's changes together with the stored response
+    async with async_engine.connect() as conn:
+        await conn.begin()
+        async with AsyncSession(bind=conn, join_transaction_mode="create_savepoint",
+                                autoflush=False, expire_on_commit=False) as session:
+            try:
+                result = await handler(session)
+            except HTTPException as e:
+                if e.status_code >= 500:
+                    await conn.rollback()
+                    await _release(owner_id, key, claimed_at)
+                    raise
+                body = orjson.dumps({"detail": e.detail})
+                response = Response(content=body, status_code=e.status_code, media_type="application/json", headers=e.headers)
+            except Exception:
+                await conn.rollback()
+                await _release(owner_id, key, claimed_at)
+                raise
+            else:
+                body = _response_body(response_model, result)
+                code = status_code(result) if callable(status_code) else status_code
+                response = Response(content=body, status_code=code, media_type="application/json")
+
+            if not await complete_key(session, owner_id, key, claimed_at, response.status_code, body):
+                logger.warning("Idempotency key of user id=%s was taken over after its lease expired, rolling back", owner_id)
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A retry with this Idempotency-Key took over after this request overran its lease",
+                )
+            await session.commit()
+        await conn.commit()
+    return response
+
+
+async def _release(owner_id: int, key: str, claimed_at):
+    async with AsyncSessionLocal() as store:
+        await release_key(store, owner_id, key, claimed_at)
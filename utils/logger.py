@@ -1,11 +1,144 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from utils import settings
 
-logging.basicConfig(
-    level=logging.DEBUG if settings.DEBUG else logging.INFO,
-    format="[%(asctime)s] [%(levelname)s] [%(name)s.%(funcName)s] %(message)s",
-    datefmt= "%m/%d/%Y %H:%M:%S",
-)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if settings.DEBUG else "INFO").upper()
+# "json" for one object per line, "text" for the classic human-readable format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread; when full, new records are dropped instead of blocking requests
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Fraction of INFO records kept, by default and per route ("GET /products=0.05,GET /stock=0.1")
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", 1.0))
+LOG_SAMPLE_RATES = {
+    route.strip(): float(rate)
+    for route, _, rate in (item.rpartition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if item.strip())
+}
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+_request_scope: ContextVar[dict | None] = ContextVar("request_scope", default=None)
+
+
+def _route_label(scope: dict) -> str:
+    # The route template is known once routing has happened, the raw path before that
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else scope['path']}"
+
+
+class RequestContextFilter(logging.Filter):
+    """Tags records with the request id and route, and samples INFO records per route.
+
+    Runs on the emitting thread, where the request context variables are visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        scope = _request_scope.get()
+        record.request_id = _request_id.get() or "-"
+        record.route = _route_label(scope) if scope else None
+        if record.levelno == logging.INFO and record.route is not None:
+            rate = LOG_SAMPLE_RATES.get(record.route, LOG_INFO_SAMPLE_RATE)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "route", None):
+            entry["request_id"] = record.request_id
+            entry["route"] = record.route
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread, dropping them when the queue is full."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Interpolate now, since the arguments may change later; formatting and I/O happen on the writer thread
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def _configure() -> logging.handlers.QueueListener:
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(
+            "[%(asctime)s] [%(levelname)s] [%(name)s.%(funcName)s] [%(request_id)s] %(message)s",
+            datefmt="%m/%d/%Y %H:%M:%S",
+        ))
+    handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+
+    listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # flush what is queued on shutdown
+    return listener
+
+
+_listener = _configure()
+
+
+class RequestContextMiddleware:
+    """Assigns each request an id (X-Request-ID, taken from the request when present) for log correlation."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        if not request_id or len(request_id) > 128:
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]}
+            await send(message)
+
+        id_token = _request_id.set(request_id)
+        scope_token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _request_id.reset(id_token)
+            _request_scope.reset(scope_token)
+
 
 def get_logger(name: str = "app"):
     return logging.getLogger(name)
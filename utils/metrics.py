@@ -0,0 +1,158 @@
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from db.pool import pool_status
+
+# With several workers, point this at an empty shared directory so /metrics aggregates all of them
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ["method", "route"],
+)
+REQUESTS = Counter(
+    "http_requests_total", "Responses by route template and status code", ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being handled", ["method"], multiprocess_mode="livesum",
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request", ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_QUERY_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL per request", ["method", "route"],
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Time spent executing one SQL statement",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+AUTH_DURATION = Histogram(
+    "auth_operation_duration_seconds", "Time spent verifying tokens and hashing credentials", ["operation"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Catalog cache lookups by tier that answered (local, shared, miss, error)", ["namespace", "result"],
+)
+
+# (metric name, family, help) for each pool_status() key
+_POOL_METRICS = {
+    "size": ("db_pool_size", GaugeMetricFamily, "Connections kept open in the pool"),
+    "checked_in": ("db_pool_checked_in", GaugeMetricFamily, "Idle connections in the pool"),
+    "checked_out": ("db_pool_checked_out", GaugeMetricFamily, "Connections in use"),
+    "overflow": ("db_pool_overflow", GaugeMetricFamily, "Connections open above the pool size"),
+    "connects": ("db_pool_connects", CounterMetricFamily, "New database connections"),
+    "checkouts": ("db_pool_checkouts", CounterMetricFamily, "Connection checkouts"),
+    "checkins": ("db_pool_checkins", CounterMetricFamily, "Connection checkins"),
+    "invalidations": ("db_pool_invalidations", CounterMetricFamily, "Invalidated connections"),
+    "timeouts": ("db_pool_timeouts", CounterMetricFamily, "Checkouts that timed out waiting for a connection"),
+    "wait_time_total": ("db_pool_wait_seconds", CounterMetricFamily, "Time spent waiting for a connection"),
+    "wait_time_max": ("db_pool_wait_max_seconds", GaugeMetricFamily, "Longest wait for a connection"),
+}
+
+_engines = {}
+
+
+@dataclass
+class QueryStats:
+    """SQL statements and time accumulated by the current request."""
+    count: int = 0
+    seconds: float = 0.0
+
+
+_request_queries: ContextVar[QueryStats | None] = ContextVar("request_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    QUERY_DURATION.observe(elapsed)
+    stats = _request_queries.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+
+def instrument_engine(engine, name: str):
+    """Time every statement run on a (sync) engine and expose its pool on /metrics."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _engines[name] = engine
+
+
+class PoolCollector:
+    """Reads pool occupancy and counters at scrape time."""
+
+    def collect(self):
+        families = {key: family(metric, doc, labels=["pool"]) for key, (metric, family, doc) in _POOL_METRICS.items()}
+        for name, engine in _engines.items():
+            for key, value in pool_status(engine.pool).items():
+                if key in families:
+                    families[key].add_metric([name], value)
+        yield from families.values()
+
+
+_pool_collector = PoolCollector()
+REGISTRY.register(_pool_collector)
+
+
+def metrics_payload() -> bytes:
+    """Exposition text for /metrics; pool metrics always describe the worker serving the scrape."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_pool_collector)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def _route_template(scope) -> str:
+    # Set by the router on match; raw paths would give one series per id
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """Records latency, status and SQL usage per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = QueryStats()
+        token = _request_queries.set(stats)
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            _request_queries.reset(token)
+            route = _route_template(scope)
+            REQUEST_DURATION.labels(method, route).observe(elapsed)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_QUERIES.labels(method, route).observe(stats.count)
+            REQUEST_QUERY_DURATION.labels(method, route).observe(stats.seconds)
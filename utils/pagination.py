@@ -1,6 +1,173 @@
+import base64
+import json
+from fastapi import HTTPException
 from fastapi_pagination.cursor import CursorParams
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
 class CustomCursorParams(CursorParams):
     size: int = 10  # Default items per page
     cursor: str | None = None  # Cursor value (encoded ID)
     order: str = "id:asc"  # Default sort order (by ID ascending)
+
+
+def encode_keyset_cursor(sort: str, direction: str, key: list) -> str:
+    """Encode a (sort key, id) position as an opaque cursor."""
+    raw = json.dumps({"s": sort, "d": direction, "k": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_keyset_cursor(cursor: str, sort: str) -> tuple[str, list]:
+    """Decode a cursor, rejecting cursors issued for a different sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        direction, key = data["d"], data["k"]
+        if data["s"] != sort or direction not in ("next", "prev") or len(key) != 2:
+            raise ValueError(cursor)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+    return direction, key
+
+
+def _keyset_sections(key_column, id_column, nullable: bool, descending: bool, after: list | None):
+    """Yield (predicates, order_by) for each index range to scan, in traversal order.
+
+    NULL keys sort as the largest value (ASC NULLS LAST, DESC NULLS FIRST), so
+    the NULL rows form their own range and every range is a plain index seek.
+    """
+    def ordered(column):
+        return column.desc() if descending else column.asc()
+
+    def beyond(column, value):
+        return column < value if descending else column > value
+
+    if key_column is None:
+        yield ([beyond(id_column, after[1])] if after else []), [ordered(id_column)]
+        return
+
+    value = after[0] if after else None
+    non_null_predicates = [key_column.is_not(None)] if nullable else []
+    if after and value is not None:
+        seek = tuple_(key_column, id_column)
+        non_null_predicates.append(seek < tuple_(value, after[1]) if descending else seek > tuple_(value, after[1]))
+    non_null = (non_null_predicates, [ordered(key_column), ordered(id_column)])
+
+    if not nullable:
+        yield non_null
+        return
+
+    null_predicates = [key_column.is_(None)]
+    if after and value is None:
+        null_predicates.append(beyond(id_column, after[1]))
+    null = (null_predicates, [ordered(id_column)])
+
+    if descending:
+        # NULLs come first; a cursor already inside the non-NULL range skips them
+        if not (after and value is not None):
+            yield null
+        yield non_null
+    else:
+        # NULLs come last; a cursor already inside the NULL range skips the rest
+        if not (after and value is None):
+            yield non_null
+        yield null
+
+
+def row_to_dict(row) -> dict:
+    """Row factory for column-projection queries whose labels match the response fields."""
+    return dict(row._mapping)
+
+
+async def _fetch(db: AsyncSession, query, row_factory=None) -> list:
+    """ORM entities by default, or plain dicts built by row_factory for projection queries."""
+    if row_factory is None:
+        return list((await db.scalars(query)).all())
+    return [row_factory(row) for row in await db.execute(query)]
+
+
+async def paginate_keyset(db: AsyncSession, query, params: CursorParams, sort: str, key_column, id_column,
+                          descending: bool = False, nullable: bool = False, row_factory=None) -> dict:
+    """Seek-based cursor pagination over a (key, id) sort.
+
+    `query` carries the filters but no ORDER BY. Each page is one or two index
+    range scans starting at the cursor position, so deep pages cost the same
+    as the first one. With a row_factory the items are plain dicts that can be
+    serialized without model validation. Returns a CursorPage-compatible dict.
+    """
+    direction, after = ("next", None)
+    if params.cursor:
+        direction, after = decode_keyset_cursor(params.cursor, sort)
+    backwards = direction == "prev"
+    scan_descending = descending != backwards
+
+    rows = []
+    for predicates, order_by in _keyset_sections(key_column, id_column, nullable, scan_descending, after):
+        remaining = params.size + 1 - len(rows)
+        if remaining <= 0:
+            break
+        section = query.where(*predicates).order_by(*order_by).limit(remaining)
+        rows.extend(await _fetch(db, section, row_factory))
+
+    has_more = len(rows) > params.size
+    items = rows[:params.size]
+    if backwards:
+        items.reverse()
+
+    def value(item, column):
+        return item[column.key] if row_factory else getattr(item, column.key)
+
+    def position(item):
+        return [value(item, key_column) if key_column is not None else None, value(item, id_column)]
+
+    next_page = previous_page = None
+    if items:
+        if has_more or backwards:
+            next_page = encode_keyset_cursor(sort, "next", position(items[-1]))
+        if (has_more and backwards) or (not backwards and params.cursor):
+            previous_page = encode_keyset_cursor(sort, "prev", position(items[0]))
+
+    return {
+        "items": items,
+        "total": None,
+        "current_page": params.cursor,
+        "current_page_backwards": None,
+        "previous_page": previous_page,
+        "next_page": next_page,
+    }
+
+
+def encode_offset_cursor(tag: str, offset: int) -> str:
+    """Encode a position in a ranked result set as an opaque cursor."""
+    raw = json.dumps({"s": tag, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_offset_cursor(cursor: str, tag: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        offset = int(data["o"])
+        if data["s"] != tag or offset < 0:
+            raise ValueError(cursor)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+    return offset
+
+
+async def paginate_ranked(db: AsyncSession, query, params: CursorParams, tag: str, row_factory=None) -> dict:
+    """Offset cursor pagination for ranked results (e.g. search), where no seek key exists.
+
+    `query` must already be ordered. Returns a CursorPage-compatible dict.
+    """
+    offset = decode_offset_cursor(params.cursor, tag) if params.cursor else 0
+    rows = await _fetch(db, query.offset(offset).limit(params.size + 1), row_factory)
+    items = rows[:params.size]
+    return {
+        "items": items,
+        "total": None,
+        "current_page": params.cursor,
+        "current_page_backwards": None,
+        "previous_page": encode_offset_cursor(tag, max(offset - params.size, 0)) if offset else None,
+        "next_page": encode_offset_cursor(tag, offset + params.size) if len(rows) > params.size else None,
+    }
@@ -0,0 +1,134 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Development/test only: "off", "log" (warn about overruns and N+1 patterns) or "raise" (fail the request)
+SQL_AUDIT = os.getenv("SQL_AUDIT", "off").lower()
+# Executions of one statement with distinct parameters within a request that are reported as N+1
+SQL_AUDIT_REPEAT_THRESHOLD = int(os.getenv("SQL_AUDIT_REPEAT_THRESHOLD", 5))
+# Budget for routes that declare none; unset means unlimited
+SQL_AUDIT_DEFAULT_BUDGET = int(os.getenv("SQL_AUDIT_DEFAULT_BUDGET")) if os.getenv("SQL_AUDIT_DEFAULT_BUDGET") else None
+
+
+# Transaction control is not counted: whether it reaches the cursor depends on the driver
+_TRANSACTION_CONTROL = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in "raise" mode when a request goes over its query budget or runs an N+1 pattern."""
+
+
+def _short(statement: str, limit: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+@dataclass
+class QueryAudit:
+    """Statements run by one request (or one audit_queries block)."""
+    label: str = "block"
+    budget: int | None = None
+    count: int = 0
+    over_budget: bool = False
+    # statement -> fingerprints of the parameter sets it ran with
+    executions: dict[str, set[int]] = field(default_factory=dict)
+    repeated: list[str] = field(default_factory=list)
+    # insertmanyvalues batches of one executemany share a context and count once
+    _last_context: object = field(default=None, repr=False)
+
+    def set_budget(self, budget: int):
+        self.budget = budget
+        self._check_budget("")
+
+    def record(self, statement: str, parameters, context=None):
+        if context is not None and context is self._last_context:
+            return
+        if statement.lstrip()[:9].upper().startswith(_TRANSACTION_CONTROL):
+            return
+        self._last_context = context
+        self.count += 1
+        self._check_budget(statement)
+        seen = self.executions.setdefault(statement, set())
+        seen.add(hash(repr(parameters)))
+        if len(seen) == SQL_AUDIT_REPEAT_THRESHOLD:
+            self.repeated.append(statement)
+            self._violation(f"possible N+1, statement ran with {len(seen)} different parameter sets: {_short(statement)}")
+
+    def _check_budget(self, statement: str):
+        if self.budget is not None and self.count > self.budget and not self.over_budget:
+            self.over_budget = True
+            detail = f": {_short(statement)}" if statement else ""
+            self._violation(f"{self.count} SQL statements exceed the budget of {self.budget}{detail}")
+
+    def _violation(self, message: str):
+        logger.warning("%s: %s", self.label, message)
+        if SQL_AUDIT == "raise":
+            raise QueryBudgetExceeded(f"{self.label}: {message}")
+
+
+_current_audit: ContextVar[QueryAudit | None] = ContextVar("query_audit", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    audit = _current_audit.get()
+    if audit is not None:
+        audit.record(statement, parameters, context)
+
+
+def audit_engine(engine):
+    """Count statements on a (sync) engine for the active audit; a no-op unless SQL_AUDIT is enabled."""
+    if SQL_AUDIT != "off":
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+def query_budget(limit: int):
+    """Route dependency declaring how many SQL statements one request may run, dependencies included."""
+    async def declare():
+        audit = _current_audit.get()
+        if audit is not None:
+            audit.set_budget(limit)
+    return declare
+
+
+@contextmanager
+def audit_queries(budget: int | None = None, label: str = "block"):
+    """Audit the statements run inside the block, e.g. around a crud call in a test."""
+    audit = QueryAudit(label=label, budget=budget)
+    token = _current_audit.set(audit)
+    try:
+        yield audit
+    finally:
+        _current_audit.reset(token)
+
+
+class QueryAuditMiddleware:
+    """Audits each request and reports the statement count in X-SQL-Queries."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        audit = QueryAudit(label=f"{scope['method']} {scope['path']}", budget=SQL_AUDIT_DEFAULT_BUDGET)
+
+        async def send_with_counts(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-sql-queries", str(audit.count).encode()))
+                headers.append((b"x-sql-repeated", str(len(audit.repeated)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_audit.set(audit)
+        try:
+            await self.app(scope, receive, send_with_counts)
+        finally:
+            _current_audit.reset(token)
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import pickle
+import time
+from typing import Any, Awaitable, Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.base import primary_session
+from utils.cache import TTLCache
+from utils.logger import get_logger
+from utils.metrics import CACHE_REQUESTS
+
+logger = get_logger(__name__)
+
+# redis://host:6379/0 shares the cache between workers and replicas; memory:// keeps it in-process
+# (single worker, development and tests); unset disables catalog caching
+CACHE_URL = os.getenv("CACHE_URL")
+CACHE_TTL = int(os.getenv("CACHE_TTL", 300))
+CACHE_LOCAL_SIZE = int(os.getenv("CACHE_LOCAL_SIZE", 10000))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", 30))
+# Seconds to wait for the shared cache before falling back to the database
+CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", 0.1))
+
+
+class LocalSharedCache:
+    """In-process stand-in for the subset of the Redis API the tiered cache uses."""
+
+    def __init__(self):
+        self._data: dict[str, tuple[float | None, Any]] = {}
+
+    async def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value, ex: int | None = None):
+        self._data[key] = (time.monotonic() + ex if ex else None, value)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._data[key] = (None, str(value).encode())
+        return value
+
+    async def aclose(self):
+        self._data.clear()
+
+
+def connect(url: str):
+    """Shared cache client for a CACHE_URL."""
+    if url.startswith("memory://"):
+        return LocalSharedCache()
+    # Optional dependency, only needed when a Redis URL is configured
+    from redis.asyncio import Redis
+    return Redis.from_url(url, socket_timeout=CACHE_TIMEOUT, socket_connect_timeout=CACHE_TIMEOUT)
+
+
+class TieredCache:
+    """Read-through cache: per-worker LRU in front of a shared Redis-protocol cache.
+
+    Entries live under a namespace whose generation counter is kept in the
+    shared cache. Reads look the generation up first and key both tiers with
+    it; writes increment it after committing, so every worker and replica
+    misses on its next read instead of serving the old value. Superseded
+    entries are never read again and age out. When the shared cache is
+    unreachable reads go to the database, since the generation cannot be checked.
+    """
+
+    def __init__(self, shared, ttl: int = CACHE_TTL, local_size: int = CACHE_LOCAL_SIZE,
+                 local_ttl: float = CACHE_LOCAL_TTL, prefix: str = "cache"):
+        self.shared = shared
+        self.ttl = ttl
+        self.prefix = prefix
+        self._local = TTLCache(maxsize=local_size, ttl=local_ttl)
+        self._generations: dict[str, tuple[float, int | None]] = {}  # namespace -> (read at, generation)
+
+    def _generation_key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}:gen"
+
+    async def generation(self, namespace: str, max_age: float = 0) -> int | None:
+        """Current generation of a namespace: 0 without a shared cache, None when it cannot be reached.
+
+        Per-worker caches outside this class key their entries with it to
+        honour invalidate() from other workers. With max_age, a generation (or
+        failure) this worker read less than max_age seconds ago is reused, so
+        hot paths skip the round trip and see other workers' invalidations up
+        to max_age late; this worker's own invalidations are seen at once.
+        """
+        if self.shared is None:
+            return 0
+        read = self._generations.get(namespace)
+        if max_age and read is not None and time.monotonic() - read[0] < max_age:
+            return read[1]
+        try:
+            generation = int(await self.shared.get(self._generation_key(namespace)) or 0)
+        except Exception as e:
+            logger.warning("Shared cache unavailable, reading %s from the database: %s", namespace, e)
+            CACHE_REQUESTS.labels(namespace, "error").inc()
+            generation = None
+        self._generations[namespace] = (time.monotonic(), generation)
+        return generation
+
+    async def get_or_load(self, db: AsyncSession, namespace: str, key: tuple,
+                          loader: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, calling loader(session) and storing its result on a miss.
+
+        Misses are loaded from the primary, so a lagging read replica cannot
+        store pre-write data under the new generation. None results are not cached.
+        """
+        if self.shared is None:
+            return await loader(db)
+        generation = await self.generation(namespace)
+        if generation is None:
+            return await loader(db)
+
+        digest = hashlib.sha1("\x1f".join(map(str, key)).encode()).hexdigest()
+        local_key = (namespace, generation, digest)
+        value = self._local.get(local_key)
+        if value is not None:
+            CACHE_REQUESTS.labels(namespace, "local").inc()
+            return value
+
+        shared_key = f"{self.prefix}:{namespace}:{generation}:{digest}"
+        try:
+            payload = await self.shared.get(shared_key)
+        except Exception as e:
+            logger.warning("Shared cache read failed for %s: %s", namespace, e)
+            payload = None
+        if payload is not None:
+            value = pickle.loads(payload)
+            self._local.set(local_key, value)
+            CACHE_REQUESTS.labels(namespace, "shared").inc()
+            return value
+
+        CACHE_REQUESTS.labels(namespace, "miss").inc()
+        async with primary_session(db) as session:
+            value = await loader(session)
+        if value is None:
+            return None
+        self._local.set(local_key, value)
+        try:
+            await self.shared.set(shared_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=self.ttl)
+        except Exception as e:
+            logger.warning("Shared cache write failed for %s: %s", namespace, e)
+        return value
+
+    async def invalidate(self, *namespaces: str):
+        """Retire every cached entry of the namespaces; call after the write has committed."""
+        if self.shared is None:
+            return
+        for namespace in namespaces:
+            self._generations.pop(namespace, None)
+            try:
+                await self.shared.incr(self._generation_key(namespace))
+            except Exception as e:
+                # Workers that can still reach the shared cache serve the old generation until CACHE_TTL
+                logger.error("Shared cache invalidation failed for %s: %s", namespace, e)
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.aclose()
+
+
+# Products and branches: read constantly, written rarely. Its generation counters also
+# carry user and OAuth client invalidations to the per-worker auth caches.
+catalog_cache = TieredCache(connect(CACHE_URL) if CACHE_URL else None)
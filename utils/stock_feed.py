@@ -0,0 +1,199 @@
+import asyncio
+import os
+from typing import AsyncIterator
+from cruds.stock_event import STOCK_EVENTS_CHANNEL, latest_stock_event_id, list_stock_events, outbox_snapshot
+from db.base import AsyncSessionLocal, async_engine
+from utils.logger import get_logger
+from utils.query_audit import audit_queries
+
+logger = get_logger(__name__)
+
+# Seconds between outbox reads when no notification arrives (the only trigger outside Postgres)
+STOCK_FEED_POLL_INTERVAL = float(os.getenv("STOCK_FEED_POLL_INTERVAL", 1))
+# Events buffered per subscriber; a subscriber that falls further behind catches up from the outbox
+STOCK_FEED_QUEUE_SIZE = int(os.getenv("STOCK_FEED_QUEUE_SIZE", 1000))
+# Seconds without events after which subscribers get a heartbeat (None)
+STOCK_FEED_HEARTBEAT = float(os.getenv("STOCK_FEED_HEARTBEAT", 15))
+BATCH_SIZE = 500
+
+
+class Subscription:
+    """One connected client: its filters and the events queued for it."""
+
+    def __init__(self, branch_id: int | None, product_id: int | None):
+        self.branch_id = branch_id
+        self.product_id = product_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=STOCK_FEED_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        return (not self.branch_id or event["branch_id"] == self.branch_id) and \
+               (not self.product_id or event["product_id"] == self.product_id)
+
+    def put(self, event: dict):
+        if self.overflowed or not self.matches(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class StockFeed:
+    """Per-worker dispatcher that fans stock_events out to the subscribers of this worker.
+
+    The outbox table is the shared log: every worker reads it in id order from
+    its own position, so all workers see the same events. On Postgres a
+    LISTEN connection wakes the dispatcher on every committed change; other
+    databases are polled every STOCK_FEED_POLL_INTERVAL seconds. On Postgres
+    ids are assigned before commit, so a missing id is waited for, to keep
+    delivery in id order, until every transaction that could still commit it
+    has ended; then it was rolled back. SQLite serializes writers, so ids
+    commit in order and a missing id is skipped at once. With no subscribers
+    the outbox is not read at all.
+    """
+
+    def __init__(self):
+        self._subscribers: set[Subscription] = set()
+        self._position: int | None = None  # last id dispatched, None while idle
+        self._gap_xmax: int | None = None  # xmax of the snapshot the current gap was first seen in
+        self._wake = asyncio.Event()
+        self._init_lock = asyncio.Lock()
+
+    async def run(self):
+        """Dispatch until cancelled, reconnecting after errors; started from the app lifespan."""
+        while True:
+            try:
+                if async_engine.dialect.name == "postgresql":
+                    await self._listen()
+                else:
+                    await self._poll(None)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Stock feed dispatcher failed, restarting")
+                await asyncio.sleep(STOCK_FEED_POLL_INTERVAL)
+
+    async def _listen(self):
+        # Holds one primary connection per worker for the notifications
+        async with async_engine.connect() as conn:
+            listener = (await conn.get_raw_connection()).driver_connection
+            await listener.add_listener(STOCK_EVENTS_CHANNEL, self._notified)
+            try:
+                await self._poll(listener)
+            finally:
+                if not listener.is_closed():
+                    await listener.remove_listener(STOCK_EVENTS_CHANNEL, self._notified)
+
+    def _notified(self, *args):
+        self._wake.set()
+
+    async def _poll(self, listener):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=STOCK_FEED_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if listener is not None and listener.is_closed():
+                raise ConnectionError("Stock feed listener connection closed")
+            await self._dispatch()
+
+    async def _dispatch(self):
+        if not self._subscribers:
+            self._position, self._gap_xmax = None, None
+            return
+        async with AsyncSessionLocal() as db:
+            snapshot = await outbox_snapshot(db)
+            while self._position is not None:
+                events = await list_stock_events(db, self._position, limit=BATCH_SIZE)
+                if self._deliver(events, snapshot) < BATCH_SIZE:
+                    return
+
+    def _gap_rolled_back(self, snapshot: tuple[int, int] | None) -> bool:
+        """Whether the ids missing before the next event read with snapshot (xmin, xmax) were rolled back.
+
+        A missing id belongs to a transaction in progress when the gap was
+        first seen, so below that snapshot's xmax (event inserts follow their
+        transaction's stock writes, which assign its id). Once a snapshot's
+        xmin passes that xmax all of them have ended, and an id they committed
+        would be visible to it.
+        """
+        if snapshot is None:
+            return True
+        xmin, xmax = snapshot
+        if self._gap_xmax is None:
+            self._gap_xmax = xmax
+        return xmin >= self._gap_xmax
+
+    def _deliver(self, events: list[dict], snapshot: tuple[int, int] | None) -> int:
+        """Queue events in id order up to the first gap that may still commit; returns how many were taken.
+
+        Runs without awaiting, so subscribers never observe a position their queues do not match.
+        """
+        delivered = 0
+        for event in events:
+            if event["id"] != self._position + 1:
+                if not self._gap_rolled_back(snapshot):
+                    break
+                logger.debug("Skipping rolled back stock event ids %s to %s", self._position + 1, event["id"] - 1)
+            self._gap_xmax = None
+            for subscription in self._subscribers:
+                subscription.put(event)
+            self._position = event["id"]
+            delivered += 1
+        return delivered
+
+    async def _start_position(self) -> int:
+        """Dispatcher position, starting from the latest event when idle.
+
+        Callers register their subscription first, so the dispatcher cannot reset it to idle meanwhile.
+        """
+        async with self._init_lock:
+            if self._position is None:
+                async with AsyncSessionLocal() as db:
+                    latest = await latest_stock_event_id(db)
+                self._position = latest
+            return self._position
+
+    async def subscribe(self, branch_id: int | None = None, product_id: int | None = None,
+                        after: int | None = None) -> AsyncIterator[dict | None]:
+        """Yield the events matching the filters in id order, None as a heartbeat.
+
+        With `after`, the events after that id are replayed from the outbox
+        first, so a client resumes where it left off (within the retention).
+        A subscriber whose queue overflows catches up the same way.
+        """
+        subscription = Subscription(branch_id, product_id)
+        self._subscribers.add(subscription)
+        try:
+            start = await self._start_position()
+            position = start if after is None else after
+            while True:
+                # Events up to the dispatcher position come from the outbox, later ones through the queue
+                subscription.overflowed = False
+                until = self._position
+                while position < until:
+                    # Audited apart from the request, whose query budget does not cover a stream
+                    with audit_queries(label="stock feed replay"):
+                        async with AsyncSessionLocal() as db:
+                            events = await list_stock_events(db, position, until, branch_id, product_id, BATCH_SIZE)
+                    for event in events:
+                        yield event
+                    position = events[-1]["id"] if len(events) == BATCH_SIZE else until
+                while not (subscription.overflowed and subscription.queue.empty()):
+                    try:
+                        event = await asyncio.wait_for(subscription.queue.get(), timeout=STOCK_FEED_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        yield None
+                        continue
+                    if event["id"] > position:
+                        position = event["id"]
+                        yield event
+                logger.info("Stock feed subscriber fell behind, catching up from the outbox")
+        finally:
+            self._subscribers.discard(subscription)
+
+
+# Live stock changes for the SSE and WebSocket endpoints of this worker
+stock_feed = StockFeed()